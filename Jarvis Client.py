@@ -1,6 +1,6 @@
 # jarvis_client_gui.py
 from __future__ import annotations
-import base64, mimetypes, os, json, threading
+import os, json, threading, time
 from dataclasses import asdict
 from datetime import datetime
 from typing import List, Dict, Any, Optional
@@ -9,13 +9,18 @@ from tkinter import ttk, filedialog, messagebox
 
 
 
+from Scipts import http_pool
 from Scipts.OpenAiGPTBrain import LLMClient, LLMConfig
-from Scipts.MainAgent import handle_command, play_mp3
+from Scipts.intent_router import IntentRouter, DEFAULT_THRESHOLD, DEFAULT_REPLIES
+from Scipts.image_pipeline import prepare_image, human_size
+from Scipts.MainAgent import handle_command, play_mp3, DEFAULT_GREETING_MP3, DEFAULT_WEATHER_MP3
+from Scipts import audio_engine
 from Scipts.voice_agent import VoiceAgent, VoiceConfig
+from Scipts import model_registry
 
 CONFIG_PATH = os.path.join(os.path.dirname(__file__), "jarvis_client_config.json")
 HISTORY_PATH = os.path.join(os.path.dirname(__file__), "jarvis_chat_history.json")
-MAX_TURNS_TO_SEND = 2
+LLM_CACHE_PATH = os.path.join(os.path.dirname(__file__), "jarvis_llm_cache.json")
 
 # ---------- конфиг/история ----------
 def load_config() -> LLMConfig:
@@ -24,10 +29,12 @@ def load_config() -> LLMConfig:
         try:
             with open(CONFIG_PATH, "r", encoding="utf-8") as f:
                 data = json.load(f)
-            return LLMConfig(**{k: v for k, v in data.items() if k in LLMConfig.__annotations__})
+            cfg = LLMConfig(**{k: v for k, v in data.items() if k in LLMConfig.__annotations__})
+            cfg.cache_path = cfg.cache_path or LLM_CACHE_PATH
+            return cfg
         except Exception:
             pass
-    return LLMConfig()
+    return LLMConfig(cache_path=LLM_CACHE_PATH)
 
 def load_extra() -> dict:
     """Читаем доп.поля из конфига (wake_mp3_path, vosk_model_path)."""
@@ -46,6 +53,18 @@ def save_config(cfg: LLMConfig, extra: Optional[dict] = None) -> None:
     with open(CONFIG_PATH, "w", encoding="utf-8") as f:
         json.dump(payload, f, ensure_ascii=False, indent=2)
 
+def parse_endpoints(text: str) -> List[Dict[str, str]]:
+    """Строки «url | model» -> [{"url":..., "model":...}]; модель можно опустить."""
+    eps = []
+    for line in (text or "").splitlines():
+        url, _, model = line.partition("|")
+        if url.strip():
+            eps.append({"url": url.strip(), "model": model.strip()})
+    return eps
+
+def format_endpoints(eps: List[Dict[str, str]]) -> str:
+    return "\n".join(f"{e.get('url','')} | {e.get('model','')}".rstrip(" |") for e in eps or [])
+
 def load_history() -> List[Dict[str, Any]]:
     if os.path.exists(HISTORY_PATH):
         try:
@@ -108,21 +127,31 @@ class JarvisClientApp(tk.Tk):
 
         self.cfg: LLMConfig = load_config()
         self.extras: dict = load_extra()  # тут лежат vosk_model_path и wake_mp3_path
+        # пул keep-alive соединений к LLM/TTS: {"pool_size": 8, "retries": 2, "read_timeouts": {...}}
+        if isinstance(self.extras.get("http_pool"), dict):
+            http_pool.configure(**self.extras["http_pool"])
         self.llm = LLMClient(self.cfg)
+        # быстрый локальный путь для очевидных команд (без LLM)
+        self.router = IntentRouter(threshold=float(self.extras.get("intent_threshold", DEFAULT_THRESHOLD)))
         self.messages: List[Dict[str, Any]] = load_history()
 
         # voice
         self.vosk_model_path: str = self.extras.get("vosk_model_path", "")
         self.wake_mp3_path: str = self.extras.get("wake_mp3_path", "")  # <-- новый параметр
         self.voice_win: Optional[VoiceWindow] = None
-        self.voice_agent: Optional[VoiceAgent] = None
+        self.voice_agent = None  # VoiceAgent или ProcessVoiceAgent
         self.voice_running: bool = False
+        self._speeches: List[Any] = []  # SpeechPipeline в очереди на озвучку (последняя — самая новая)
 
         # вложения
         self.attached_image_b64: Optional[str] = None
         self.attached_image_mime: Optional[str] = None
         self.attached_image_name: Optional[str] = None
 
+        # счётчик блоков потокового вывода и незавершённых запросов
+        self._stream_seq: int = 0
+        self._pending_requests: int = 0
+
         self._init_styles()
         self._init_menu()
         self._init_header()
@@ -205,6 +234,32 @@ class JarvisClientApp(tk.Tk):
                 if m.get("role") == "user": self._append_user(m.get("content",""))
                 elif m.get("role") == "assistant": self._append_assistant(m.get("content",""))
         self.input.focus_set()
+        self._preload_vosk_model()
+        self._preload_sounds()
+
+    def _preload_sounds(self, paths: Optional[List[str]] = None):
+        """Открыть общий аудио-вывод и декодировать короткие клипы в память (в фоне)."""
+        paths = paths or [DEFAULT_GREETING_MP3, DEFAULT_WEATHER_MP3, self.wake_mp3_path]
+        def run():
+            engine = audio_engine.get_engine()
+            if engine is None:
+                err = audio_engine.engine_error()
+                self.after(0, lambda: self._append_system(f"Аудио-вывод: {err} — звуки через play_mp3."))
+                return
+            def on_done(n: int, sec: float):
+                self.after(0, lambda: self._set_status(f"Звуки в памяти: {n} за {sec:.2f}s"))
+            engine.preload(paths, on_done=on_done)
+        threading.Thread(target=run, daemon=True).start()
+
+    def _preload_vosk_model(self):
+        """Модель Vosk грузится в фоне сразу при старте — «Старт» голоса потом мгновенный."""
+        if not self.vosk_model_path or not os.path.isdir(self.vosk_model_path):
+            return
+        def on_ready(entry):
+            msg = (f"Модель Vosk: ошибка — {entry.error}" if entry.error
+                   else f"Модель Vosk загружена за {entry.load_sec:.1f}s")
+            self.after(0, lambda: self._set_status(msg))
+        model_registry.preload(self.vosk_model_path, on_ready=on_ready)
 
     def _insert_newline(self): self.input.insert("insert","\n"); return "break"
 
@@ -222,6 +277,34 @@ class JarvisClientApp(tk.Tk):
         self.chat.insert("end", text.strip()+"\n\n", ("asst_msg",))
         self.chat.configure(state="disabled"); self.chat.see("end")
 
+    # --- потоковый вывод ответа ---
+    def _begin_assistant_stream(self) -> str:
+        """Заголовок ответа + пара марок, между которыми дописываются куски потока."""
+        self._stream_seq += 1
+        mark = f"stream{self._stream_seq}"
+        self.chat.configure(state="normal")
+        ts = datetime.now().strftime("%H:%M:%S")
+        self.chat.insert("end", f"Jarvis  ·  {ts}\n", ("asst_name","time"))
+        self.chat.insert("end", "\n\n", ("asst_msg",))
+        # марки стоят перед завершающими "\n\n", чтобы следующие сообщения их не сдвигали
+        self.chat.mark_set(f"{mark}_start", "end-3c"); self.chat.mark_gravity(f"{mark}_start", "left")
+        self.chat.mark_set(f"{mark}_end", "end-3c"); self.chat.mark_gravity(f"{mark}_end", "right")
+        self.chat.configure(state="disabled"); self.chat.see("end")
+        return mark
+
+    def _append_stream_chunk(self, mark: str, chunk: str):
+        self.chat.configure(state="normal")
+        self.chat.insert(f"{mark}_end", chunk, ("asst_msg",))
+        self.chat.configure(state="disabled"); self.chat.see("end")
+
+    def _finish_assistant_stream(self, mark: str, text: str):
+        """Заменяем сырой поток итоговым (очищенным от тегов) текстом."""
+        self.chat.configure(state="normal")
+        self.chat.delete(f"{mark}_start", f"{mark}_end")
+        self.chat.insert(f"{mark}_end", text.strip(), ("asst_msg",))
+        self.chat.mark_unset(f"{mark}_start", f"{mark}_end")
+        self.chat.configure(state="disabled"); self.chat.see("end")
+
     def _append_system(self, text: str):
         self.chat.configure(state="normal")
         ts = datetime.now().strftime("%H:%M:%S")
@@ -269,18 +352,31 @@ class JarvisClientApp(tk.Tk):
             self.after(10, lambda: self._send_text_from_voice(text))
 
         def on_wake():
-            self.after(10, self._play_wake_sound)  # <-- играем mp3 при слове «джарвис»
+            # играем mp3 при слове «джарвис» прямо из потока голоса — без ожидания цикла Tk
+            self._play_wake_sound(requested_at=time.time())
+
+        # тонкая настройка распознавания — словарь "voice" в конфиге (block_size, command_timeout, vad_*, …)
+        voice_opts = {k: v for k, v in (self.extras.get("voice") or {}).items()
+                      if k in VoiceConfig.__annotations__ and k != "vosk_model_path"}
+        vc = VoiceConfig(vosk_model_path=self.vosk_model_path, **voice_opts)
+        def on_error(err: str):
+            def _apply():
+                messagebox.showerror("Голос", f"Не удалось запустить: {err}")
+                self.stop_voice()
+                if self.voice_win: self.voice_win.btn_text.set("Старт")
+            self.after(10, _apply)
 
-        vc = VoiceConfig(vosk_model_path=self.vosk_model_path)
-        self.voice_agent = VoiceAgent(vc, on_status=on_status, on_command=on_command, on_wake=on_wake)
-        try:
-            self.voice_agent.start()
-            self.voice_running = True
-            return True
-        except Exception as e:
-            messagebox.showerror("Голос", f"Не удалось запустить: {e}")
-            self.voice_agent = None; self.voice_running = False
-            return False
+        # out_of_process — распознавание в дочернем процессе (тот же набор колбэков)
+        agent_cls = VoiceAgent
+        if vc.out_of_process:
+            from Scipts.voice_process import ProcessVoiceAgent
+            agent_cls = ProcessVoiceAgent
+        self.voice_agent = agent_cls(vc, on_status=on_status, on_command=on_command, on_wake=on_wake,
+                                     on_error=on_error)
+        # модель ждётся в потоке агента (обычно уже предзагружена) — Tk не замирает
+        self.voice_agent.start()
+        self.voice_running = True
+        return True
 
     def stop_voice(self):
         if self.voice_agent:
@@ -290,12 +386,26 @@ class JarvisClientApp(tk.Tk):
         self.voice_running = False
         if self.voice_win: self.voice_win.set_status("голос остановлен")
 
-    def _play_wake_sound(self):
-        """Проигрываем выбранный wake-mp3 (слушаю, сэр)."""
+    def _play_wake_sound(self, requested_at: Optional[float] = None):
+        """Проигрываем выбранный wake-mp3 (слушаю, сэр). Можно звать из любого потока."""
         if not self.wake_mp3_path:
-            self._append_system("Wake word: mp3 не задан (Настройки → Wake MP3).")
+            self.after(0, lambda: self._append_system("Wake word: mp3 не задан (Настройки → Wake MP3)."))
             return
-        self._append_system("Wake word: проигрываю подтверждение…")
+        # поток распознавания не ждёт ни открытия устройства, ни декодирования: движок только
+        # уже открытый и клип только уже в памяти, иначе — фоновый play_mp3
+        engine = audio_engine.current_engine()
+
+        def on_started(latency: float):
+            # latency — от on_wake до выхода звука из ЦАП; + задержка распознавания из метрик агента
+            agent = self.voice_agent
+            asr = (agent.metrics().get("wake_latency_last") if agent else None) or 0.0
+            self.after(0, lambda: self._set_status(
+                f"Wake → звук: {latency * 1000:.0f} мс (распознавание {asr * 1000:.0f} мс)"))
+
+        if (engine is not None and engine.is_loaded(self.wake_mp3_path)
+                and engine.play(self.wake_mp3_path, requested_at=requested_at, on_started=on_started)):
+            return
+        self.after(0, lambda: self._append_system("Wake word: проигрываю подтверждение…"))
         def run():
             try:
                 result = play_mp3(self.wake_mp3_path)
@@ -306,7 +416,7 @@ class JarvisClientApp(tk.Tk):
 
     # --- Настройки ---
     def _open_settings(self):
-        win = tk.Toplevel(self); win.title("Настройки"); win.configure(bg="#0b1220"); win.geometry("640x460")
+        win = tk.Toplevel(self); win.title("Настройки"); win.configure(bg="#0b1220"); win.geometry("640x560")
         win.transient(self); win.grab_set()
         frm = ttk.Frame(win, padding=16); frm.pack(fill="both", expand=True)
 
@@ -338,8 +448,13 @@ class JarvisClientApp(tk.Tk):
         ttk.Entry(frm, textvariable=wake_var, width=48).grid(row=11, column=0, sticky="ew")
         ttk.Button(frm, text="Выбрать…", command=lambda: self._pick_file(wake_var, [("MP3","*.mp3"),("All","*.*")])).grid(row=11, column=1, padx=6)
 
+        # Резервные эндпоинты: по строке «url | model»
+        ttk.Label(frm, text="Резервные эндпоинты (url | model, по одному в строке):").grid(row=12, column=0, sticky="w", pady=(8,0))
+        eps_text = tk.Text(frm, height=3, wrap="none"); eps_text.insert("1.0", format_endpoints(self.cfg.endpoints))
+        eps_text.grid(row=13, column=0, columnspan=3, sticky="ew")
+
         frm.columnconfigure(0, weight=1); frm.rowconfigure(7, weight=1)
-        btns = ttk.Frame(frm); btns.grid(row=12, column=0, columnspan=3, sticky="e", pady=(12,0))
+        btns = ttk.Frame(frm); btns.grid(row=14, column=0, columnspan=3, sticky="e", pady=(12,0))
 
         def on_test():
             self._set_status("Проверка подключения…")
@@ -361,14 +476,25 @@ class JarvisClientApp(tk.Tk):
                 model=model_var.get().strip(),
                 temperature=float(temp_var.get()),
                 system_prompt=sys_text.get("1.0","end").strip(),
+                endpoints=parse_endpoints(eps_text.get("1.0","end")),
             )
             self.cfg = self.llm.get_config()
-            self.vosk_model_path = vosk_var.get().strip()
+            if vosk_var.get().strip() != self.vosk_model_path:
+                # старая модель больше не нужна — освобождаем память, новую грузим заранее
+                self.vosk_model_path = vosk_var.get().strip()
+                model_registry.release_except(self.vosk_model_path)
+                self._preload_vosk_model()
+            if wake_var.get().strip() != self.wake_mp3_path and wake_var.get().strip():
+                self._preload_sounds([wake_var.get().strip()])
             self.wake_mp3_path = wake_var.get().strip()
-            save_config(self.cfg, extra={
+            extra = {
                 "vosk_model_path": self.vosk_model_path,
                 "wake_mp3_path": self.wake_mp3_path
-            })
+            }
+            for key in ("http_pool", "intent_threshold", "voice", "tts"):
+                if key in self.extras:
+                    extra[key] = self.extras[key]
+            save_config(self.cfg, extra=extra)
             self._set_status("Настройки сохранены"); win.destroy()
 
         ttk.Button(btns, text="Сохранить", style="Accent.TButton", command=on_save).pack(side="left")
@@ -388,16 +514,31 @@ class JarvisClientApp(tk.Tk):
             filetypes=[("Images","*.png;*.jpg;*.jpeg;*.webp;*.bmp"), ("All files","*.*")],
         )
         if not path: return
-        try:
-            mime, _ = mimetypes.guess_type(path); mime = mime or "image/png"
-            with open(path,"rb") as f: b = f.read()
-            self.attached_image_b64 = base64.b64encode(b).decode("utf-8")
-            self.attached_image_mime = mime
-            self.attached_image_name = os.path.basename(path)
-            self._set_status(f"Прикреплено: {self.attached_image_name}")
-            self._append_system(f"📎 Вложение: {self.attached_image_name}")
-        except Exception as e:
-            messagebox.showerror("Ошибка", f"Не удалось прикрепить файл: {e}")
+        self._clear_attachment()
+        self._set_status("Подготовка изображения…")
+
+        # декодирование/уменьшение/пережатие — вне Tk-потока
+        def work():
+            try:
+                img = prepare_image(path, self.cfg.image_max_side, self.cfg.image_format, self.cfg.image_quality)
+            except Exception as e:
+                err = str(e)
+                self.after(10, lambda: messagebox.showerror("Ошибка", f"Не удалось прикрепить файл: {err}"))
+                return
+            self.after(10, lambda: self._apply_attachment(img))
+        threading.Thread(target=work, daemon=True).start()
+
+    def _apply_attachment(self, img):
+        self.attached_image_b64 = img.b64
+        self.attached_image_mime = img.mime
+        self.attached_image_name = img.name
+        size = f"{human_size(img.orig_bytes)} → {human_size(img.sent_bytes)}"
+        if img.width:
+            size += f", {img.width}×{img.height}"
+        if img.cached:
+            size += ", из кэша"
+        self._set_status(f"Прикреплено: {img.name}  ·  {size}  ·  {img.elapsed * 1000:.0f} мс")
+        self._append_system(f"📎 Вложение: {img.name} ({size})")
 
     def _clear_attachment(self):
         self.attached_image_b64 = None; self.attached_image_mime = None; self.attached_image_name = None
@@ -406,13 +547,81 @@ class JarvisClientApp(tk.Tk):
     def _send_text_from_voice(self, text: str):
         self.input.delete("1.0", "end")
         self.input.insert("1.0", text)
-        self._send_message()
+        self._send_message(source="voice")
 
-    def _send_message(self):
+    def _request_finished(self):
+        self._pending_requests = max(0, self._pending_requests - 1)
+        if not self._pending_requests:
+            self.send_btn.state(["!disabled"])
+
+    def _try_local_intent(self, text: str, source: str = "text") -> bool:
+        """Очевидная команда («погода», «привет») — выполняем сразу, без LLM."""
+        m = self.router.match(text)
+        if not m:
+            return False
+        if source == "voice":
+            # «последний побеждает», как у голосового запроса к LLM: старый ответ и его озвучка обрываются
+            self.llm.cancel_group(source)
+            self._cancel_speeches()
+        self._append_system(f"Команда (локально): {m.intent}  ·  уверенность {m.confidence:.2f}  ·  {m.elapsed_ms:.1f} мс")
+        self._set_status(f"Готов  ·  локальная команда «{m.intent}»")
+        # в историю — как очищенный ответ LLM: следующий запрос видит, что команда уже выполнена
+        self.messages.append({"role": "user", "content": text})
+        self.messages.append({"role": "assistant",
+                              "content": DEFAULT_REPLIES.get(m.intent, f"Выполняю команду «{m.intent}».")})
+        save_history(self.messages)
+        self._run_agent_command(m.intent)
+        return True
+
+    def _run_agent_command(self, cmd: str):
+        """handle_command в отдельном потоке (MP3 и браузер не должны держать Tk)."""
+        def run():
+            try:
+                result = handle_command(cmd)
+            except Exception as e:
+                result = f"Ошибка агента: {e}"
+            self.after(10, lambda: self._append_system(f"АГЕНТ: {result}" if result else "АГЕНТ: OK"))
+        threading.Thread(target=run, daemon=True).start()
+
+    def _new_speech(self, supersede: bool = False):
+        """
+        Конвейерная озвучка ответа (Scipts/tts_pipeline.py); None — говорим целиком после ответа.
+        Настройки — словарь "tts" в конфиге: {"pipelined": true, "prefetch": 2, "pause_ms": 180, …}.
+        supersede — новый ответ перебивает недоговорённые старые (голос: «последний побеждает»);
+        иначе он ждёт своей очереди и звучит после них.
+        """
+        opts = dict(self.extras.get("tts") or {})
+        if not opts.pop("pipelined", True):
+            return None
+        from Scipts.tts_pipeline import SpeechConfig, SpeechPipeline  # ленивый импорт, как у TTS
+        opts.setdefault("hold_last", True)  # вступление перед тегом команды не озвучиваем
+        sc = SpeechConfig(
+            sample_path=os.path.abspath(os.path.join(os.path.dirname(__file__), "JarvisVoice", "instruction.wav")),
+            voice_id="jarvis",
+            **{k: v for k, v in opts.items() if k in SpeechConfig.__annotations__ and k != "sample_path"},
+        )
+        self._speeches = [p for p in self._speeches if not p.is_done()]
+        if supersede:
+            self._cancel_speeches()
+        pipe = SpeechPipeline(sc, on_done=lambda msg: self.after(10, lambda: self._append_system(f"ОЗВУЧКА: {msg}")),
+                              after=self._speeches[-1] if self._speeches else None)
+        self._speeches.append(pipe)
+        return pipe
+
+    def _cancel_speeches(self):
+        for p in self._speeches:
+            p.cancel()
+        self._speeches = []
+
+    def _send_message(self, source: str = "text"):
         text = self.input.get("1.0","end").strip()
         if not text: return
         self._append_user(text)
 
+        if not self.attached_image_b64 and self._try_local_intent(text, source):
+            self.input.delete("1.0","end")
+            return
+
         attachment = None
         if self.attached_image_b64:
             attachment = {"b64": self.attached_image_b64, "mime": self.attached_image_mime or "image/png",
@@ -423,38 +632,75 @@ class JarvisClientApp(tk.Tk):
             history=self.messages,
             user_text=text,
             attachment=attachment,
-            max_turns_to_send=MAX_TURNS_TO_SEND,
             force_text_only=False,
         )
 
+        self._pending_requests += 1
         self.send_btn.state(["disabled"]); self._set_status("Запрос к модели…")
 
+        # потоковый вывод: блок ответа создаётся на первом куске
+        stream = {"mark": None}
+        # озвучка по предложениям начинается прямо из стрима; None — конвейер выключен
+        # (on_delta получает текст уже без тегов; хвост, похожий на начало тега, придержан сканером)
+        speech = {"pipe": self._new_speech(supersede=(source == "voice")), "fed": False}
+
+        def cancel_speech():
+            if speech["pipe"] is not None:
+                speech["pipe"].cancel()
+
+        def on_delta(chunk: str):
+            if speech["pipe"] is not None:
+                speech["fed"] = True
+                speech["pipe"].feed(chunk)
+
+            def _apply_chunk():
+                if stream["mark"] is None:
+                    stream["mark"] = self._begin_assistant_stream()
+                self._append_stream_chunk(stream["mark"], chunk)
+            self.after(0, _apply_chunk)
+
+        def on_command(cmd: str):
+            # тег пришёл посреди генерации — запускаем действие, не дожидаясь конца ответа
+            self.after(0, lambda: self._append_system(f"Команда от LLM: {cmd}"))
+            cancel_speech()  # команда — ответ не озвучиваем
+            self._run_agent_command(cmd)
+
         def on_success(*args):
             if len(args) == 3: answer_text, latency, meta = args
             elif len(args) == 2: answer_text, latency = args; meta = {}
             else: answer_text, latency, meta = "(пустой ответ)", 0.0, {}
 
             def _apply():
-                self.send_btn.state(["!disabled"])
-                self._append_assistant((answer_text or "").strip() or "(пустой ответ)")
-                self._set_status(f"Готов  ·  {latency:.2f}s")
+                self._request_finished()
+                final_text = (answer_text or "").strip() or "(пустой ответ)"
+                if stream["mark"] is not None:
+                    self._finish_assistant_stream(stream["mark"], final_text)
+                else:
+                    self._append_assistant(final_text)
+                ttft = (meta or {}).get("first_token_latency")
+                if (meta or {}).get("cache") == "hit":
+                    st = self.llm.cache_stats()
+                    self._set_status(f"Готов  ·  {latency:.2f}s  ·  из кэша ({st['hits']}/{st['hits'] + st['misses']})")
+                elif ttft is not None:
+                    self._set_status(f"Готов  ·  {latency:.2f}s  ·  первый токен {ttft:.2f}s  ·  {meta.get('model', '')}")
+                else:
+                    self._set_status(f"Готов  ·  {latency:.2f}s")
                 # история
-                last_user = {"role":"user","content": req_last_user_from_ui(self.chat)}
-                if last_user["content"]: self.messages.append(last_user)
+                self.messages.append({"role":"user","content": text})
                 self.messages.append({"role":"assistant","content": answer_text})
                 save_history(self.messages)
                 # если когда-нибудь снова понадобятся LLM-команды, тут их можно обработать:
                 cmd = (meta or {}).get("command") or ""
                 if cmd:
-                    self._append_system(f"Команда от LLM: {cmd}")
-                    def run():
-                        try:
-                            result = handle_command(cmd)
-                        except Exception as e:
-                            result = f"Ошибка агента: {e}"
-                        self.after(10, lambda: self._append_system(f"АГЕНТ: {result}" if result else "АГЕНТ: OK"))
-                    threading.Thread(target=run, daemon=True).start()
+                    cancel_speech()
+                    if not (meta or {}).get("command_dispatched"):  # при стриминге уже запущена из потока
+                        self._append_system(f"Команда от LLM: {cmd}")
+                        self._run_agent_command(cmd)
                 # ... внутри def _apply() после if cmd: ... else:
+                elif speech["pipe"] is not None:
+                    if not speech["fed"]:  # ответ из кэша или без стрима — текст целиком
+                        speech["pipe"].feed(answer_text)
+                    speech["pipe"].finish()
                 else:
                     # озвучиваем обычный текст (без команд) клонированным голосом
                     sample_voice_path = os.path.abspath(
@@ -481,28 +727,32 @@ class JarvisClientApp(tk.Tk):
             self.after(10, _apply)
 
         def on_error(err_text: str):
+            cancel_speech()
             self.after(10, lambda: self._apply_error(err_text))
 
-        self.llm.send_chat_async(req_messages, on_success, on_error)
+        def on_cancel():
+            # вытеснен более свежей голосовой командой
+            cancel_speech()
+            def _apply_cancel():
+                self._request_finished()
+                if stream["mark"] is not None:
+                    self._append_stream_chunk(stream["mark"], " … (прервано)")
+                self._append_system(f"Запрос «{text[:40]}» отменён: пришла новая команда.")
+            self.after(10, _apply_cancel)
+
+        # голос: «последний побеждает» — новая команда обрывает незавершённую генерацию
+        self.llm.send_chat_async(
+            req_messages, on_success, on_error, on_delta=on_delta,
+            group=source, supersede=(source == "voice"), on_cancel=on_cancel, on_command=on_command,
+        )
         self.input.delete("1.0","end"); self._clear_attachment()
 
     def _apply_error(self, err: str):
-        self.send_btn.state(["!disabled"]); self._set_status("Ошибка: " + err)
+        self._request_finished(); self._set_status("Ошибка: " + err)
         messagebox.showerror("Ошибка запроса", err)
 
-# вытащить последний ввод пользователя из Text
-def req_last_user_from_ui(chat_text: tk.Text) -> str:
-    content = chat_text.get("1.0","end")
-    lines = [l.rstrip("\n") for l in content.splitlines()]
-    for i in range(len(lines)-1, -1, -1):
-        if lines[i].startswith("Вы  ·  "):
-            msg = []
-            for j in range(i+1, len(lines)):
-                if lines[j].strip() == "": break
-                msg.append(lines[j])
-            return "\n".join(msg).strip()
-    return ""
-
 if __name__ == "__main__":
+    import logging
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(name)s | %(message)s")
     app = JarvisClientApp()
     app.mainloop()
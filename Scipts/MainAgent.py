@@ -24,6 +24,7 @@ def play_mp3(path: str) -> str:
     Проигрывает MP3 из указанного пути.
     Возвращает строку-результат для GUI/логов.
     Поддерживает unicode-пути (кириллица) на Windows.
+    Сначала — общий поток вывода (Scipts/audio_engine.py, не блокирует), иначе MCI/playsound.
     """
     if not path:
         return "Путь к mp3 не указан."
@@ -31,6 +32,14 @@ def play_mp3(path: str) -> str:
     if not os.path.exists(path):
         return f"Файл не найден: {path}"
 
+    try:
+        from Scipts.audio_engine import get_engine
+        engine = get_engine()
+    except Exception:
+        engine = None
+    if engine is not None and engine.play(path):
+        return f"Проиграл: {os.path.basename(path)}"
+
     try:
         if sys.platform.startswith("win"):
             return _play_mp3_windows(path)
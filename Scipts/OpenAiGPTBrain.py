@@ -1,11 +1,21 @@
 # llm_client.py
 from __future__ import annotations
+import asyncio
+import json
 import time
 import threading
 import re
-from dataclasses import dataclass
-from typing import List, Dict, Any, Optional, Callable, Tuple
-import requests
+import itertools
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Callable, Tuple, Awaitable, AsyncIterator
+import aiohttp  # pip install aiohttp
+
+from Scipts import http_pool
+from Scipts.context_packer import ContextPacker, make_token_counter
+from Scipts.endpoint_pool import Endpoint, EndpointPool, PROBE_INTERVAL_SEC
+from Scipts.llm_cache import ResponseCache, make_key
 
 # ==== базовые настройки ====
 DEFAULT_API_URL = "http://192.168.100.8:1234/v1/chat/completions"
@@ -13,6 +23,8 @@ DEFAULT_MODEL = "openai/gpt-oss-20b"
 REQUEST_TIMEOUT_SEC = 1000
 FORCE_MAX_TOKENS = 512
 FORCE_TEMPERATURE = 0.0
+# ответы, после которых пробуем следующий эндпоинт (сервер перегружен/упал, а не плохой запрос)
+FAILOVER_STATUSES = frozenset({500, 502, 503, 504})
 
 # Протокол команды в ответе: <<COMMAND=приветствие>>
 COMMAND_PATTERN = re.compile(r"<<\s*COMMAND\s*=\s*([\w\-А-Яа-я]+)\s*>>")
@@ -33,32 +45,334 @@ class LLMConfig:
     "он всего лишь запускает локальное действие (открытие страницы погоды)."
     )
     supports_images: bool = True
+    stream: bool = True  # SSE-стриминг ответа, если передан on_delta
+    # кэш ответов (только при нулевой температуре — ответ детерминирован)
+    cache_enabled: bool = True
+    cache_max_entries: int = 256
+    cache_max_bytes: int = 4 * 1024 * 1024
+    cache_path: str = ""  # пусто — кэш только в памяти
+    # упаковка контекста по бюджету токенов
+    prompt_token_budget: int = 1500   # весь промпт: system + сводка + история + вопрос
+    system_token_budget: int = 400    # потолок для system prompt
+    summary_token_budget: int = 160   # потолок для сводки свёрнутой истории
+    tokenizer: str = "auto"           # "auto" (tiktoken, если есть), "estimate" или имя кодировки tiktoken
+    # планировщик запросов (asyncio, один фоновый event loop)
+    max_parallel_requests: int = 2    # одновременных генераций на сервере
+    max_queued_requests: int = 8      # сверх этого старейший ожидающий запрос отменяется
+    # резервные эндпоинты: [{"url": ".../v1/chat/completions", "model": "..."}]; основной — api_url/model
+    endpoints: List[Dict[str, str]] = field(default_factory=list)
+    health_probe_sec: float = PROBE_INTERVAL_SEC
+    # подготовка картинок-вложений под vision-модель
+    image_max_side: int = 1024        # px по длинной стороне
+    image_format: str = "JPEG"        # JPEG или WEBP
+    image_quality: int = 85
+
+
+class RequestCancelled(Exception):
+    """Запрос отменён (вручную или вытеснен более свежим)."""
+
+
+_request_ids = itertools.count(1)
+
+
+class RequestHandle:
+    """Дескриптор запроса в планировщике: состояние, тайминги очереди, отмена."""
+
+    def __init__(self, group: Optional[str] = None, on_cancel: Optional[Callable[[], None]] = None):
+        self.id = next(_request_ids)
+        self.group = group
+        self.state = "queued"  # queued | running | done | cancelled
+        self.queued_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.on_cancel = on_cancel
+        self.done = threading.Event()
+        self._cancel = threading.Event()
+        self._abort: Optional[Callable[[], Any]] = None  # отмена задачи в event loop
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    @property
+    def wait_time(self) -> float:
+        end = self.started_at or self.finished_at or time.time()
+        return end - self.queued_at
+
+    def cancel(self) -> None:
+        """Отменить; задача в event loop снимается, HTTP-поток закрывается вместе с ней."""
+        self._cancel.set()
+        with self._lock:
+            abort = self._abort
+        if abort is not None:
+            abort()
+
+    def set_abort(self, abort: Callable[[], Any]) -> None:
+        with self._lock:
+            self._abort = abort
+        if self.cancelled:
+            abort()
+
+    def raise_if_cancelled(self) -> None:
+        if self.cancelled:
+            raise RequestCancelled()
+
+
+# ---------- Фоновый event loop для callback-API ----------
+_bg_loop: Optional[asyncio.AbstractEventLoop] = None
+_bg_loop_lock = threading.Lock()
+
+
+def background_loop() -> asyncio.AbstractEventLoop:
+    """Один общий event loop в daemon-потоке: все запросы GUI живут на нём."""
+    global _bg_loop
+    with _bg_loop_lock:
+        if _bg_loop is None:
+            _bg_loop = asyncio.new_event_loop()
+            threading.Thread(target=_bg_loop.run_forever, daemon=True, name="llm-loop").start()
+        return _bg_loop
+
+
+class RequestScheduler:
+    """
+    Ограниченное число одновременных запросов к LLM (asyncio.Semaphore на общем loop).
+    submit(..., supersede=True) отменяет предыдущие запросы той же группы ("последний побеждает").
+    """
+
+    def __init__(self, max_workers: int = 2, max_queue: int = 8, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(1, max_queue)
+        self._loop = loop
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._lock = threading.Lock()
+        self._waiting: "OrderedDict[int, RequestHandle]" = OrderedDict()
+        self._active: Dict[int, RequestHandle] = {}
+        self._completed = 0
+        self._cancelled = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._last_wait = 0.0
+
+    def submit(
+        self,
+        fn: Callable[[RequestHandle], Awaitable[None]],
+        group: Optional[str] = None,
+        supersede: bool = False,
+        on_cancel: Optional[Callable[[], None]] = None,
+    ) -> RequestHandle:
+        handle = RequestHandle(group, on_cancel)
+        with self._lock:
+            dropped: List[RequestHandle] = []
+            if supersede and group:
+                dropped += [h for h in (*self._active.values(), *self._waiting.values()) if h.group == group]
+            waiting = [h for h in self._waiting.values() if h not in dropped]
+            dropped += waiting[:max(0, len(waiting) - self.max_queue + 1)]
+            self._waiting[handle.id] = handle
+        for h in dropped:
+            h.cancel()
+        loop = self._loop or background_loop()
+        fut = asyncio.run_coroutine_threadsafe(self._run(handle, fn), loop)
+        fut.add_done_callback(lambda _f: self._finish(handle))
+        handle.set_abort(fut.cancel)
+        return handle
+
+    def cancel_group(self, group: str) -> int:
+        """Отменить незавершённые запросы группы (как supersede, но без нового запроса)."""
+        with self._lock:
+            dropped = [h for h in (*self._active.values(), *self._waiting.values()) if h.group == group]
+        for h in dropped:
+            h.cancel()
+        return len(dropped)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            started = self._completed + self._cancelled + len(self._active)
+            oldest = next(iter(self._waiting.values()), None)
+            return {
+                "queue_depth": len(self._waiting),
+                "running": len(self._active),
+                "workers": self.max_workers,
+                "completed": self._completed,
+                "cancelled": self._cancelled,
+                "last_wait": self._last_wait,
+                "max_wait": self._wait_max,
+                "avg_wait": (self._wait_total / started) if started else 0.0,
+                "oldest_wait": (time.time() - oldest.queued_at) if oldest else 0.0,
+            }
+
+    # ---------- Внутреннее ----------
+    async def _run(self, handle: RequestHandle, fn: Callable[[RequestHandle], Awaitable[None]]) -> None:
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.max_workers)
+        async with self._sem:
+            if handle.cancelled:
+                return
+            with self._lock:
+                self._waiting.pop(handle.id, None)
+                handle.state = "running"
+                handle.started_at = time.time()
+                self._active[handle.id] = handle
+                self._last_wait = handle.wait_time
+                self._wait_total += self._last_wait
+                self._wait_max = max(self._wait_max, self._last_wait)
+            try:
+                await fn(handle)
+            except RequestCancelled:
+                pass
+            except asyncio.CancelledError:
+                if not handle.cancelled:
+                    raise  # снимают сам loop (выход из приложения) — отмену не глотаем
+
+    def _finish(self, handle: RequestHandle) -> None:
+        with self._lock:
+            if handle.done.is_set():
+                return
+            self._waiting.pop(handle.id, None)
+            self._active.pop(handle.id, None)
+            handle.finished_at = time.time()
+            handle.state = "cancelled" if handle.cancelled else "done"
+            if handle.cancelled:
+                self._cancelled += 1
+            else:
+                self._completed += 1
+            handle.done.set()
+        if handle.cancelled and handle.on_cancel:
+            try:
+                handle.on_cancel()
+            except Exception:
+                pass
 
-class LLMClient:
-    """Вся работа с LLM/HTTP + извлечение команд из ответа."""
+
+def _is_failover_error(e: Exception) -> bool:
+    if isinstance(e, aiohttp.ClientResponseError):
+        return e.status in FAILOVER_STATUSES
+    return isinstance(e, (aiohttp.ClientConnectorError, aiohttp.ServerDisconnectedError, asyncio.TimeoutError))
+
+
+@dataclass
+class ChatResult:
+    text: str                 # ответ без тегов команд
+    latency: float
+    meta: Dict[str, Any]      # http_status, preview, command, stream, first_token_latency, cache, ...
+
+    @property
+    def command(self) -> str:
+        return self.meta.get("command", "")
+
+
+class CommandTagScanner:
+    """
+    Инкрементальный поиск <<COMMAND=...>> в потоке кусков.
+    feed(chunk) -> (текст для показа, найденные команды); хвост, который может оказаться
+    началом тега (например "<" или "<<COMM"), придерживается до следующего куска.
+    """
+
+    MAX_TAG_LEN = 64  # дольше «открытый» тег не ждём — это просто текст с "<<"
+
+    def __init__(self):
+        self._buf = ""
+        self.commands: List[str] = []
+
+    def feed(self, chunk: str) -> Tuple[str, List[str]]:
+        self._buf += chunk
+        out: List[str] = []
+        found: List[str] = []
+        while True:
+            m = COMMAND_PATTERN.search(self._buf)
+            if m:
+                out.append(self._buf[:m.start()])
+                found.append(m.group(1).strip().lower())
+                self._buf = self._buf[m.end():]
+                continue
+            hold = self._partial_tag_start(self._buf)
+            out.append(self._buf[:hold])
+            self._buf = self._buf[hold:]
+            break
+        self.commands.extend(found)
+        return "".join(out), found
+
+    def flush(self) -> str:
+        """Конец потока: всё придержанное — обычный текст."""
+        rest, self._buf = self._buf, ""
+        return rest
+
+    @classmethod
+    def _partial_tag_start(cls, buf: str) -> int:
+        """Индекс, с которого buf может продолжиться в тег; len(buf), если придерживать нечего."""
+        if buf.endswith("<"):
+            return len(buf) - (2 if buf.endswith("<<") else 1)
+        i = buf.rfind("<<")
+        if i < 0 or len(buf) - i > cls.MAX_TAG_LEN or ">>" in buf[i:]:
+            return len(buf)
+        tail = re.sub(r"\s+", "", buf[i + 2:]).upper()
+        if "COMMAND".startswith(tail[:7]) and (len(tail) <= 7 or tail[7] == "="):
+            return i
+        return len(buf)
+
+
+def _sse_payload(line: str) -> Optional[Dict[str, Any]]:
+    """Строка SSE -> JSON-кусок; None для служебных строк и [DONE]."""
+    if not line.startswith("data:"):
+        return None
+    data = line[5:].strip()
+    if not data or data == "[DONE]":
+        return None
+    try:
+        return json.loads(data)
+    except ValueError:
+        return None
+
+
+class AsyncLLMClient:
+    """
+    Асинхронный клиент LLM: сбор messages, кэш, выбор эндпоинта и извлечение команд
+    как у LLMClient, но запросы — корутины chat()/stream_chat() на aiohttp.
+    Много одновременных запросов живут на одном event loop без отдельных потоков.
+    """
 
     def __init__(self, cfg: Optional[LLMConfig] = None):
         self.cfg = cfg or LLMConfig()
+        self.cache = ResponseCache(
+            max_entries=self.cfg.cache_max_entries,
+            max_bytes=self.cfg.cache_max_bytes,
+            path=self.cfg.cache_path,
+        )
+        self.packer = ContextPacker(make_token_counter(self.cfg.tokenizer))
+        self.last_pack_info: Dict[str, Any] = {}
+        self.endpoints = EndpointPool(self._endpoint_list())
+        # aiohttp-сессия привязана к своему loop
+        self._sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.ClientSession]" = (
+            weakref.WeakKeyDictionary()
+        )
 
     def set_config(self, **kwargs) -> None:
         for k, v in kwargs.items():
             if hasattr(self.cfg, k):
                 setattr(self.cfg, k, v)
+        if "tokenizer" in kwargs:
+            self.packer.count_tokens = make_token_counter(self.cfg.tokenizer)
+        if {"api_url", "model", "endpoints"} & set(kwargs):
+            self.endpoints.set_endpoints(self._endpoint_list())
+
+    def _endpoint_list(self) -> List[Endpoint]:
+        eps = [Endpoint(self.cfg.api_url, self.cfg.model)]
+        for e in self.cfg.endpoints or []:
+            url = (e.get("url") or "").strip()
+            if url:
+                ep = Endpoint(url, (e.get("model") or self.cfg.model).strip())
+                if ep.key not in {x.key for x in eps}:
+                    eps.append(ep)
+        return eps
 
     def get_config(self) -> LLMConfig:
         return self.cfg
 
-    # Быстрый пинг
-    def test_api(self, api_url: Optional[str] = None, model: Optional[str] = None) -> Dict[str, Any]:
-        url = api_url or self.cfg.api_url
-        mdl = model or self.cfg.model
-        payload = {"model": mdl, "messages": [{"role": "user", "content": "ping"}], "max_tokens": 8, "temperature": 0}
-        t0 = time.time()
-        r = requests.post(url, json=payload, timeout=10)
-        r.raise_for_status()
-        data = r.json()
-        txt = (data.get("choices", [{}])[0].get("message", {}) or {}).get("content", "")
-        return {"ok": True, "text": txt, "latency": time.time() - t0, "raw": data}
+    def cache_stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
+
+    def endpoint_stats(self) -> List[Dict[str, Any]]:
+        return self.endpoints.stats()
 
     # Сбор messages для chat.completions
     def build_messages(
@@ -67,22 +381,29 @@ class LLMClient:
         history: List[Dict[str, Any]],
         user_text: str,
         attachment: Optional[Dict[str, str]] = None,  # {"mime":..., "b64":..., "name":...}
-        max_turns_to_send: int = 2,
+        max_turns_to_send: Optional[int] = None,  # жёсткий лимит пар реплик поверх бюджета токенов
         force_text_only: bool = False,
     ) -> List[Dict[str, Any]]:
         msgs: List[Dict[str, Any]] = []
 
-        if system_prompt:
-            sys_short = system_prompt.strip()
-            if len(sys_short) > 900:
-                sys_short = sys_short[:900] + " …"
-            msgs.append({"role": "system", "content": sys_short})
-
         turns: List[Dict[str, Any]] = []
         for m in history:
             if m.get("role") in ("user", "assistant"):
                 turns.append({"role": m["role"], "content": str(m.get("content", ""))})
-        msgs.extend(turns[-(max_turns_to_send * 2):])
+
+        # свежие реплики по бюджету токенов, остальное — в скользящую сводку внутри system
+        system_content, kept, self.last_pack_info = self.packer.pack(
+            system_prompt or "",
+            turns,
+            user_text,
+            budget=self.cfg.prompt_token_budget,
+            system_budget=self.cfg.system_token_budget,
+            summary_budget=self.cfg.summary_token_budget,
+            max_turns=max_turns_to_send,
+        )
+        if system_content:
+            msgs.append({"role": "system", "content": system_content})
+        msgs.extend(kept)
 
         if attachment and (not force_text_only) and self.cfg.supports_images and attachment.get("b64"):
             parts = [{"type": "text", "text": user_text}]
@@ -107,35 +428,310 @@ class LLMClient:
             text = COMMAND_PATTERN.sub("", text).strip()
         return cmd, text
 
-    # Отправка в отдельном потоке
+    # ---------- HTTP ----------
+    async def _session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            pool = http_pool.get_config()
+            connector = aiohttp.TCPConnector(limit=pool.pool_size, keepalive_timeout=60)
+            session = aiohttp.ClientSession(connector=connector)
+            self._sessions[loop] = session
+        return session
+
+    async def aclose(self) -> None:
+        session = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None:
+            await session.close()
+
+    async def _post_completion(
+        self,
+        ep: Endpoint,
+        payload: Dict[str, Any],
+        on_delta: Optional[Callable[[str], None]],
+        t0: float,
+        handle: Optional[RequestHandle],
+    ) -> Dict[str, Any]:
+        """Один запрос к эндпоинту. При on_delta читает SSE-поток и отдаёт куски по мере прихода."""
+        connect, read = http_pool.timeout_for("llm.chat", REQUEST_TIMEOUT_SEC)
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=connect, sock_read=read)
+        session = await self._session()
+        out: Dict[str, Any] = {"first_token_latency": None, "usage": None}
+        async with session.post(ep.url, json=payload, timeout=timeout) as r:
+            out["http_status"] = r.status
+            if r.status >= 400:
+                body = await r.text()
+                raise aiohttp.ClientResponseError(
+                    r.request_info, r.history, status=r.status, message=f"{r.reason}: {body[:300]}",
+                )
+            if on_delta is None:
+                data = await r.json(content_type=None)
+                content = ""
+                if isinstance(data.get("choices"), list) and data["choices"]:
+                    content = data["choices"][0].get("message", {}).get("content", "") or ""
+                out.update(content=content, preview=json.dumps(data, ensure_ascii=False)[:500], usage=data.get("usage"))
+                return out
+
+            parts: List[str] = []
+            async for raw in r.content:  # построчно
+                if handle:
+                    handle.raise_if_cancelled()
+                chunk = _sse_payload(raw.decode("utf-8", "replace").strip())
+                if chunk is None:
+                    continue
+                if chunk.get("usage"):
+                    out["usage"] = chunk["usage"]
+                choices = chunk.get("choices") or []
+                if not choices:
+                    continue
+                delta = (choices[0].get("delta") or {}).get("content") or ""
+                if not delta:
+                    continue
+                if out["first_token_latency"] is None:
+                    out["first_token_latency"] = time.time() - t0
+                parts.append(delta)
+                on_delta(delta)
+            content = "".join(parts)
+            out.update(content=content, preview=content[:500])
+            return out
+
+    async def chat(
+        self,
+        messages: List[Dict[str, Any]],
+        on_delta: Optional[Callable[[str], None]] = None,
+        stream: Optional[bool] = None,
+        handle: Optional[RequestHandle] = None,
+        on_command: Optional[Callable[[str], None]] = None,
+    ) -> ChatResult:
+        """
+        Один ход чата. stream=None — стримить, если передан on_delta и включён cfg.stream.
+        Кэш (при нулевой температуре) и переключение эндпоинтов при ошибке соединения — как в LLMClient.
+        on_command(cmd) при стриминге вызывается сразу, как только тег <<COMMAND=...>> пришёл
+        целиком (генерация продолжается); тег при этом не попадает в on_delta,
+        а в meta["command_dispatched"] — True.
+        """
+        use_stream = (bool(on_delta) and self.cfg.stream) if stream is None else bool(stream)
+        raw_emit = on_delta or (lambda _chunk: None)
+        scanner = CommandTagScanner() if (use_stream and on_command) else None
+
+        def emit(chunk: str):
+            if scanner is None:
+                raw_emit(chunk)
+                return
+            visible, found = scanner.feed(chunk)
+            if visible:
+                raw_emit(visible)
+            for cmd in found:
+                on_command(cmd)
+
+        def flush_scanner() -> bool:
+            if scanner is None:
+                return False
+            rest = scanner.flush()
+            if rest:
+                raw_emit(rest)
+            return bool(scanner.commands)
+        payload: Dict[str, Any] = {
+            "model": self.cfg.model,
+            "messages": messages,
+            "max_tokens": FORCE_MAX_TOKENS,
+            "temperature": FORCE_TEMPERATURE,
+        }
+        if use_stream:
+            payload["stream"] = True
+        t0 = time.time()
+        queue_wait = handle.wait_time if handle else 0.0
+        candidates = self.endpoints.candidates()
+
+        cache_key = ""
+        if self.cfg.cache_enabled and FORCE_TEMPERATURE == 0:
+            cache_key = make_key(candidates[0].model, messages, FORCE_MAX_TOKENS, FORCE_TEMPERATURE)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                if use_stream:
+                    emit(cached)
+                dispatched = flush_scanner()
+                cmd, clean = self.extract_command_and_clean(cached)
+                meta = {
+                    "http_status": None,
+                    "preview": cached[:500],
+                    "command": cmd,
+                    "stream": use_stream,
+                    "first_token_latency": time.time() - t0 if use_stream else None,
+                    "cache": "hit",
+                    "queue_wait": queue_wait,
+                    "usage": None,
+                    "command_dispatched": dispatched,
+                }
+                return ChatResult(clean, time.time() - t0, meta)
+
+        emitted = [False]
+
+        def _delta(chunk: str):
+            emitted[0] = True
+            emit(chunk)
+
+        # лучший по задержке здоровый эндпоинт; соединение/таймаут/5xx — следующий.
+        # Если все не ответили на уровне соединения (запрос до сервера не дошёл) — новый круг
+        # с паузой backoff * 2^n, как повторы http_pool (pool.retries кругов)
+        pool = http_pool.get_config()
+        last_error: Optional[Exception] = None
+        out: Optional[Dict[str, Any]] = None
+        for round_no in range(pool.retries + 1):
+            if round_no:
+                await asyncio.sleep(pool.backoff * 2 ** (round_no - 1))
+            connect_only = True
+            for ep in candidates:
+                payload["model"] = ep.model
+                attempt_t0 = time.time()
+                try:
+                    out = await self._post_completion(ep, payload, _delta if use_stream else None, t0, handle)
+                except Exception as e:
+                    if not _is_failover_error(e) or (handle and handle.cancelled) or emitted[0]:
+                        raise
+                    self.endpoints.report_failure(ep, str(e) or type(e).__name__)
+                    last_error = e
+                    connect_only = connect_only and isinstance(e, aiohttp.ClientConnectorError)
+                    continue
+                # без стрима первого токена нет — в EWMA идёт время всего запроса
+                latency = out["first_token_latency"]
+                self.endpoints.report_success(ep, latency if latency is not None else time.time() - attempt_t0)
+                break
+            if out is not None or not connect_only:
+                break
+        if out is None:
+            raise last_error or RuntimeError("нет доступных эндпоинтов")
+
+        dispatched = flush_scanner()
+        content = out["content"]
+        if cache_key and content.strip():
+            # после переключения на резервный эндпоинт ответ принадлежит его модели
+            if ep.model != candidates[0].model:
+                cache_key = make_key(ep.model, messages, FORCE_MAX_TOKENS, FORCE_TEMPERATURE)
+            self.cache.put(cache_key, content)
+        cmd, clean = self.extract_command_and_clean(content)
+        meta = {
+            "http_status": out["http_status"],
+            "preview": out["preview"],
+            "command": cmd,
+            "stream": use_stream,
+            "first_token_latency": out["first_token_latency"],
+            "cache": "miss" if cache_key else "off",
+            "queue_wait": queue_wait,
+            "endpoint": ep.url,
+            "model": ep.model,
+            "usage": out["usage"],
+            "command_dispatched": dispatched,
+        }
+        return ChatResult(clean, time.time() - t0, meta)
+
+    async def stream_chat(
+        self,
+        messages: List[Dict[str, Any]],
+        handle: Optional[RequestHandle] = None,
+    ) -> AsyncIterator[str]:
+        """Асинхронный итератор по кускам ответа (сырой текст, теги команд не вырезаются)."""
+        q: "asyncio.Queue[Any]" = asyncio.Queue()
+        done = object()
+
+        async def _run():
+            try:
+                return await self.chat(messages, on_delta=q.put_nowait, stream=True, handle=handle)
+            finally:
+                q.put_nowait(done)
+
+        task = asyncio.ensure_future(_run())
+        try:
+            while True:
+                item = await q.get()
+                if item is done:
+                    break
+                yield item
+            await task  # пробросить ошибку запроса
+        finally:
+            if not task.done():
+                task.cancel()
+
+
+class LLMClient(AsyncLLMClient):
+    """
+    Вся работа с LLM/HTTP + извлечение команд из ответа.
+    Callback-API поверх AsyncLLMClient: запросы выполняются корутинами на общем фоновом loop.
+    """
+
+    def __init__(self, cfg: Optional[LLMConfig] = None):
+        super().__init__(cfg)
+        self.scheduler = RequestScheduler(self.cfg.max_parallel_requests, self.cfg.max_queued_requests)
+        self._sync_probes()
+
+    def set_config(self, **kwargs) -> None:
+        super().set_config(**kwargs)
+        if {"api_url", "model", "endpoints"} & set(kwargs):
+            self._sync_probes()
+
+    def _sync_probes(self) -> None:
+        # пробы нужны, только когда есть из чего выбирать
+        if len(self.endpoints.endpoints()) > 1:
+            self.endpoints.start_probes(
+                lambda ep: self.test_api(ep.url, ep.model)["latency"], self.cfg.health_probe_sec
+            )
+        else:
+            self.endpoints.stop_probes()
+
+    def scheduler_stats(self) -> Dict[str, Any]:
+        return self.scheduler.stats()
+
+    def cancel_group(self, group: str) -> int:
+        return self.scheduler.cancel_group(group)
+
+    # Быстрый пинг
+    def test_api(self, api_url: Optional[str] = None, model: Optional[str] = None) -> Dict[str, Any]:
+        url = api_url or self.cfg.api_url
+        mdl = model or self.cfg.model
+        payload = {"model": mdl, "messages": [{"role": "user", "content": "ping"}], "max_tokens": 8, "temperature": 0}
+        t0 = time.time()
+        r = http_pool.get_session("llm").post(url, json=payload, timeout=http_pool.timeout_for("llm.ping", 10))
+        r.raise_for_status()
+        data = r.json()
+        txt = (data.get("choices", [{}])[0].get("message", {}) or {}).get("content", "")
+        return {"ok": True, "text": txt, "latency": time.time() - t0, "raw": data}
+
+    # Отправка через планировщик (корутина на общем фоновом loop)
     def send_chat_async(
         self,
         messages: List[Dict[str, Any]],
         on_success: Callable[[str, float, Dict[str, Any]], None],
         on_error: Callable[[str], None],
-    ) -> None:
-        def _worker():
+        on_delta: Optional[Callable[[str], None]] = None,
+        group: Optional[str] = None,
+        supersede: bool = False,
+        on_cancel: Optional[Callable[[], None]] = None,
+        on_command: Optional[Callable[[str], None]] = None,
+    ) -> RequestHandle:
+        """
+        Если передан on_delta и включён cfg.stream — ответ читается SSE-потоком,
+        on_delta(text_chunk) вызывается на каждый кусок, в meta["first_token_latency"]
+        попадает время до первого токена. on_success всегда получает полный очищенный текст.
+
+        supersede=True отменяет незавершённые запросы той же group (поток обрывается);
+        у отменённого запроса вызывается только on_cancel. В meta["queue_wait"] — ожидание в очереди.
+        on_command(cmd) — ранний запуск команды прямо из потока (см. AsyncLLMClient.chat).
+        Колбэки вызываются из потока event loop.
+        """
+        async def _job(handle: RequestHandle):
             try:
-                payload = {
-                    "model": self.cfg.model,
-                    "messages": messages,
-                    "max_tokens": FORCE_MAX_TOKENS,
-                    "temperature": FORCE_TEMPERATURE,
-                }
-                t0 = time.time()
-                r = requests.post(self.cfg.api_url, json=payload, timeout=REQUEST_TIMEOUT_SEC)
-                preview = r.text[:500] if isinstance(r.text, str) else str(r.text)[:500]
-                r.raise_for_status()
-                data = r.json()
-                content = ""
-                if isinstance(data.get("choices"), list) and data["choices"]:
-                    content = data["choices"][0].get("message", {}).get("content", "") or ""
-                cmd, clean = self.extract_command_and_clean(content)
-                meta = {"http_status": r.status_code, "preview": preview, "command": cmd}
-                on_success(clean, time.time() - t0, meta)
-            except requests.Timeout:
-                on_error(f"Таймаут {REQUEST_TIMEOUT_SEC}s")
+                res = await self.chat(messages, on_delta=on_delta, handle=handle, on_command=on_command)
+            except (asyncio.CancelledError, RequestCancelled):
+                raise
+            except asyncio.TimeoutError:
+                if not handle.cancelled:
+                    on_error(f"Таймаут {http_pool.timeout_for('llm.chat', REQUEST_TIMEOUT_SEC)[1]}s")
+                return
             except Exception as e:
-                on_error(str(e))
+                if not handle.cancelled:
+                    on_error(str(e))
+                return
+            if not handle.cancelled:
+                on_success(res.text, res.latency, res.meta)
 
-        threading.Thread(target=_worker, daemon=True).start()
+        return self.scheduler.submit(_job, group=group, supersede=supersede, on_cancel=on_cancel)
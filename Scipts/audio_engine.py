@@ -0,0 +1,282 @@
+# Scipts/audio_engine.py
+"""
+Один долгоживущий поток вывода на всё приложение. Короткие клипы (приветствие, погода,
+«Слушаю, сэр») декодируются в память при старте, play() только ставит клип в очередь
+аудио-колбэка — без открытия устройства и чтения диска на каждый звук.
+
+Зависимости: sounddevice (вывод) и numpy. WAV декодируется стандартной библиотекой;
+для MP3 нужен необязательный soundfile (pip install soundfile, libsndfile >= 1.1),
+без него — ffmpeg из PATH. Нет ни того, ни другого — MP3 играет прежний play_mp3
+(MCI / playsound), движок для них не используется.
+"""
+from __future__ import annotations
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+import wave
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional
+
+import numpy as np
+
+try:
+    import soundfile as sf  # pip install soundfile
+except Exception:
+    sf = None
+
+log = logging.getLogger("jarvis.audio")
+
+# ==== базовые настройки ====
+DEFAULT_SAMPLE_RATE = 48000  # если устройство не сообщило свою частоту
+MAX_LATENCIES = 100          # сколько последних задержек хранить для stats()
+FFMPEG_TIMEOUT_SEC = 15      # запасной декодер: дольше — считаем, что файл не читается
+
+
+@dataclass
+class _Voice:
+    name: str
+    pcm: np.ndarray
+    pos: int = 0
+    requested_at: Optional[float] = None
+    on_started: Optional[Callable[[float], None]] = None
+
+
+def decode_file(path: str) -> tuple:
+    """Файл -> (частота, int16 моно). WAV — стандартной библиотекой, остальное — soundfile или ffmpeg."""
+    if path.lower().endswith(".wav"):
+        with wave.open(path, "rb") as w:
+            if w.getsampwidth() == 2:
+                channels, rate = w.getnchannels(), w.getframerate()
+                x = np.frombuffer(w.readframes(w.getnframes()), dtype=np.int16)
+                if channels > 1:
+                    x = x.reshape(-1, channels).mean(axis=1).astype(np.int16)
+                return rate, x
+    if sf is None:
+        return _decode_ffmpeg(path)
+    x, rate = sf.read(path, dtype="int16", always_2d=True)
+    return rate, x.mean(axis=1).astype(np.int16) if x.shape[1] > 1 else x[:, 0].copy()
+
+
+def _decode_ffmpeg(path: str) -> tuple:
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise RuntimeError("для MP3 нужен пакет soundfile (pip install soundfile) или ffmpeg в PATH")
+    out = subprocess.run(
+        [ffmpeg, "-v", "error", "-i", path, "-f", "s16le", "-ac", "1", "-ar", str(DEFAULT_SAMPLE_RATE), "-"],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=FFMPEG_TIMEOUT_SEC, check=False,
+    )
+    if out.returncode != 0:
+        raise RuntimeError(f"ffmpeg: {out.stderr.decode(errors='replace').strip()[:200]}")
+    return DEFAULT_SAMPLE_RATE, np.frombuffer(out.stdout, dtype=np.int16).copy()
+
+
+def resample(x: np.ndarray, src: int, dst: int) -> np.ndarray:
+    if src == dst or not len(x):
+        return x
+    n = int(round(len(x) * dst / src))
+    return np.interp(np.linspace(0, len(x) - 1, n), np.arange(len(x)), x).astype(np.int16)
+
+
+class PlaybackEngine:
+    """
+    play(путь) — прервать текущее и играть; queue(путь) — после текущего; stop() — тишина.
+    Все три не блокируют. requested_at/on_started — замер задержки «запрос -> звук в устройстве».
+    """
+
+    def __init__(self, sample_rate: Optional[int] = None):
+        import sounddevice as sd  # ленивый импорт: без звуковой карты модуль всё равно импортируется
+
+        if not sample_rate:
+            try:
+                sample_rate = int(sd.query_devices(kind="output")["default_samplerate"])
+            except Exception:
+                sample_rate = DEFAULT_SAMPLE_RATE
+        self.sample_rate = sample_rate
+        self._clips: Dict[str, np.ndarray] = {}
+        self._queue: Deque[_Voice] = deque()
+        self._current: Optional[_Voice] = None
+        self._lock = threading.Lock()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._events: "queue.Queue[tuple]" = queue.Queue()  # колбэки — не из аудио-потока
+        self.latencies: Deque[float] = deque(maxlen=MAX_LATENCIES)
+        self.underflows = 0
+        self._stream = sd.OutputStream(samplerate=sample_rate, channels=1, dtype="int16",
+                                       latency="low", callback=self._callback)
+        self._stream.start()
+        threading.Thread(target=self._notify_loop, daemon=True, name="audio-notify").start()
+
+    # ---------- Клипы ----------
+    def load(self, path: str) -> bool:
+        """Декодировать в память (повторные play() не трогают диск)."""
+        key = _key(path)
+        if key in self._clips:
+            return True
+        try:
+            rate, pcm = decode_file(path)
+        except Exception as e:
+            log.warning("не удалось декодировать %s: %s", path, e)
+            return False
+        self._clips[key] = resample(pcm, rate, self.sample_rate)
+        return True
+
+    def is_loaded(self, path: str) -> bool:
+        return _key(path) in self._clips
+
+    def preload(self, paths: Iterable[str], on_done: Optional[Callable[[int, float], None]] = None) -> None:
+        """Фоновая загрузка клипов; on_done(сколько загружено, секунд) — из фонового потока."""
+        paths = [p for p in paths if p and os.path.isfile(p)]
+
+        def run():
+            t0 = time.time()
+            n = sum(1 for p in paths if self.load(p))
+            if on_done is not None:
+                on_done(n, time.time() - t0)
+
+        threading.Thread(target=run, daemon=True, name="audio-preload").start()
+
+    # ---------- Воспроизведение ----------
+    def play(self, path: str, requested_at: Optional[float] = None,
+             on_started: Optional[Callable[[float], None]] = None) -> bool:
+        """False — файл не декодируется (вызывающий играет его по-старому)."""
+        return self._submit(path, requested_at, on_started, interrupt=True)
+
+    def queue(self, path: str, requested_at: Optional[float] = None,
+              on_started: Optional[Callable[[float], None]] = None) -> bool:
+        return self._submit(path, requested_at, on_started, interrupt=False)
+
+    def stop(self) -> None:
+        with self._lock:
+            self._queue.clear()
+            self._current = None
+            self._idle.set()
+
+    def is_playing(self) -> bool:
+        return not self._idle.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._idle.wait(timeout)
+
+    def close(self) -> None:
+        self.stop()
+        try:
+            self._stream.stop()
+            self._stream.close()
+        except Exception:
+            pass
+        self._events.put(None)
+
+    def stats(self) -> Dict[str, Any]:
+        lat = sorted(self.latencies)
+        return {
+            "sample_rate": self.sample_rate,
+            "clips": len(self._clips),
+            "latency_last": self.latencies[-1] if lat else None,
+            "latency_p50": lat[len(lat) // 2] if lat else None,
+            "latency_max": lat[-1] if lat else None,
+            "underflows": self.underflows,
+        }
+
+    def _submit(self, path, requested_at, on_started, interrupt: bool) -> bool:
+        if requested_at is None and interrupt:
+            requested_at = time.time()  # у queue() задержка включает чужой клип — не меряем
+        pcm = self._clips.get(_key(path))
+        if pcm is None:
+            try:
+                rate, raw = decode_file(path)  # разовый звук: в память, но не в набор клипов
+            except Exception as e:
+                log.warning("не удалось декодировать %s: %s", path, e)
+                return False
+            pcm = resample(raw, rate, self.sample_rate)
+        voice = _Voice(os.path.basename(path), pcm, requested_at=requested_at, on_started=on_started)
+        with self._lock:
+            if interrupt:
+                self._queue.clear()
+                self._current = None
+            self._queue.append(voice)
+            self._idle.clear()
+        return True
+
+    # ---------- Аудио-поток ----------
+    def _callback(self, outdata, frames, time_info, status):
+        if status.output_underflow:
+            self.underflows += 1
+        out = outdata[:, 0]
+        out.fill(0)
+        started: List[tuple] = []
+        now = time.time()
+        try:
+            dac_delay = max(0.0, time_info.outputBufferDacTime - time_info.currentTime)
+        except Exception:
+            dac_delay = 0.0
+        filled = 0
+        with self._lock:
+            while filled < frames:
+                voice = self._current
+                if voice is None:
+                    if not self._queue:
+                        break
+                    voice = self._current = self._queue.popleft()
+                if voice.pos == 0 and voice.requested_at is not None:
+                    # момент, когда первый сэмпл клипа выйдет из ЦАП
+                    started.append((voice, now + dac_delay + filled / self.sample_rate - voice.requested_at))
+                n = min(frames - filled, len(voice.pcm) - voice.pos)
+                out[filled:filled + n] = voice.pcm[voice.pos:voice.pos + n]
+                voice.pos += n
+                filled += n
+                if voice.pos >= len(voice.pcm):
+                    self._current = None
+            if self._current is None and not self._queue:
+                self._idle.set()  # под замком: иначе гонка с _submit, который только что добавил клип
+        for voice, latency in started:
+            self.latencies.append(latency)
+            if voice.on_started is not None:
+                self._events.put((voice.on_started, latency))
+
+    def _notify_loop(self) -> None:
+        while True:
+            item = self._events.get()
+            if item is None:
+                return
+            cb, latency = item
+            try:
+                cb(latency)
+            except Exception:
+                pass
+
+
+def _key(path: str) -> str:
+    return os.path.normcase(os.path.abspath(path))
+
+
+_engine: Optional[PlaybackEngine] = None
+_engine_error = ""
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> Optional[PlaybackEngine]:
+    """Общий движок; None — вывод не открылся (нет sounddevice/устройства), причина в engine_error()."""
+    global _engine, _engine_error
+    with _engine_lock:
+        if _engine is None and not _engine_error:
+            try:
+                _engine = PlaybackEngine()
+                log.info("аудио-вывод открыт: %d Гц", _engine.sample_rate)
+            except Exception as e:
+                _engine_error = str(e) or type(e).__name__
+                log.warning("аудио-вывод недоступен: %s", _engine_error)
+        return _engine
+
+
+def current_engine() -> Optional[PlaybackEngine]:
+    """Уже открытый движок или None — без попытки открыть устройство (для чувствительных к задержке потоков)."""
+    return _engine
+
+
+def engine_error() -> str:
+    return _engine_error
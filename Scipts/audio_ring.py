@@ -0,0 +1,93 @@
+# Scipts/audio_ring.py
+from __future__ import annotations
+import threading
+import time
+from typing import Optional, Tuple
+
+import numpy as np  # ставится вместе с sounddevice
+
+
+class AudioRing:
+    """
+    Кольцевой буфер int16 фиксированной ёмкости: один писатель (аудио-колбэк), один читатель.
+    Без блокировок: писатель двигает только _claim/_write, читатель — только _read (счётчики
+    сэмплов растут монотонно). Переполнение — «теряем старое»: читатель, отстав больше
+    чем на ёмкость, перескакивает на свежие данные и считает потерю.
+
+    Как seqlock: писатель объявляет _claim (докуда начал писать) до копирования и _write
+    (докуда дописал) после. Читатель сверяет _claim после своего копирования: если писатель
+    за это время залез в читаемый кусок, данные отбрасываются и чтение повторяется.
+    """
+
+    def __init__(self, capacity_sec: float, sample_rate: int):
+        self.sample_rate = sample_rate
+        self.capacity = max(1, int(capacity_sec * sample_rate))
+        self._buf = np.zeros(self.capacity, dtype=np.int16)
+        self._write = 0            # всего записано сэмплов
+        self._claim = 0            # докуда писатель начал писать (>= _write на время копирования)
+        self._read = 0             # всего прочитано (или пропущено) сэмплов
+        self._write_time = 0.0     # time.time() последней записи — для времени захвата блока
+        self._ready = threading.Event()
+        self.overflows = 0         # сколько раз читатель терял данные
+        self.dropped_samples = 0
+
+    # ---------- писатель (колбэк sounddevice) ----------
+    def write(self, samples: np.ndarray) -> None:
+        """Копирует сэмплы прямо из буфера устройства в кольцо (без промежуточных bytes)."""
+        n = len(samples)
+        if n > self.capacity:
+            samples = samples[-self.capacity:]
+            n = self.capacity
+        self._claim = self._write + n  # до копирования: читатель увидит, что кусок переписывается
+        start = self._write % self.capacity
+        first = min(n, self.capacity - start)
+        self._buf[start:start + first] = samples[:first]
+        if first < n:
+            self._buf[:n - first] = samples[first:]
+        self._write += n
+        self._write_time = time.time()
+        self._ready.set()
+
+    # ---------- читатель (поток распознавания) ----------
+    def available(self) -> int:
+        return self._write - self._read
+
+    def lag_sec(self) -> float:
+        """Сколько захваченного аудио ещё не отдано распознавателю."""
+        return min(self.available(), self.capacity) / self.sample_rate
+
+    def read(self, n: int, timeout: float) -> Optional[Tuple[float, bytes]]:
+        """(время захвата конца блока, PCM) или None, если за timeout не набралось n сэмплов."""
+        while True:
+            while self.available() < n:
+                self._ready.clear()
+                if self.available() >= n:
+                    break
+                if not self._ready.wait(timeout):
+                    return None
+            behind = self._claim - self._read - self.capacity
+            if behind > 0:
+                self._skip(behind)
+            start = self._read % self.capacity
+            first = min(n, self.capacity - start)
+            data = self._buf[start:start + first].tobytes()
+            if first < n:
+                data += self._buf[:n - first].tobytes()
+            end = self._read + n
+            # писатель начал переписывать читаемый кусок, пока мы копировали (даже если ещё
+            # не дописал и _write не сдвинут), — данные испорчены, старое отбрасываем
+            lost = self._claim - self._read - self.capacity
+            if lost > 0:
+                self._skip(lost)
+                continue
+            ts = self._write_time - (self._write - end) / self.sample_rate
+            self._read = end
+            return ts, data
+
+    def _skip(self, samples: int) -> None:
+        self._read += samples
+        self.overflows += 1
+        self.dropped_samples += samples
+
+    def clear(self) -> None:
+        self._read = self._write
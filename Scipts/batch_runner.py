@@ -0,0 +1,196 @@
+# Scipts/batch_runner.py
+"""
+Пакетный (headless) прогон промптов из JSONL через LLM — для регрессии промптов и моделей без GUI.
+
+    python -m Scipts.batch_runner requests.jsonl -o results.jsonl -c 4
+
+Каждая входная строка — JSON с текстом в поле prompt/text/body/content (или --field)
+и необязательными id/request_id и history. Результаты дописываются в выходной JSONL
+по мере готовности; он же служит чекпоинтом: при повторном запуске уже успешно
+обработанные id пропускаются.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from Scipts.OpenAiGPTBrain import AsyncLLMClient, LLMConfig
+from Scipts.context_packer import estimate_tokens
+
+PROMPT_FIELDS = ("prompt", "text", "body", "content", "question")
+DEFAULT_CONFIG = os.path.join(os.path.dirname(__file__), "..", "jarvis_client_config.json")
+
+
+def iter_items(path: str, field: str = "") -> Iterator[Dict[str, Any]]:
+    """Потоково читает JSONL; строки без текста промпта пропускаются."""
+    with open(path, "r", encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                obj = json.loads(line)
+            except ValueError:
+                print(f"[batch] строка {n}: невалидный JSON — пропуск", file=sys.stderr)
+                continue
+            fields = (field,) if field else PROMPT_FIELDS
+            prompt = next((str(obj[k]) for k in fields if obj.get(k)), "")
+            if not prompt:
+                continue
+            item_id = str(obj.get("id") or obj.get("request_id") or f"line-{n}")
+            yield {"id": item_id, "prompt": prompt, "history": obj.get("history") or []}
+
+
+def load_done_ids(path: str) -> Set[str]:
+    """id, уже успешно записанные в выходной файл (ошибочные прогоняются заново)."""
+    done: Set[str] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue  # оборванная последняя строка после прерывания
+            if rec.get("id") and not rec.get("error"):
+                done.add(str(rec["id"]))
+    return done
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Перцентиль методом ближайшего ранга."""
+    if not values:
+        return 0.0
+    s = sorted(values)
+    k = max(0, min(len(s) - 1, math.ceil(p / 100.0 * len(s)) - 1))
+    return s[k]
+
+
+def load_llm_config(path: str) -> LLMConfig:
+    cfg = LLMConfig()
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        cfg = LLMConfig(**{k: v for k, v in data.items() if k in LLMConfig.__annotations__})
+        if data.get("system_prompt"):
+            cfg.system_prompt = data["system_prompt"]
+    return cfg
+
+
+async def run_batch(args: argparse.Namespace) -> Dict[str, Any]:
+    cfg = load_llm_config(args.config)
+    if args.api_url:
+        cfg.api_url = args.api_url
+    if args.model:
+        cfg.model = args.model
+    if args.system_prompt is not None:
+        cfg.system_prompt = args.system_prompt
+    cfg.cache_enabled = args.use_cache
+    cfg.cache_path = ""
+    client = AsyncLLMClient(cfg)
+
+    done = load_done_ids(args.output) if args.resume else set()
+    items = (it for it in iter_items(args.input, args.field) if it["id"] not in done)
+    if done:
+        print(f"[batch] чекпоинт: пропускаю {len(done)} уже готовых")
+
+    latencies: List[float] = []
+    ttfts: List[float] = []
+    stats = {"ok": 0, "errors": 0, "tokens": 0}
+    out = open(args.output, "a" if args.resume else "w", encoding="utf-8")
+    t_start = time.time()
+
+    async def worker():
+        for item in items:  # общий ленивый итератор — в памяти только то, что в работе
+            msgs = client.build_messages(
+                system_prompt=cfg.system_prompt,
+                history=item["history"],
+                user_text=item["prompt"],
+            )
+            packed_tokens = client.last_pack_info.get("prompt_tokens")
+            rec: Dict[str, Any] = {"id": item["id"], "prompt": item["prompt"]}
+            t0 = time.time()
+            try:
+                on_delta = (lambda _c: None) if args.stream else None
+                res = await client.chat(msgs, on_delta=on_delta, stream=args.stream)
+                usage = res.meta.get("usage") or {}
+                tokens = int(usage.get("completion_tokens") or estimate_tokens(res.text))
+                rec.update(
+                    answer=res.text,
+                    command=res.command,
+                    latency=round(res.latency, 4),
+                    first_token_latency=res.meta.get("first_token_latency"),
+                    completion_tokens=tokens,
+                    prompt_tokens=usage.get("prompt_tokens") or packed_tokens,
+                    endpoint=res.meta.get("endpoint"),
+                    model=res.meta.get("model"),
+                    cache=res.meta.get("cache"),
+                )
+                latencies.append(res.latency)
+                if res.meta.get("first_token_latency") is not None:
+                    ttfts.append(res.meta["first_token_latency"])
+                stats["ok"] += 1
+                stats["tokens"] += tokens
+            except Exception as e:
+                rec.update(error=str(e) or type(e).__name__, latency=round(time.time() - t0, 4))
+                stats["errors"] += 1
+            out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            out.flush()  # запись = чекпоинт
+            n = stats["ok"] + stats["errors"]
+            if args.progress and n % args.progress == 0:
+                print(f"[batch] {n} готово, {n / (time.time() - t_start):.2f} req/s")
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(max(1, args.concurrency))))
+    finally:
+        out.close()
+        await client.aclose()
+
+    wall = time.time() - t_start
+    n = stats["ok"] + stats["errors"]
+    return {
+        "requests": n,
+        "ok": stats["ok"],
+        "errors": stats["errors"],
+        "wall_sec": round(wall, 3),
+        "req_per_sec": round(n / wall, 3) if wall else 0.0,
+        "tokens_per_sec": round(stats["tokens"] / wall, 2) if wall else 0.0,
+        "latency_p50": round(percentile(latencies, 50), 3),
+        "latency_p95": round(percentile(latencies, 95), 3),
+        "latency_p99": round(percentile(latencies, 99), 3),
+        "ttft_p50": round(percentile(ttfts, 50), 3) if ttfts else None,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Пакетный прогон JSONL-промптов через LLM")
+    ap.add_argument("input", help="входной JSONL")
+    ap.add_argument("-o", "--output", default="batch_results.jsonl", help="выходной JSONL (он же чекпоинт)")
+    ap.add_argument("-c", "--concurrency", type=int, default=4, help="одновременных запросов")
+    ap.add_argument("--field", default="", help="поле с текстом промпта (по умолчанию prompt/text/body/…)")
+    ap.add_argument("--config", default=DEFAULT_CONFIG, help="jarvis_client_config.json")
+    ap.add_argument("--api-url", default="", help="переопределить api_url")
+    ap.add_argument("--model", default="", help="переопределить model")
+    ap.add_argument("--system-prompt", default=None, help="переопределить system prompt")
+    ap.add_argument("--stream", action="store_true", help="стримить ответы (даёт время до первого токена)")
+    ap.add_argument("--use-cache", action="store_true", help="разрешить кэш ответов (по умолчанию выключен)")
+    ap.add_argument("--no-resume", dest="resume", action="store_false", help="начать заново, перезаписав выход")
+    ap.add_argument("--progress", type=int, default=10, help="печатать прогресс каждые N запросов (0 — нет)")
+    args = ap.parse_args(argv)
+
+    try:
+        summary = asyncio.run(run_batch(args))
+    except KeyboardInterrupt:
+        print("[batch] прервано — готовые результаты сохранены, повторный запуск продолжит с чекпоинта")
+        return 130
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    return 0 if summary["errors"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,299 @@
+# Scipts/benchmark.py
+"""
+Сквозной бенчмарк на локальных заглушках LLM/TTS (Scipts/stub_servers.py).
+
+    python -m Scipts.benchmark                       # все сценарии, сравнение с базовой линией
+    python -m Scipts.benchmark --save-baseline       # записать текущие цифры как базовую линию
+    python -m Scipts.benchmark --wav a.wav b.wav --vosk-model VoskModel   # + прогон WAV через VoiceAgent
+
+Сценарии: llm (обычный ответ), llm_stream (время до первого токена), llm_concurrent
+(пропускная способность AsyncLLMClient), tts (speak_clone_remote без проигрывания),
+tts_pipeline (время до первого звука у конвейерной озвучки против ответа целиком),
+tts_cache (повторяющиеся фразы из дискового кэша TTS), turn (голосовая фраза -> локальный интент или LLM -> TTS), voice_wav (распознавание WAV).
+Регрессия — если p50 или p95 сценария хуже базовой линии больше чем на --tolerance.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from Scipts import voice_clone_remote
+from Scipts.OpenAiGPTBrain import AsyncLLMClient, LLMClient, LLMConfig
+from Scipts.batch_runner import percentile
+from Scipts.intent_router import IntentRouter
+from Scipts.stub_servers import StubLLMServer, StubTTSServer, synth_wav
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "..", "Json", "bench_baseline.json")
+LONG_ANSWER = (
+    "Сегодня в городе солнечно, температура около двадцати градусов. Ветер слабый, северо-западный. "
+    "К вечеру возможен небольшой дождь, поэтому зонт лучше взять с собой. "
+    "Завтра похолодает до пятнадцати градусов, а в выходные снова потеплеет."
+)
+CACHED_PHRASES = ("Слушаю, сэр.", "Готово.", "Секунду, сэр.", "Включаю музыку.")
+TURN_PHRASES = ("какая погода", "расскажи анекдот про роботов", "привет", "сколько будет два плюс два")
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {"n": 0}
+    return {
+        "n": len(samples),
+        "mean": round(sum(samples) / len(samples), 4),
+        "min": round(min(samples), 4),
+        "p50": round(percentile(samples, 50), 4),
+        "p95": round(percentile(samples, 95), 4),
+        "p99": round(percentile(samples, 99), 4),
+        "max": round(max(samples), 4),
+    }
+
+
+def _llm_config(url: str) -> LLMConfig:
+    cfg = LLMConfig(api_url=f"{url}/v1/chat/completions", model="stub-model")
+    cfg.cache_enabled = False  # иначе повторы мерили бы кэш, а не путь до сервера
+    return cfg
+
+
+def _call_sync(llm: LLMClient, messages, stream: bool) -> Dict[str, Any]:
+    """Callback-API -> блокирующий вызов (как его видит GUI)."""
+    done = threading.Event()
+    box: Dict[str, Any] = {}
+
+    def on_success(text, latency, meta):
+        box.update(text=text, latency=latency, meta=meta)
+        done.set()
+
+    def on_error(err):
+        box["error"] = err
+        done.set()
+
+    llm.send_chat_async(messages, on_success, on_error, on_delta=(lambda _c: None) if stream else None)
+    done.wait()
+    if "error" in box:
+        raise RuntimeError(box["error"])
+    return box
+
+
+# ---------- Сценарии ----------
+def bench_llm(llm: LLMClient, n: int, stream: bool) -> Dict[str, Any]:
+    total, ttft = [], []
+    for i in range(n):
+        msgs = llm.build_messages(llm.cfg.system_prompt, [], f"вопрос номер {i}")
+        res = _call_sync(llm, msgs, stream)
+        total.append(res["latency"])
+        if res["meta"].get("first_token_latency") is not None:
+            ttft.append(res["meta"]["first_token_latency"])
+    out = {"latency": summarize(total)}
+    if ttft:
+        out["first_token"] = summarize(ttft)
+    return out
+
+
+def bench_llm_concurrent(cfg: LLMConfig, n: int, concurrency: int) -> Dict[str, Any]:
+    async def run():
+        client = AsyncLLMClient(cfg)
+        sem = asyncio.Semaphore(concurrency)
+        lat: List[float] = []
+
+        async def one(i: int):
+            async with sem:
+                msgs = client.build_messages(cfg.system_prompt, [], f"параллельный вопрос {i}")
+                res = await client.chat(msgs)
+                lat.append(res.latency)
+
+        t0 = time.time()
+        await asyncio.gather(*(one(i) for i in range(n)))
+        wall = time.time() - t0
+        await client.aclose()
+        return {"latency": summarize(lat), "req_per_sec": round(n / wall, 3), "concurrency": concurrency}
+
+    return asyncio.run(run())
+
+
+def bench_tts(sample_path: str, n: int) -> Dict[str, Any]:
+    lat = []
+    for i in range(n):
+        t0 = time.time()
+        result = voice_clone_remote.speak_clone_remote(f"Проверка синтеза речи номер {i}.", sample_path, do_play=False)
+        if not result.startswith("Синтез ок"):
+            raise RuntimeError(result)
+        lat.append(time.time() - t0)
+    return {"latency": summarize(lat)}
+
+
+def bench_tts_pipeline(sample_path: str, n: int) -> Dict[str, Any]:
+    """Длинный ответ: первый звук у SpeechPipeline и у синтеза целиком (без устройства вывода)."""
+    from Scipts.tts_pipeline import SpeechConfig, SpeechPipeline
+
+    first, whole = [], []
+    for _ in range(n):
+        pipe = SpeechPipeline(SpeechConfig(sample_path=sample_path), sink=lambda rate, pcm: None)
+        pipe.speak(LONG_ANSWER)
+        pipe.wait(60)
+        if pipe.errors or pipe.first_audio_sec is None:
+            raise RuntimeError("; ".join(pipe.errors) or "нет звука")
+        first.append(pipe.first_audio_sec)
+        t0 = time.time()
+        voice_clone_remote.speak_clone_remote(LONG_ANSWER, sample_path, do_play=False)
+        whole.append(time.time() - t0)
+    return {"first_audio": summarize(first), "whole_answer": summarize(whole)}
+
+
+def bench_tts_cache(sample_path: str, n: int, tts_srv: StubTTSServer) -> Dict[str, Any]:
+    """Фразы повторяются по кругу: первый проход — синтез, дальше — из кэша без обращения к серверу."""
+    voice_clone_remote.configure_cache(tempfile.mkdtemp(prefix="jarvis_tts_cache_"))
+    try:
+        miss, hit = [], []
+        calls_before = tts_srv.tts_calls
+        for i in range(n * 2):
+            phrase = CACHED_PHRASES[i % len(CACHED_PHRASES)]
+            t0 = time.time()
+            result = voice_clone_remote.speak_clone_remote(phrase, sample_path, do_play=False)
+            if not result.startswith("Синтез ок"):
+                raise RuntimeError(result)
+            (hit if i >= len(CACHED_PHRASES) else miss).append(time.time() - t0)
+        st = voice_clone_remote.cache_stats()
+        return {"miss": summarize(miss), "hit": summarize(hit), "hit_rate": round(st["hit_rate"], 3),
+                "tts_calls": tts_srv.tts_calls - calls_before}
+    finally:
+        voice_clone_remote.configure_cache("")
+
+
+def bench_turn(llm: LLMClient, sample_path: str, n: int) -> Dict[str, Any]:
+    """Текст с «микрофона» -> роутер интентов -> (LLM) -> TTS; как _send_message в GUI, без Tk."""
+    router = IntentRouter()
+    lat, local = [], 0
+    for i in range(n):
+        phrase = TURN_PHRASES[i % len(TURN_PHRASES)]
+        t0 = time.time()
+        if router.match(phrase):
+            local += 1  # локальная команда: LLM и TTS не нужны
+        else:
+            msgs = llm.build_messages(llm.cfg.system_prompt, [], phrase)
+            res = _call_sync(llm, msgs, stream=True)
+            if not res["meta"].get("command"):
+                voice_clone_remote.speak_clone_remote(res["text"], sample_path, do_play=False)
+        lat.append(time.time() - t0)
+    return {"latency": summarize(lat), "local_intents": local}
+
+
+def bench_voice_wav(paths: List[str], model_path: str, two_stage: bool = True) -> Dict[str, Any]:
+    """Заранее записанные WAV через VoiceAgent в офлайн-режиме (см. Scipts/transcribe_batch.py)."""
+    from Scipts.transcribe_batch import transcribe_file
+    from Scipts.voice_agent import VoiceConfig
+
+    cfg = VoiceConfig(vosk_model_path=model_path, two_stage=two_stage)
+    rtf, files = [], []
+    for path in paths:
+        rec = transcribe_file(path, cfg)
+        if rec.get("error"):
+            raise RuntimeError(f"{path}: {rec['error']}")
+        rtf.append(rec["rtf"] or 0.0)
+        files.append({k: rec[k] for k in ("file", "duration", "rtf", "wakes", "commands", "metrics")})
+    return {"rtf": summarize(rtf), "files": files}
+
+
+# ---------- Базовая линия ----------
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Сравнивает p50/p95 всех распределений; возвращает список регрессий."""
+    regressions = []
+    for scenario, metrics in results.items():
+        for metric, dist in metrics.items():
+            base = (baseline.get(scenario) or {}).get(metric)
+            if not isinstance(dist, dict) or not isinstance(base, dict):
+                continue
+            for q in ("p50", "p95"):
+                if q in dist and base.get(q):
+                    if dist[q] > base[q] * (1 + tolerance):
+                        regressions.append(f"{scenario}.{metric}.{q}: {dist[q]:.4f}s > {base[q]:.4f}s (+{tolerance:.0%})")
+    return regressions
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    with StubLLMServer(args.llm_delay, args.token_rate) as llm_srv, StubTTSServer(args.tts_delay) as tts_srv:
+        voice_clone_remote.TTS_BASE_URL = tts_srv.base_url
+        voice_clone_remote.configure_cache("")  # остальные сценарии меряют синтез, а не диск
+        # голоса заглушки — не в реестр пользователя (иначе настоящий сервер считался бы «уже знающим» их)
+        voice_clone_remote.configure_registry(
+            os.path.join(tempfile.mkdtemp(prefix="jarvis_voice_registry_"), "voice_registry.json")
+        )
+        cfg = _llm_config(llm_srv.base_url)
+        llm = LLMClient(cfg)
+
+        sample = os.path.join(tempfile.mkdtemp(prefix="jarvis_bench_"), "sample.wav")
+        with open(sample, "wb") as f:
+            f.write(synth_wav(1.0, 16000))
+
+        scenarios: Dict[str, Callable[[], Dict[str, Any]]] = {
+            "llm": lambda: bench_llm(llm, args.n, stream=False),
+            "llm_stream": lambda: bench_llm(llm, args.n, stream=True),
+            "llm_concurrent": lambda: bench_llm_concurrent(cfg, args.n * 2, args.concurrency),
+            "tts": lambda: bench_tts(sample, args.n),
+            "tts_pipeline": lambda: bench_tts_pipeline(sample, args.n),
+            "tts_cache": lambda: bench_tts_cache(sample, args.n, tts_srv),
+            "turn": lambda: bench_turn(llm, sample, args.n),
+        }
+        for name, fn in scenarios.items():
+            if args.only and name not in args.only:
+                continue
+            t0 = time.time()
+            results[name] = fn()
+            print(f"[bench] {name}: {time.time() - t0:.2f}s", file=sys.stderr)
+        results["_servers"] = {"llm_requests": llm_srv.requests, "tts_calls": tts_srv.tts_calls,
+                               "clone_calls": tts_srv.clone_calls}
+
+    if args.wav:
+        if not args.vosk_model:
+            raise SystemExit("--wav требует --vosk-model")
+        # оба режима распознавателя: разница cpu_idle — цена полного словаря в простое
+        results["voice_wav"] = bench_voice_wav(args.wav, args.vosk_model, two_stage=True)
+        results["voice_wav_single"] = bench_voice_wav(args.wav, args.vosk_model, two_stage=False)
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Бенчмарк Jarvis на локальных заглушках LLM/TTS")
+    ap.add_argument("-n", type=int, default=10, help="повторов на сценарий")
+    ap.add_argument("--only", nargs="*", default=[], help="запустить только эти сценарии")
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--llm-delay", type=float, default=0.2, help="задержка заглушки LLM до первого токена, с")
+    ap.add_argument("--token-rate", type=float, default=40.0, help="скорость генерации заглушки, ток/с")
+    ap.add_argument("--tts-delay", type=float, default=0.1, help="фиксированная задержка заглушки TTS, с")
+    ap.add_argument("--wav", nargs="*", default=[], help="WAV-файлы для прогона через VoiceAgent")
+    ap.add_argument("--vosk-model", default="", help="папка модели Vosk для --wav")
+    ap.add_argument("--baseline", default=DEFAULT_BASELINE)
+    ap.add_argument("--save-baseline", action="store_true")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="допустимое ухудшение p50/p95 (доля)")
+    ap.add_argument("-o", "--output", default="", help="записать результаты в JSON")
+    args = ap.parse_args(argv)
+
+    results = run(args)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"[bench] базовая линия сохранена: {args.baseline}", file=sys.stderr)
+        return 0
+    if not os.path.exists(args.baseline):
+        print("[bench] базовой линии нет (--save-baseline, чтобы создать)", file=sys.stderr)
+        return 0
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    for r in regressions:
+        print(f"[bench] РЕГРЕССИЯ {r}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+# Scipts/context_packer.py
+from __future__ import annotations
+import hashlib
+import math
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+TokenCounter = Callable[[str], int]
+Summarizer = Callable[[str, List[Dict[str, Any]], int], str]
+
+# Служебные токены на одно сообщение chat-шаблона (роль, разделители)
+MESSAGE_OVERHEAD_TOKENS = 4
+SUMMARY_HEADER = "Краткое содержание более ранней части диалога:"
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+# ---------- Подсчёт токенов ----------
+def estimate_tokens(text: str) -> int:
+    """
+    Локальная оценка без токенизатора: BPE-словари режут кириллицу мельче латиницы,
+    поэтому считаем ~4 символа на токен для латиницы и ~2.5 для остального, но не меньше числа слов.
+    """
+    if not text:
+        return 0
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    other_chars = len(text) - ascii_chars
+    by_chars = ascii_chars / 4.0 + other_chars / 2.5
+    return max(len(_WORD_RE.findall(text)), math.ceil(by_chars))
+
+
+def make_token_counter(name: str = "auto") -> TokenCounter:
+    """
+    "estimate" — эвристика; "auto" или имя кодировки tiktoken (например "o200k_base") —
+    точный подсчёт, если tiktoken установлен, иначе эвристика.
+    """
+    if name in ("", "estimate"):
+        return estimate_tokens
+    try:
+        import tiktoken  # type: ignore
+        enc = tiktoken.get_encoding("o200k_base" if name == "auto" else name)
+    except Exception:
+        return estimate_tokens
+    return lambda text: len(enc.encode(text or "", disallowed_special=()))
+
+
+# ---------- Сводка старой истории ----------
+def extractive_summary(previous: str, turns: List[Dict[str, Any]], max_tokens: int) -> str:
+    """
+    Дешёвая сводка без обращения к LLM: по строке на реплику (начало текста),
+    новые строки дописываются к прошлой сводке, старейшие выбрасываются при переполнении.
+    """
+    lines = [l for l in (previous or "").splitlines() if l.strip()]
+    for t in turns:
+        who = "Пользователь" if t.get("role") == "user" else "Jarvis"
+        text = " ".join(str(t.get("content", "")).split())
+        if len(text) > 160:
+            text = text[:160].rstrip() + " …"
+        if text:
+            lines.append(f"- {who}: {text}")
+    while lines and estimate_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+class ContextPacker:
+    """
+    Заполняет бюджет токенов промпта самыми свежими репликами;
+    всё, что не влезло, сворачивается в скользящую сводку (кэшируется между вызовами).
+    """
+
+    def __init__(self, count_tokens: Optional[TokenCounter] = None, summarize: Optional[Summarizer] = None):
+        self.count_tokens: TokenCounter = count_tokens or estimate_tokens
+        self.summarize: Summarizer = summarize or extractive_summary
+        # кэш сводки: (число свёрнутых реплик, отпечаток этого префикса, текст сводки)
+        self._summary: Tuple[int, str, str] = (0, _fingerprint([]), "")
+        self._lock = threading.Lock()
+
+    def message_tokens(self, text: str) -> int:
+        return self.count_tokens(text) + MESSAGE_OVERHEAD_TOKENS
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Обрезка по токенам (бинарный поиск по длине строки)."""
+        if self.count_tokens(text) <= max_tokens:
+            return text
+        lo, hi = 0, len(text)
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self.count_tokens(text[:mid]) <= max_tokens:
+                lo = mid
+            else:
+                hi = mid - 1
+        return text[:lo].rstrip() + " …"
+
+    def pack(
+        self,
+        system_prompt: str,
+        turns: List[Dict[str, Any]],
+        user_text: str,
+        budget: int,
+        system_budget: int,
+        summary_budget: int,
+        max_turns: Optional[int] = None,
+    ) -> Tuple[str, List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Возвращает (system_content, выбранные реплики, info).
+        system_content уже содержит сводку свёрнутой истории, если она понадобилась.
+        """
+        system = self.truncate(system_prompt.strip(), system_budget) if system_prompt else ""
+        fixed = self.message_tokens(user_text) + (self.message_tokens(system) if system else 0)
+
+        candidates = turns
+        if max_turns is not None:
+            candidates = turns[-(max_turns * 2):] if max_turns > 0 else []
+        capped = len(turns) - len(candidates)  # отрезанное жёстким лимитом тоже уходит в сводку
+
+        start = self._fill(candidates, budget - fixed)
+        summary = ""
+        if start > 0 or capped > 0:
+            # с историей не влезли — резервируем место под сводку и набираем заново
+            start = self._fill(candidates, budget - fixed - summary_budget - self.message_tokens(SUMMARY_HEADER))
+            summary = self._rolling_summary(turns[:capped + start], summary_budget)
+
+        if summary:
+            system = f"{system}\n\n{SUMMARY_HEADER}\n{summary}" if system else f"{SUMMARY_HEADER}\n{summary}"
+        kept = candidates[start:]
+        prompt_tokens = (self.message_tokens(system) if system else 0) + self.message_tokens(user_text)
+        prompt_tokens += sum(self.message_tokens(str(t.get("content", ""))) for t in kept)
+        info = {"prompt_tokens": prompt_tokens, "turns_sent": len(kept), "turns_folded": capped + start, "budget": budget}
+        return system, kept, info
+
+    # ---------- Внутреннее ----------
+    def _fill(self, turns: List[Dict[str, Any]], available: int) -> int:
+        """Индекс первой реплики, начиная с которой свежий хвост влезает в available."""
+        used = 0
+        start = len(turns)
+        for i in range(len(turns) - 1, -1, -1):
+            cost = self.message_tokens(str(turns[i].get("content", "")))
+            if used + cost > available:
+                break
+            used += cost
+            start = i
+        # не начинаем контекст с ответа ассистента без вопроса
+        if start < len(turns) and turns[start].get("role") == "assistant":
+            start += 1
+        return start
+
+    def _rolling_summary(self, folded: List[Dict[str, Any]], max_tokens: int) -> str:
+        with self._lock:
+            count, fp, summary = self._summary
+            if count == len(folded) and fp == _fingerprint(folded):
+                return summary
+            if count <= len(folded) and fp == _fingerprint(folded[:count]):
+                # префикс уже свёрнут — досводим только новые реплики
+                summary = self.summarize(summary, folded[count:], max_tokens)
+            else:
+                summary = self.summarize("", folded, max_tokens)
+            self._summary = (len(folded), _fingerprint(folded), summary)
+            return summary
+
+
+def _fingerprint(turns: List[Dict[str, Any]]) -> str:
+    h = hashlib.sha1()
+    for t in turns:
+        h.update(str(t.get("role", "")).encode("utf-8"))
+        h.update(b"\x00")
+        h.update(str(t.get("content", "")).encode("utf-8"))
+        h.update(b"\x01")
+    return h.hexdigest()
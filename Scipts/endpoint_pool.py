@@ -0,0 +1,134 @@
+# Scipts/endpoint_pool.py
+from __future__ import annotations
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+# ==== базовые настройки ====
+EWMA_ALPHA = 0.3            # вес нового замера в скользящей средней задержки
+PROBE_INTERVAL_SEC = 30.0   # период фоновой проверки здоровья
+RETRY_UNHEALTHY_SEC = 15.0  # через сколько снова пробовать упавший эндпоинт в живом трафике
+
+
+@dataclass
+class Endpoint:
+    url: str
+    model: str
+    healthy: bool = True
+    ewma_latency: Optional[float] = None  # секунды, живой трафик (первый токен); None — ещё не мерили
+    probe_latency: Optional[float] = None  # последняя фоновая проба (пинг) — в EWMA не смешивается
+    failures: int = 0
+    last_error: str = ""
+    last_check: float = 0.0
+    down_since: float = 0.0
+
+    @property
+    def key(self) -> str:
+        return f"{self.url}|{self.model}"
+
+
+class EndpointPool:
+    """
+    Набор OpenAI-совместимых эндпоинтов (у каждого своя модель).
+    candidates() — порядок попыток: здоровые по возрастанию EWMA задержки (без живого трафика —
+    по задержке фоновой пробы, совсем неизмеренные — в конце),
+    затем упавшие, у которых истекло окно RETRY_UNHEALTHY_SEC, затем остальные упавшие
+    (как последний шанс). Фоновые пробы обновляют здоровье, но не EWMA живого трафика.
+    """
+
+    def __init__(self, endpoints: List[Endpoint], alpha: float = EWMA_ALPHA):
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self._endpoints: List[Endpoint] = []
+        self._probe_thread: Optional[threading.Thread] = None
+        self._probe_stop = threading.Event()
+        self.set_endpoints(endpoints)
+
+    def set_endpoints(self, endpoints: List[Endpoint]) -> None:
+        """Заменяет список, сохраняя накопленную статистику для тех же (url, model)."""
+        with self._lock:
+            old = {e.key: e for e in self._endpoints}
+            self._endpoints = [old.get(e.key, e) for e in endpoints]
+
+    def endpoints(self) -> List[Endpoint]:
+        with self._lock:
+            return list(self._endpoints)
+
+    def candidates(self) -> List[Endpoint]:
+        now = time.time()
+        with self._lock:
+            eps = list(self._endpoints)
+        healthy = [e for e in eps if e.healthy]
+        healthy.sort(key=_rank_latency)
+        # упавший давно — снова пробуем, но после здоровых: неудача сдвинет down_since на новое окно
+        retry = [e for e in eps if not e.healthy and now - e.down_since > RETRY_UNHEALTHY_SEC]
+        down = [e for e in eps if not e.healthy and e not in retry]
+        return healthy + retry + down
+
+    def report_success(self, ep: Endpoint, latency: Optional[float] = None) -> None:
+        with self._lock:
+            ep.healthy = True
+            ep.failures = 0
+            ep.last_error = ""
+            if latency is not None:
+                ep.ewma_latency = latency if ep.ewma_latency is None else (
+                    self.alpha * latency + (1 - self.alpha) * ep.ewma_latency
+                )
+
+    def report_probe(self, ep: Endpoint, latency: float) -> None:
+        """Проба прошла: эндпоинт жив; пинг-задержку храним отдельно от EWMA первого токена."""
+        with self._lock:
+            ep.healthy = True
+            ep.failures = 0
+            ep.last_error = ""
+            ep.probe_latency = latency
+
+    def report_failure(self, ep: Endpoint, error: str) -> None:
+        with self._lock:
+            ep.down_since = time.time()  # каждая неудача начинает новое окно до повторной попытки
+            ep.healthy = False
+            ep.failures += 1
+            ep.last_error = error[:200]
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                {"url": e.url, "model": e.model, "healthy": e.healthy, "ewma_latency": e.ewma_latency,
+                 "probe_latency": e.probe_latency,
+                 "failures": e.failures, "last_error": e.last_error, "last_check": e.last_check}
+                for e in self._endpoints
+            ]
+
+    # ---------- Фоновые пробы ----------
+    def start_probes(self, probe: Callable[[Endpoint], float], interval: float = PROBE_INTERVAL_SEC) -> None:
+        """probe(ep) -> задержка в секундах или исключение."""
+        if self._probe_thread and self._probe_thread.is_alive() and not self._probe_stop.is_set():
+            return
+        # у каждого запуска своё событие: старый поток (если ещё в пробе после stop) выйдет сам
+        stop = self._probe_stop = threading.Event()
+
+        def _loop():
+            while not stop.is_set():
+                for ep in self.endpoints():
+                    if stop.is_set():
+                        break
+                    try:
+                        latency = probe(ep)
+                        self.report_probe(ep, latency)
+                    except Exception as e:
+                        self.report_failure(ep, str(e))
+                    ep.last_check = time.time()
+                stop.wait(interval)
+
+        self._probe_thread = threading.Thread(target=_loop, daemon=True)
+        self._probe_thread.start()
+
+    def stop_probes(self) -> None:
+        self._probe_stop.set()
+
+
+def _rank_latency(ep: Endpoint) -> float:
+    if ep.ewma_latency is not None:
+        return ep.ewma_latency
+    return ep.probe_latency if ep.probe_latency is not None else float("inf")
@@ -0,0 +1,103 @@
+# Scipts/http_pool.py
+from __future__ import annotations
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# ==== базовые настройки пула ====
+# Общие keep-alive сессии для LLM (LM Studio) и TTS-сервера: каждый ход
+# переиспользует тёплые сокеты вместо нового TCP-соединения на каждый запрос.
+# Чат LLM идёт через aiohttp (AsyncLLMClient) — размер его пула и таймауты берутся отсюда же.
+
+@dataclass
+class PoolConfig:
+    pool_size: int = 8              # соединений на хост (и число кэшируемых хостов)
+    retries: int = 2                # повторы при ошибке соединения / 502-504 (статус — не для POST)
+    backoff: float = 0.3            # пауза между повторами: backoff * 2^n
+    connect_timeout: float = 3.05   # таймаут установки соединения
+    # переопределения таймаутов чтения по эндпоинтам ("llm.chat", "tts.tts", …), секунды
+    read_timeouts: Dict[str, float] = field(default_factory=dict)
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "PUT", "DELETE", "OPTIONS", "TRACE"})
+
+_cfg = PoolConfig()
+_sessions: Dict[str, requests.Session] = {}
+_lock = threading.Lock()
+
+
+def _make_session() -> requests.Session:
+    # Ошибки соединения повторяются для любого метода — запрос до сервера не дошёл.
+    # Повторы по статусу 502-504 — только для идемпотентных: POST мог уже запустить
+    # синтез/генерацию (или клонирование голоса), второй такой же запрос — лишняя работа.
+    retry = Retry(
+        total=_cfg.retries,
+        connect=_cfg.retries,
+        read=0,                          # тело уже ушло — повторять генерацию не стоит
+        status=_cfg.retries,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=IDEMPOTENT_METHODS,
+        backoff_factor=_cfg.backoff,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=_cfg.pool_size, pool_maxsize=_cfg.pool_size, max_retries=retry)
+    s = requests.Session()
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    s.headers.update({"Connection": "keep-alive"})
+    return s
+
+
+def get_session(backend: str) -> requests.Session:
+    """Общая сессия для бэкенда ("llm", "tts"). Сессии потокобезопасно создаются один раз."""
+    s = _sessions.get(backend)
+    if s is not None:
+        return s
+    with _lock:
+        s = _sessions.get(backend)
+        if s is None:
+            s = _sessions[backend] = _make_session()
+        return s
+
+
+def timeout_for(endpoint: str, default_read: float = 60, timeout: Optional[float] = None) -> Tuple[float, float]:
+    """
+    (connect, read) для requests. Таймаут чтения: явный timeout вызывающего, иначе
+    настроенный в пуле для эндпоинта, иначе default_read.
+    """
+    if timeout:
+        return (_cfg.connect_timeout, timeout)
+    return (_cfg.connect_timeout, _cfg.read_timeouts.get(endpoint, default_read))
+
+
+def configure(**kwargs) -> PoolConfig:
+    """Меняет настройки пула; существующие сессии закрываются и пересоздаются по требованию."""
+    with _lock:
+        for k, v in kwargs.items():
+            if k == "read_timeouts" and isinstance(v, dict):
+                _cfg.read_timeouts.update(v)
+            elif hasattr(_cfg, k):
+                setattr(_cfg, k, v)
+        _close_locked()
+    return _cfg
+
+
+def get_config() -> PoolConfig:
+    return _cfg
+
+
+def close_all() -> None:
+    with _lock:
+        _close_locked()
+
+
+def _close_locked() -> None:
+    for s in _sessions.values():
+        try:
+            s.close()
+        except Exception:
+            pass
+    _sessions.clear()
@@ -0,0 +1,119 @@
+# Scipts/image_pipeline.py
+from __future__ import annotations
+import base64
+import hashlib
+import io
+import mimetypes
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Tuple
+
+try:
+    from PIL import Image, ImageOps  # pip install pillow
+except Exception:
+    Image = None  # без Pillow отправляем файл как есть
+
+# ==== базовые настройки ====
+DEFAULT_MAX_SIDE = 1024     # длинная сторона после уменьшения, px
+DEFAULT_FORMAT = "JPEG"     # JPEG или WEBP
+DEFAULT_QUALITY = 85
+CACHE_MAX_ENTRIES = 32
+
+_MIME = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+
+@dataclass
+class PreparedImage:
+    b64: str
+    mime: str
+    name: str
+    orig_bytes: int
+    sent_bytes: int
+    width: int = 0
+    height: int = 0
+    cached: bool = False
+    elapsed: float = 0.0
+
+
+_cache: "OrderedDict[Tuple[str, int, str, int], PreparedImage]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def prepare_image(
+    path: str,
+    max_side: int = DEFAULT_MAX_SIDE,
+    fmt: str = DEFAULT_FORMAT,
+    quality: int = DEFAULT_QUALITY,
+) -> PreparedImage:
+    """
+    Читает файл один раз, уменьшает до max_side по длинной стороне и пережимает в fmt/quality.
+    Результат кэшируется по хэшу содержимого и параметрам. Блокирующая — вызывать не из Tk-потока.
+    """
+    t0 = time.time()
+    with open(path, "rb") as f:
+        raw = f.read()
+    name = os.path.basename(path)
+    fmt = (fmt or DEFAULT_FORMAT).upper()
+    key = (hashlib.sha1(raw).hexdigest(), int(max_side), fmt, int(quality))
+
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit is not None:
+            _cache.move_to_end(key)
+            return PreparedImage(**{**hit.__dict__, "name": name, "cached": True, "elapsed": time.time() - t0})
+
+    data, mime, width, height = _encode(raw, path, max_side, fmt, quality)
+    prepared = PreparedImage(
+        b64=base64.b64encode(data).decode("utf-8"),
+        mime=mime,
+        name=name,
+        orig_bytes=len(raw),
+        sent_bytes=len(data),
+        width=width,
+        height=height,
+        elapsed=time.time() - t0,
+    )
+    with _cache_lock:
+        _cache[key] = prepared
+        while len(_cache) > CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+    return prepared
+
+
+def _encode(raw: bytes, path: str, max_side: int, fmt: str, quality: int) -> Tuple[bytes, str, int, int]:
+    orig_mime = mimetypes.guess_type(path)[0] or "image/png"
+    if Image is None:
+        return raw, orig_mime, 0, 0
+
+    img = Image.open(io.BytesIO(raw))
+    img = ImageOps.exif_transpose(img)  # учесть поворот с камеры телефона
+    resized = max(img.size) > max_side
+    if resized:
+        img.thumbnail((max_side, max_side), Image.LANCZOS)
+    if fmt == "JPEG" and img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+
+    buf = io.BytesIO()
+    save_kwargs = {"quality": quality}
+    if fmt == "JPEG":
+        save_kwargs.update(optimize=True, progressive=True)
+    elif fmt == "WEBP":
+        save_kwargs.update(method=4)
+    img.save(buf, format=fmt, **save_kwargs)
+    data = buf.getvalue()
+
+    # маленькую картинку пережатие может только раздуть — тогда шлём оригинал
+    if not resized and len(data) >= len(raw):
+        return raw, orig_mime, img.size[0], img.size[1]
+    return data, _MIME.get(fmt, "image/jpeg"), img.size[0], img.size[1]
+
+
+def human_size(n: int) -> str:
+    for unit in ("Б", "КБ", "МБ"):
+        if n < 1024 or unit == "МБ":
+            return f"{n:.0f} {unit}" if unit == "Б" else f"{n:.1f} {unit}"
+        n /= 1024.0
+    return f"{n:.1f} МБ"
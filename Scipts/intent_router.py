@@ -0,0 +1,131 @@
+# Scipts/intent_router.py
+from __future__ import annotations
+import logging
+import re
+import time
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, Optional, Tuple
+
+log = logging.getLogger("jarvis.intent")
+
+# ==== базовые настройки ====
+# Имена интентов совпадают с командами MainAgent.handle_command
+DEFAULT_INTENTS: Dict[str, Tuple[str, ...]] = {
+    "приветствие": (
+        "привет", "приветствую", "здравствуй", "здравствуйте", "добрый день", "добрый вечер",
+        "доброе утро", "hello", "hi",
+    ),
+    "погода": (
+        "погода", "прогноз", "прогноз погоды", "что на улице", "погода на улице", "что с погодой",
+        "открой погоду", "weather", "forecast",
+    ),
+}
+# Короткий ответ для истории чата вместо тега команды (как очищенный текст ответа LLM)
+DEFAULT_REPLIES: Dict[str, str] = {
+    "приветствие": "Здравствуйте, сэр.",
+    "погода": "Открываю прогноз погоды.",
+}
+# минимальная уверенность для обхода LLM; по размеченному набору (tests/test_intent_router.py)
+# без ошибок весь диапазон 0.6–0.8, берём середину
+DEFAULT_THRESHOLD = 0.7
+TOKEN_MIN_SIMILARITY = 0.7 # слово с меньшим сходством не считается совпавшим
+AMBIGUITY_MARGIN = 0.1     # если второй интент ближе — отдаём в LLM
+
+# Слова, которые не меняют смысл короткой команды (вежливость, обращение, связки)
+STOPWORDS = frozenset((
+    "джарвис", "jarvis", "сэр", "пожалуйста", "а", "ну", "и", "как", "мне", "нам", "скажи", "покажи", "какая", "какой",
+    "какое", "сегодня", "сейчас", "там", "на", "же", "ка", "давай", "открой", "please", "the", "what", "is", "s",
+))
+
+_PUNCT_RE = re.compile(r"[^\w\s]+", re.UNICODE)
+
+
+def normalize(text: str) -> List[str]:
+    """Нижний регистр, ё→е, без пунктуации и стоп-слов."""
+    t = _PUNCT_RE.sub(" ", (text or "").lower().replace("ё", "е"))
+    return [w for w in t.split() if w not in STOPWORDS]
+
+
+@dataclass
+class IntentMatch:
+    intent: str
+    confidence: float
+    alias: str
+    elapsed_ms: float
+
+
+class IntentRouter:
+    """
+    Локальный быстрый путь: распознаёт очевидные команды без обращения к LLM.
+    Индекс алиасов строится один раз; сначала точный поиск по словам, затем нечёткий
+    (устойчив к ошибкам Vosk вроде «пагода»). Уверенность = сходство алиаса × доля
+    фразы, которую он покрывает, поэтому длинные вопросы со словом «погода» уходят в LLM.
+    """
+
+    def __init__(self, intents: Optional[Dict[str, Iterable[str]]] = None, threshold: float = DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self._aliases: List[Tuple[str, str, Tuple[str, ...]]] = []  # (intent, alias, токены)
+        self._exact: Dict[Tuple[str, ...], Tuple[str, str]] = {}
+        for intent, aliases in (intents or DEFAULT_INTENTS).items():
+            for alias in aliases:
+                tokens = tuple(normalize(alias))
+                if tokens:
+                    self._aliases.append((intent, alias, tokens))
+                    self._exact.setdefault(tokens, (intent, alias))
+
+    def match(self, text: str) -> Optional[IntentMatch]:
+        t0 = time.perf_counter()
+        result = self._match(normalize(text))
+        elapsed_ms = (time.perf_counter() - t0) * 1000.0
+        if result is None:
+            log.info("intent: нет совпадения -> LLM (%.2f мс) %r", elapsed_ms, text)
+            return None
+        intent, confidence, alias = result
+        m = IntentMatch(intent, confidence, alias, elapsed_ms)
+        if confidence < self.threshold:
+            log.info("intent: %s %.2f < %.2f -> LLM (%.2f мс) %r", intent, confidence, self.threshold, elapsed_ms, text)
+            return None
+        log.info("intent: %s %.2f via %r -> локально (%.2f мс) %r", intent, confidence, alias, elapsed_ms, text)
+        return m
+
+    # ---------- Внутреннее ----------
+    def _match(self, words: List[str]) -> Optional[Tuple[str, float, str]]:
+        if not words:
+            return None
+        hit = self._exact.get(tuple(words))
+        if hit:
+            return hit[0], 1.0, hit[1]
+
+        best: Dict[str, Tuple[float, str]] = {}
+        for intent, alias, tokens in self._aliases:
+            score = self._alias_score(tokens, words)
+            if score > best.get(intent, (0.0, ""))[0]:
+                best[intent] = (score, alias)
+        if not best:
+            return None
+        ranked = sorted(best.items(), key=lambda kv: kv[1][0], reverse=True)
+        intent, (score, alias) = ranked[0]
+        if score <= 0.0:
+            return None
+        if len(ranked) > 1 and ranked[0][1][0] - ranked[1][1][0] < AMBIGUITY_MARGIN:
+            return intent, 0.0, alias  # два интента почти равны — неоднозначно
+        return intent, score, alias
+
+    @staticmethod
+    def _alias_score(tokens: Tuple[str, ...], words: List[str]) -> float:
+        k, n = len(tokens), len(words)
+        if k > n:
+            return 0.0
+        best = 0.0
+        for i in range(n - k + 1):
+            sims = []
+            for a, w in zip(tokens, words[i:i + k]):
+                sm = SequenceMatcher(None, a, w)
+                s = 1.0 if a == w else (sm.ratio() if sm.real_quick_ratio() >= TOKEN_MIN_SIMILARITY else 0.0)
+                if s < TOKEN_MIN_SIMILARITY:
+                    break
+                sims.append(s)
+            else:
+                best = max(best, sum(sims) / k)
+        return best * (k / n)
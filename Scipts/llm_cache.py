@@ -0,0 +1,170 @@
+# Scipts/llm_cache.py
+from __future__ import annotations
+import atexit
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+# ==== базовые настройки ====
+SAVE_DELAY_SEC = 2.0  # записи за это время сливаются в одно сохранение файла
+
+
+
+def make_key(model: str, messages: List[Dict[str, Any]], max_tokens: int, temperature: float) -> str:
+    """Канонический хэш запроса: одинаковые (model, messages, max_tokens, temperature) -> один ключ."""
+    blob = json.dumps(
+        {"model": model, "messages": messages, "max_tokens": max_tokens, "temperature": float(temperature)},
+        ensure_ascii=False, sort_keys=True, separators=(",", ":"),
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    LRU-кэш ответов LLM, ограниченный числом записей и суммарным размером (байты текста).
+    Если задан path — кэш читается при старте и сохраняется атомарно (tmp + os.replace)
+    фоновым таймером через save_delay после записи: put() зовётся из event loop стримов,
+    и переписывать там многомегабайтный JSON на каждый промах нельзя. flush() — сразу
+    (вызывается и при выходе из процесса).
+    """
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 4 * 1024 * 1024, path: str = "",
+                 save_delay: float = SAVE_DELAY_SEC):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.path = path
+        self.save_delay = save_delay
+        self._save_timer: Optional[threading.Timer] = None
+        self._dirty = False
+        self._data: "OrderedDict[str, str]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if path:
+            self._load()
+            atexit.register(self.flush)
+
+    # ---------- Публичное ----------
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: str) -> None:
+        size = _size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= _size(old)
+            self._data[key] = value
+            self._bytes += size
+            self._evict_locked()
+        self._schedule_save()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+        self._schedule_save()
+
+    def flush(self) -> None:
+        """Сохранить несохранённые изменения сейчас, не дожидаясь таймера."""
+        with self._lock:
+            timer, self._save_timer = self._save_timer, None
+        if timer is not None:
+            timer.cancel()
+        if self._dirty:
+            self._save()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+    # ---------- Внутреннее ----------
+    def _evict_locked(self) -> None:
+        while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+            _, value = self._data.popitem(last=False)
+            self._bytes -= _size(value)
+            self.evictions += 1
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                items = json.load(f)
+        except Exception:
+            return
+        with self._lock:
+            for key, value in items:  # порядок файла = порядок LRU (старые первыми)
+                if isinstance(key, str) and isinstance(value, str):
+                    self._data[key] = value
+                    self._bytes += _size(value)
+            self._evict_locked()
+
+    def _schedule_save(self) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            self._dirty = True
+            if self.save_delay <= 0:
+                timer = None
+            elif self._save_timer is not None:
+                return  # сохранение уже запланировано — оно возьмёт и эту запись
+            else:
+                timer = self._save_timer = threading.Timer(self.save_delay, self._save_later)
+                timer.daemon = True
+        if timer is None:
+            self._save()
+        else:
+            timer.start()
+
+    def _save_later(self) -> None:
+        with self._lock:
+            self._save_timer = None
+        self._save()
+
+    def _save(self) -> None:
+        # снимок берётся под _save_lock, поэтому на диске всегда оказывается самое свежее состояние
+        with self._save_lock:
+            with self._lock:
+                items = list(self._data.items())
+                self._dirty = False
+            self._write(items)
+
+    def _write(self, items) -> None:
+        tmp = f"{self.path}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(items, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except Exception:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+
+def _size(value: str) -> int:
+    return len(value.encode("utf-8"))
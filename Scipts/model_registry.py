@@ -0,0 +1,106 @@
+# Scipts/model_registry.py
+"""
+Общий на процесс реестр моделей Vosk: одна загрузка на путь, фоновая предзагрузка
+при старте приложения, повторные старты голоса берут готовую модель.
+"""
+from __future__ import annotations
+import gc
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+log = logging.getLogger("jarvis.voice")
+
+
+@dataclass
+class ModelEntry:
+    path: str
+    model: Any = None
+    error: str = ""
+    load_sec: Optional[float] = None
+    ready: threading.Event = field(default_factory=threading.Event)  # загружена или упала
+    _callbacks: List[Callable[["ModelEntry"], None]] = field(default_factory=list)
+
+
+_entries: Dict[str, ModelEntry] = {}
+_lock = threading.Lock()
+
+
+def _key(path: str) -> str:
+    return os.path.normcase(os.path.abspath(path))
+
+
+def _load(entry: ModelEntry) -> None:
+    from vosk import Model  # pip install vosk
+    t0 = time.time()
+    try:
+        entry.model = Model(entry.path)
+        entry.load_sec = time.time() - t0
+        log.info("модель Vosk загружена за %.2f с: %s", entry.load_sec, entry.path)
+    except Exception as e:
+        entry.error = str(e) or type(e).__name__
+        log.warning("не удалось загрузить модель Vosk %s: %s", entry.path, entry.error)
+    entry.ready.set()
+    with _lock:
+        callbacks, entry._callbacks = entry._callbacks, []
+    for cb in callbacks:
+        try:
+            cb(entry)
+        except Exception:
+            pass
+
+
+def preload(path: str, on_ready: Optional[Callable[[ModelEntry], None]] = None) -> ModelEntry:
+    """Запустить загрузку в фоне (если ещё не загружена). on_ready(entry) — из фонового потока."""
+    key = _key(path)
+    with _lock:
+        entry = _entries.get(key)
+        start = entry is None or (entry.ready.is_set() and entry.error)  # после ошибки — новая попытка
+        if start:
+            entry = ModelEntry(path)
+            _entries[key] = entry
+        if on_ready is not None and not entry.ready.is_set():
+            entry._callbacks.append(on_ready)
+            on_ready = None
+    if start:
+        threading.Thread(target=_load, args=(entry,), daemon=True, name="vosk-load").start()
+    if on_ready is not None:
+        on_ready(entry)
+    return entry
+
+
+def get_model(path: str, timeout: Optional[float] = None) -> Any:
+    """Готовая модель; ждёт фоновую загрузку. Ошибка загрузки — RuntimeError."""
+    entry = preload(path)
+    if not entry.ready.wait(timeout):
+        raise TimeoutError(f"модель Vosk не загрузилась за {timeout} с: {path}")
+    if entry.error:
+        raise RuntimeError(f"модель Vosk: {entry.error}")
+    return entry.model
+
+
+def release(path: str) -> None:
+    """Забыть модель; память освобождается, когда её отпустят и распознаватели."""
+    with _lock:
+        entry = _entries.pop(_key(path), None)
+    if entry is not None:
+        entry.model = None
+        gc.collect()
+
+
+def release_except(path: str) -> None:
+    """Сменился путь к модели — выгрузить все остальные."""
+    keep = _key(path) if path else None
+    with _lock:
+        stale = [k for k in _entries if k != keep]
+    for k in stale:
+        release(k)
+
+
+def stats() -> List[Dict[str, Any]]:
+    with _lock:
+        entries = list(_entries.values())
+    return [{"path": e.path, "ready": e.ready.is_set(), "error": e.error, "load_sec": e.load_sec} for e in entries]
@@ -0,0 +1,207 @@
+# Scipts/stub_servers.py
+"""
+Локальные заглушки бэкендов для бенчмарков и CI (192.168.100.8 там недоступен):
+  - StubLLMServer: OpenAI-совместимый /v1/chat/completions (обычный и SSE-стрим)
+    с настраиваемой задержкой до первого токена и скоростью генерации;
+  - StubTTSServer: /v1/clone и /v1/tts, синтетический WAV (синус) длиной по тексту.
+"""
+from __future__ import annotations
+import array
+import io
+import json
+import math
+import threading
+import time
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs
+
+DEFAULT_REPLY = "Конечно, сэр. Вот краткий ответ на ваш вопрос, без лишних подробностей."
+
+
+class _StubServer:
+    """Общий каркас: ThreadingHTTPServer на 127.0.0.1 в daemon-потоке, порт выбирается ОС."""
+
+    handler_cls: type = BaseHTTPRequestHandler
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self._httpd = ThreadingHTTPServer((host, port), self.handler_cls)
+        self._httpd.daemon_threads = True
+        self._httpd.stub = self  # type: ignore[attr-defined]
+        self._thread: Optional[threading.Thread] = None
+        self.requests = 0
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "_StubServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, как у настоящих серверов
+
+    def log_message(self, fmt, *args):
+        pass
+
+    @property
+    def stub(self):
+        return self.server.stub  # type: ignore[attr-defined]
+
+    def _read_body(self) -> bytes:
+        n = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(n) if n else b""
+
+    def _send(self, code: int, body: bytes, ctype: str) -> None:
+        self.send_response(code)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+# ---------- LLM ----------
+class _LLMHandler(_QuietHandler):
+    def do_POST(self):
+        stub: StubLLMServer = self.stub
+        body = self._read_body()
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send(404, b'{"error":"not found"}', "application/json")
+            return
+        stub.requests += 1
+        try:
+            req = json.loads(body or b"{}")
+        except ValueError:
+            self._send(400, b'{"error":"bad json"}', "application/json")
+            return
+        reply = stub.reply_for(req)
+        tokens = [t + " " for t in reply.split(" ")]
+        tokens[-1] = tokens[-1].rstrip()
+        max_tokens = int(req.get("max_tokens") or len(tokens))
+        tokens = tokens[:max_tokens]
+        time.sleep(stub.first_token_delay)
+
+        model = req.get("model", "stub")
+        usage = {"prompt_tokens": len(json.dumps(req.get("messages", []))) // 4, "completion_tokens": len(tokens)}
+        if not req.get("stream"):
+            time.sleep(len(tokens) / stub.tokens_per_sec)
+            data = {
+                "id": "stub", "object": "chat.completion", "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}],
+                "usage": usage,
+            }
+            self._send(200, json.dumps(data, ensure_ascii=False).encode("utf-8"), "application/json")
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")  # конец SSE = закрытие соединения
+        self.end_headers()
+        try:
+            for i, tok in enumerate(tokens):
+                if i:
+                    time.sleep(1.0 / stub.tokens_per_sec)
+                chunk = {"id": "stub", "object": "chat.completion.chunk", "model": model,
+                         "choices": [{"index": 0, "delta": {"content": tok}, "finish_reason": None}]}
+                self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+            final = {"id": "stub", "object": "chat.completion.chunk", "model": model,
+                     "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage}
+            self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # клиент оборвал поток (отмена запроса)
+        self.close_connection = True
+
+
+class StubLLMServer(_StubServer):
+    handler_cls = _LLMHandler
+
+    def __init__(self, first_token_delay: float = 0.2, tokens_per_sec: float = 40.0, reply: str = DEFAULT_REPLY, **kw):
+        super().__init__(**kw)
+        self.first_token_delay = first_token_delay
+        self.tokens_per_sec = max(1e-3, tokens_per_sec)
+        self.reply = reply
+
+    def reply_for(self, req: Dict[str, Any]) -> str:
+        """Ответ с тегом команды, если в последней реплике есть «погода»/«привет»."""
+        last = (req.get("messages") or [{}])[-1].get("content", "")
+        if isinstance(last, list):
+            last = " ".join(p.get("text", "") for p in last if isinstance(p, dict))
+        low = str(last).lower()
+        if "погод" in low:
+            return "Открываю прогноз погоды, сэр. <<COMMAND=погода>>"
+        if "привет" in low:
+            return "Здравствуйте, сэр. <<COMMAND=приветствие>>"
+        return self.reply
+
+
+# ---------- TTS ----------
+def synth_wav(seconds: float, sample_rate: int = 24000, freq: float = 220.0) -> bytes:
+    """Синтетический WAV int16 моно (тихий синус)."""
+    n = max(1, int(seconds * sample_rate))
+    step = 2 * math.pi * freq / sample_rate
+    frames = array.array("h", (int(3000 * math.sin(step * i)) for i in range(n))).tobytes()
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(frames)
+    return buf.getvalue()
+
+
+class _TTSHandler(_QuietHandler):
+    def do_POST(self):
+        stub: StubTTSServer = self.stub
+        body = self._read_body()
+        stub.requests += 1
+        path = self.path.rstrip("/")
+        if path.endswith("/v1/clone"):
+            stub.clone_calls += 1
+            stub.clone_bytes += len(body)
+            time.sleep(stub.clone_delay)
+            self._send(200, json.dumps({"ok": True}).encode("utf-8"), "application/json")
+            return
+        if path.endswith("/v1/tts"):
+            stub.tts_calls += 1
+            form = {k: v[0] for k, v in parse_qs(body.decode("utf-8", "replace")).items()}
+            text = form.get("text", "")
+            sr = int(form.get("sample_rate") or 0) or stub.sample_rate
+            seconds = max(0.2, len(text) / stub.chars_per_sec)
+            time.sleep(stub.tts_delay + seconds * stub.realtime_factor)
+            self._send(200, synth_wav(seconds, sr), "audio/wav")
+            return
+        self._send(404, b'{"error":"not found"}', "application/json")
+
+
+class StubTTSServer(_StubServer):
+    handler_cls = _TTSHandler
+
+    def __init__(self, tts_delay: float = 0.1, realtime_factor: float = 0.1, clone_delay: float = 0.05,
+                 chars_per_sec: float = 15.0, sample_rate: int = 24000, **kw):
+        super().__init__(**kw)
+        self.tts_delay = tts_delay                # фиксированная задержка синтеза
+        self.realtime_factor = realtime_factor    # доля длительности аудио, потраченная на синтез
+        self.clone_delay = clone_delay
+        self.chars_per_sec = chars_per_sec        # скорость речи для длины WAV
+        self.sample_rate = sample_rate
+        self.tts_calls = 0
+        self.clone_calls = 0
+        self.clone_bytes = 0
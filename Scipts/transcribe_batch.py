@@ -0,0 +1,168 @@
+# Scipts/transcribe_batch.py
+"""
+Пакетное распознавание WAV-файлов той же логикой, что и живой микрофон (VoiceAgent.feed):
+ключевое слово, сборка команды, _strip_wake — всё как в GUI. Файлы раздаются пулу процессов,
+в каждом процессе одна модель Vosk.
+
+    python -m Scipts.transcribe_batch corpus/ -o transcripts.jsonl --vosk-model VoskModel -j 4
+
+В JSONL на файл: транскрипт, финальные фразы, моменты ключевого слова и команды (секунды аудио),
+RTF (время декодирования / длительность). В конце — сводка по пропускной способности.
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import sys
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from Scipts import model_registry
+from Scipts.voice_agent import SAMPLE_RATE, VoiceAgent, VoiceConfig
+
+
+class _TranscribingAgent(VoiceAgent):
+    """VoiceAgent, который заодно записывает все финальные фразы с временем аудио."""
+
+    def __init__(self, cfg: VoiceConfig, **kw):
+        super().__init__(cfg, **kw)
+        self.finals: List[Dict[str, Any]] = []
+
+    def _handle_text(self, txt: str):
+        words = self._drop_unk(txt)  # мусор грамматики ключевого слова
+        if words:
+            self.finals.append({"t": round(self.audio_time, 3), "text": words})
+        super()._handle_text(txt)
+
+
+def read_pcm16(path: str) -> np.ndarray:
+    """WAV -> int16 моно 16 кГц (каналы усредняются, частота — линейной интерполяцией)."""
+    with wave.open(path, "rb") as w:
+        if w.getsampwidth() != 2:
+            raise ValueError("нужен 16-битный PCM WAV")
+        channels, rate = w.getnchannels(), w.getframerate()
+        x = np.frombuffer(w.readframes(w.getnframes()), dtype=np.int16)
+    if channels > 1:
+        x = x.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    if rate != SAMPLE_RATE and len(x):
+        n = int(round(len(x) * SAMPLE_RATE / rate))
+        x = np.interp(np.linspace(0, len(x) - 1, n), np.arange(len(x)), x).astype(np.int16)
+    return x
+
+
+def transcribe_file(path: str, cfg: VoiceConfig) -> Dict[str, Any]:
+    """Один файл через VoiceAgent в офлайн-режиме; блокирующая."""
+    events: List[Dict[str, Any]] = []
+    agent: Optional[_TranscribingAgent] = None
+
+    def on_wake():
+        events.append({"event": "wake", "t": round(agent.audio_time, 3)})
+
+    def on_command(text: str):
+        events.append({"event": "command", "t": round(agent.audio_time, 3), "text": text})
+
+    rec: Dict[str, Any] = {"file": path}
+    try:
+        pcm = read_pcm16(path)
+        duration = len(pcm) / SAMPLE_RATE
+        agent = _TranscribingAgent(cfg, on_wake=on_wake, on_command=on_command)
+        agent.start_offline()
+        t0 = time.perf_counter()
+        for i in range(0, len(pcm), cfg.block_size):
+            agent.feed(pcm[i:i + cfg.block_size].tobytes())
+        agent.finish()
+        elapsed = time.perf_counter() - t0
+    except Exception as e:
+        rec["error"] = str(e) or type(e).__name__
+        return rec
+    rec.update(
+        duration=round(duration, 3),
+        decode_sec=round(elapsed, 4),
+        rtf=round(elapsed / duration, 4) if duration else None,
+        transcript=" ".join(f["text"] for f in agent.finals),
+        finals=agent.finals,
+        wakes=[e["t"] for e in events if e["event"] == "wake"],
+        commands=[{"t": e["t"], "text": e["text"]} for e in events if e["event"] == "command"],
+        metrics=agent.metrics(),
+    )
+    return rec
+
+
+def _init_worker(model_path: str) -> None:
+    model_registry.get_model(model_path)  # одна модель на процесс, до первого файла
+
+
+def iter_wavs(paths: List[str]) -> Iterator[str]:
+    for p in paths:
+        if os.path.isdir(p):
+            for root, _dirs, files in os.walk(p):
+                for name in sorted(files):
+                    if name.lower().endswith(".wav"):
+                        yield os.path.join(root, name)
+        else:
+            yield p
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    cfg = VoiceConfig(vosk_model_path=args.vosk_model, two_stage=args.two_stage,
+                      vad_enabled=not args.no_vad)
+    files = list(iter_wavs(args.inputs))
+    rtfs: List[float] = []
+    audio_sec = 0.0
+    errors = 0
+    t_start = time.time()
+    with open(args.output, "w", encoding="utf-8") as out, ProcessPoolExecutor(
+        max_workers=max(1, args.jobs), initializer=_init_worker, initargs=(args.vosk_model,)
+    ) as pool:
+        futures = [pool.submit(transcribe_file, f, cfg) for f in files]
+        for n, fut in enumerate(as_completed(futures), 1):
+            rec = fut.result()
+            out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            out.flush()
+            if rec.get("error"):
+                errors += 1
+            else:
+                audio_sec += rec["duration"]
+                if rec["rtf"] is not None:
+                    rtfs.append(rec["rtf"])
+            if args.progress and n % args.progress == 0:
+                print(f"[asr] {n}/{len(files)}", file=sys.stderr)
+    wall = time.time() - t_start
+    return {
+        "files": len(files),
+        "errors": errors,
+        "workers": args.jobs,
+        "audio_sec": round(audio_sec, 2),
+        "wall_sec": round(wall, 3),
+        "audio_sec_per_sec": round(audio_sec / wall, 2) if wall else 0.0,
+        # ближайший ранг, как в batch_runner.percentile
+        "rtf_p50": round(float(np.percentile(rtfs, 50, method="inverted_cdf")), 4) if rtfs else None,
+        "rtf_p95": round(float(np.percentile(rtfs, 95, method="inverted_cdf")), 4) if rtfs else None,
+        "config": {k: v for k, v in asdict(cfg).items() if k != "wake_words"},
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Пакетное распознавание WAV через VoiceAgent")
+    ap.add_argument("inputs", nargs="+", help="WAV-файлы или папки с ними")
+    ap.add_argument("-o", "--output", default="transcripts.jsonl")
+    ap.add_argument("--vosk-model", required=True, help="папка модели Vosk")
+    ap.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 2, help="процессов (по модели на каждый)")
+    ap.add_argument("--two-stage", action="store_true",
+                    help="как в GUI: вне командного окна распознаются только ключевые слова (транскрипт неполный)")
+    ap.add_argument("--no-vad", action="store_true", help="декодировать и тишину")
+    ap.add_argument("--progress", type=int, default=20, help="печатать прогресс каждые N файлов (0 — нет)")
+    args = ap.parse_args(argv)
+
+    summary = run(args)
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    return 0 if summary["errors"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
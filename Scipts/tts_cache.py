@@ -0,0 +1,183 @@
+# Scipts/tts_cache.py
+from __future__ import annotations
+import hashlib
+import json
+import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+
+def normalize_text(text: str) -> str:
+    """Одинаковые фразы с разными пробелами/формой Юникода -> один ключ."""
+    return unicodedata.normalize("NFC", " ".join((text or "").split()))
+
+
+def make_key(text: str, voice_id: str, language: str, speed: float, sample_rate: int,
+             pause_ms: int, naturalize: int, temperature: float, top_p: float, sample: str = "") -> str:
+    """
+    Канонический хэш всех параметров синтеза, влияющих на звук. sample — хэш образца голоса:
+    voice_id постоянный ("jarvis"), а сменённый образец звучит иначе.
+    """
+    blob = json.dumps(
+        {
+            "text": normalize_text(text), "voice_id": voice_id, "sample": sample, "language": language,
+            "speed": float(speed), "sample_rate": int(sample_rate), "pause_ms": int(pause_ms),
+            "naturalize": int(naturalize), "temperature": float(temperature), "top_p": float(top_p),
+        },
+        ensure_ascii=False, sort_keys=True, separators=(",", ":"),
+    )
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    """
+    Кэш синтезированных WAV в папке: файл <ключ>.wav, LRU по суммарному размеру.
+    Порядок LRU переживает перезапуск: при попадании у файла обновляется mtime,
+    при старте папка читается по mtime (старые первыми). Запись атомарная (tmp + os.replace).
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[str, int]" = OrderedDict()  # ключ -> размер файла
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    # ---------- Публичное ----------
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.wav")
+
+    def get(self, key: str) -> Optional[str]:
+        """Путь к готовому WAV или None."""
+        path = self.path_for(key)
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return None
+            if not os.path.exists(path):  # удалили снаружи
+                self._bytes -= self._data.pop(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        path = self.get(key)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, key: str, data: bytes) -> Optional[str]:
+        """Сохранить WAV; None — не влезает в лимит или диск недоступен."""
+        size = len(data)
+        if not data or size > self.max_bytes:
+            return None
+        path = self.path_for(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return None
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old
+            self._data[key] = size
+            self._bytes += size
+            stale = self._evict_locked(keep=key)
+        for k in stale:
+            self._remove(k)
+        return path
+
+    def clear(self) -> None:
+        with self._lock:
+            keys = list(self._data)
+            self._data.clear()
+            self._bytes = 0
+        for k in keys:
+            self._remove(k)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+    # ---------- Внутреннее ----------
+    def _evict_locked(self, keep: str = "") -> list:
+        stale = []
+        while self._bytes > self.max_bytes and len(self._data) > 1:
+            key, size = next(iter(self._data.items()))
+            if key == keep:
+                break
+            del self._data[key]
+            self._bytes -= size
+            self.evictions += 1
+            stale.append(key)
+        return stale
+
+    def _remove(self, key: str) -> None:
+        try:
+            os.remove(self.path_for(key))
+        except OSError:
+            pass  # файл сейчас играет (Windows) — уберём при следующем старте/вытеснении
+
+    def _scan(self) -> None:
+        now = time.time()
+        found = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".tmp"):
+                # недописанный файл упавшего процесса
+                try:
+                    if now - os.path.getmtime(path) > 60:
+                        os.remove(path)
+                except OSError:
+                    pass
+                continue
+            if not name.endswith(".wav"):
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            found.append((st.st_mtime, name[:-4], st.st_size))
+        found.sort()
+        with self._lock:
+            for _mtime, key, size in found:
+                self._data[key] = size
+                self._bytes += size
+            stale = self._evict_locked()
+        for k in stale:
+            self._remove(k)
@@ -0,0 +1,363 @@
+# Scipts/tts_pipeline.py
+"""
+Конвейерная озвучка: текст режется на предложения (длинные — по запятым), фраза N+1
+синтезируется, пока играет фраза N. Текст можно подавать кусками прямо из стрима LLM
+(feed), речь начинается с первого законченного предложения, не дожидаясь конца ответа.
+
+Фразы играются в один поток вывода без щелчков и провалов: тишина по краям каждой
+фразы обрезается, между фразами вставляется ровно pause_ms.
+"""
+from __future__ import annotations
+import io
+import queue
+import re
+import threading
+import time
+import wave
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from Scipts import voice_clone_remote as vcr
+
+# ==== базовые настройки ====
+PREFETCH = 2                # сколько синтезированных фраз держим впереди воспроизведения
+MIN_CHUNK_CHARS = 24        # короче — склеиваем со следующим предложением (обрывки TTS интонирует плохо)
+MAX_CHUNK_CHARS = 220       # длиннее — режем по запятой/точке с запятой, иначе по пробелу
+FIRST_MAX_CHARS = 90        # первая фраза короче: быстрее первый звук
+EDGE_SILENCE = 250          # |амплитуда| int16 ниже — тишина по краям фразы
+EDGE_KEEP_MS = 30           # сколько оставить от краёв (атака/затухание)
+WRITE_MS = 100              # порция записи в устройство — столько ждёт отмена
+
+_SENT_END = re.compile(r"[.!?…]+[»\"')]*\s+|\n+")
+_CLAUSE_END = re.compile(r"[,;:—]\s+")
+
+
+@dataclass
+class SpeechConfig:
+    sample_path: str = ""           # образец голоса для /v1/clone
+    voice_id: Optional[str] = None
+    language: str = "ru"
+    speed: float = 0.88
+    sample_rate: int = 0            # 0 — нативная частота сервера
+    pause_ms: int = 180             # пауза между фразами (и внутри фразы — на сервере)
+    naturalize: int = 1
+    temperature: float = 0.8
+    top_p: float = 0.9
+    prefetch: int = PREFETCH
+    # придерживать последнюю готовую фразу, пока за ней не пошёл текст: тег <<COMMAND=...>>
+    # приходит в конце ответа, и вступление перед ним не должно успеть прозвучать
+    hold_last: bool = False
+
+
+class SentenceSplitter:
+    """Инкрементальная нарезка: feed(кусок) -> готовые фразы, flush() -> хвост."""
+
+    def __init__(self, min_chars: int = MIN_CHUNK_CHARS, max_chars: int = MAX_CHUNK_CHARS,
+                 first_max_chars: int = FIRST_MAX_CHARS):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.first_max_chars = first_max_chars
+        self._buf = ""
+        self._emitted = 0
+
+    def feed(self, text: str) -> List[str]:
+        self._buf += text or ""
+        out = []
+        while True:
+            cut = self._next_cut()
+            if cut is None:
+                return out
+            piece, self._buf = self._buf[:cut].strip(), self._buf[cut:]
+            if piece:
+                out.append(piece)
+                self._emitted += 1
+
+    def flush(self) -> List[str]:
+        piece, self._buf = self._buf.strip(), ""
+        return [piece] if piece else []
+
+    def pending(self) -> bool:
+        """Есть ли начатая, но ещё не отданная фраза."""
+        return bool(self._buf.strip())
+
+    def _next_cut(self) -> Optional[int]:
+        limit = self.max_chars if self._emitted else self.first_max_chars
+        cut = None
+        # конец предложения только с пробелом после: «3.5» и незаконченный стрим не режем
+        for m in _SENT_END.finditer(self._buf):
+            if len(self._buf[:m.end()].strip()) >= self.min_chars:
+                cut = m.end()
+                break
+        if cut is not None and cut <= limit:
+            return cut
+        if len(self._buf) <= limit:
+            return None
+        head = self._buf[:limit]
+        clause = max((m.end() for m in _CLAUSE_END.finditer(head) if m.end() >= self.min_chars), default=0)
+        if clause:
+            return clause
+        space = head.rfind(" ")
+        return space + 1 if space > 0 else limit
+
+
+def decode_wav(data: bytes) -> Tuple[int, np.ndarray]:
+    """WAV-байты -> (частота, int16 моно)."""
+    with wave.open(io.BytesIO(data), "rb") as w:
+        if w.getsampwidth() != 2:
+            raise ValueError("TTS вернул не 16-битный PCM")
+        channels, rate = w.getnchannels(), w.getframerate()
+        x = np.frombuffer(w.readframes(w.getnframes()), dtype=np.int16)
+    if channels > 1:
+        x = x.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    return rate, x
+
+
+def trim_silence(x: np.ndarray, rate: int, threshold: int = EDGE_SILENCE, keep_ms: int = EDGE_KEEP_MS) -> np.ndarray:
+    loud = np.flatnonzero(np.abs(x.astype(np.int32)) > threshold)
+    if not len(loud):
+        return x[:0]
+    keep = rate * keep_ms // 1000
+    return x[max(0, loud[0] - keep):loud[-1] + 1 + keep]
+
+
+class SpeechPipeline:
+    """
+    feed(текст) сколько угодно раз, затем finish(); speak(текст) — то же за один вызов.
+    Синтез и воспроизведение — два фоновых потока, между ними очередь на cfg.prefetch фраз.
+    sink(rate, pcm) вместо устройства — для бенчмарка (должен блокировать на время звучания).
+    after — предыдущая озвучка: синтез идёт сразу, а звук — только когда она закончится
+    (два ответа подряд не говорят одновременно).
+    """
+
+    def __init__(self, cfg: SpeechConfig,
+                 on_done: Optional[Callable[[str], None]] = None,
+                 sink: Optional[Callable[[int, np.ndarray], None]] = None,
+                 after: Optional["SpeechPipeline"] = None):
+        self.cfg = cfg
+        self.on_done = on_done or (lambda s: None)
+        self._sink = sink
+        self._after = after
+        self._splitter = SentenceSplitter()
+        self._text_q: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._audio_q: "queue.Queue[Optional[Tuple[int, np.ndarray]]]" = queue.Queue(maxsize=max(1, cfg.prefetch))
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._started = False
+        self._finished = False
+        self._held: List[str] = []   # cfg.hold_last: фраза ждёт продолжения ответа
+        self._stream = None
+        self._t0 = time.time()
+        # метрики
+        self.first_audio_sec: Optional[float] = None
+        self.chunks = 0
+        self.played_sec = 0.0
+        self.underruns = 0           # плеер ждал синтез посреди речи
+        self.synth_sec: List[float] = []
+        self.errors: List[str] = []
+
+    # ---------- Публичное ----------
+    def feed(self, text: str) -> None:
+        """Кусок текста (можно из потока LLM); готовые фразы сразу уходят в синтез."""
+        with self._lock:
+            if self._finished:
+                return
+            pieces = self._held + self._splitter.feed(text)
+            self._held = []
+            if self.cfg.hold_last and pieces and not self._splitter.pending():
+                self._held = pieces[-1:]
+                pieces = pieces[:-1]
+        self._enqueue(pieces)
+
+    def finish(self) -> None:
+        with self._lock:
+            if self._finished:
+                return
+            self._finished = True
+            pieces = self._held + self._splitter.flush()
+            self._held = []
+        self._enqueue(pieces)
+        self._start()  # пустой ответ тоже должен завершиться (on_done)
+        self._text_q.put(None)
+
+    def speak(self, text: str) -> None:
+        self.feed(text)
+        self.finish()
+
+    def cancel(self) -> None:
+        """Оборвать речь: синтез бросает очередь, звук глушится сразу."""
+        self._cancel.set()
+        with self._lock:
+            self._finished = True
+            if not self._started:
+                self._done.set()  # потоки так и не стартовали
+        self._text_q.put(None)
+        stream = self._stream
+        if stream is not None:
+            try:
+                stream.abort()
+            except Exception:
+                pass
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def is_done(self) -> bool:
+        return self._done.is_set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "chunks": self.chunks,
+            "first_audio_sec": self.first_audio_sec,
+            "played_sec": round(self.played_sec, 3),
+            "synth_sec_mean": round(sum(self.synth_sec) / len(self.synth_sec), 4) if self.synth_sec else None,
+            "underruns": self.underruns,
+            "errors": list(self.errors),
+            "cancelled": self._cancel.is_set(),
+            "cache": vcr.cache_stats(),
+        }
+
+    # ---------- Потоки ----------
+    def _enqueue(self, pieces: List[str]) -> None:
+        if not pieces:
+            return
+        self._start()
+        for p in pieces:
+            self._text_q.put(p)
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._synth_loop, daemon=True, name="tts-synth").start()
+        threading.Thread(target=self._play_loop, daemon=True, name="tts-play").start()
+
+    def _synth_loop(self) -> None:
+        cfg = self.cfg
+        try:
+            vid = vcr.ensure_voice_cloned(cfg.sample_path, voice_id=cfg.voice_id)
+        except Exception as e:
+            self.errors.append(f"Ошибка /v1/clone: {e}")
+            self._put_audio(None)
+            return
+        while not self._cancel.is_set():
+            text = self._text_q.get()
+            if text is None or self._cancel.is_set():
+                break
+            t0 = time.time()
+            try:
+                wav = vcr.synth_with_reclone(
+                    vcr.tts_to_wav_bytes, cfg.sample_path, vid,
+                    text=text, language=cfg.language, speed=cfg.speed, sample_rate=cfg.sample_rate,
+                    pause_ms=cfg.pause_ms, naturalize=cfg.naturalize,
+                    temperature=cfg.temperature, top_p=cfg.top_p,
+                )
+                rate, pcm = decode_wav(wav)
+            except Exception as e:
+                self.errors.append(f"Ошибка /v1/tts: {e}")  # фразу пропускаем, остальное договариваем
+                continue
+            self.synth_sec.append(time.time() - t0)
+            self._put_audio((rate, trim_silence(pcm, rate)))
+        self._put_audio(None)
+
+    def _put_audio(self, item) -> None:
+        # очередь ограничена prefetch: синтез ждёт, пока плеер не заберёт фразу
+        while not self._cancel.is_set():
+            try:
+                self._audio_q.put(item, timeout=0.2)
+                return
+            except queue.Full:
+                continue
+
+    def _play_loop(self) -> None:
+        rate = None
+        try:
+            self._wait_previous()
+            while True:
+                item = self._next_audio()
+                if item is None:
+                    break
+                chunk_rate, pcm = item
+                if not len(pcm):
+                    continue
+                if chunk_rate != rate:
+                    self._open_output(chunk_rate)
+                    rate = chunk_rate
+                if self.chunks:
+                    self._write(np.zeros(rate * self.cfg.pause_ms // 1000, dtype=np.int16), rate)
+                else:
+                    self.first_audio_sec = time.time() - self._t0
+                self.chunks += 1
+                self._write(pcm, rate)
+        except Exception as e:
+            self.errors.append(f"Ошибка воспроизведения: {e}")
+        finally:
+            self._close_output()
+            self._done.set()
+            self.on_done(self._summary())
+
+    def _wait_previous(self) -> None:
+        after, self._after = self._after, None  # ссылку не держим: иначе цепочка ответов живёт вечно
+        while after is not None and not self._cancel.is_set() and not after.wait(0.2):
+            pass
+
+    def _next_audio(self):
+        if self.chunks and self._audio_q.empty():
+            self.underruns += 1  # устройство доиграет буфер и замолчит до следующей фразы
+        while not self._cancel.is_set():
+            try:
+                return self._audio_q.get(timeout=0.2)
+            except queue.Empty:
+                continue
+        return None
+
+    # ---------- Вывод ----------
+    def _open_output(self, rate: int) -> None:
+        self._close_output()
+        if self._sink is not None:
+            return
+        import sounddevice as sd  # ленивый импорт: конвейер нужен и без звуковой карты (бенчмарк)
+        stream = sd.OutputStream(samplerate=rate, channels=1, dtype="int16")
+        stream.start()
+        self._stream = stream
+
+    def _write(self, pcm: np.ndarray, rate: int) -> None:
+        step = max(1, rate * WRITE_MS // 1000)
+        for i in range(0, len(pcm), step):
+            if self._cancel.is_set():
+                return
+            part = pcm[i:i + step]
+            if self._sink is not None:
+                self._sink(rate, part)
+            else:
+                self._stream.write(part.reshape(-1, 1))  # блокирует, пока устройство не примет
+            self.played_sec += len(part) / rate
+
+    def _close_output(self) -> None:
+        stream, self._stream = self._stream, None
+        if stream is None:
+            return
+        try:
+            if not self._cancel.is_set():
+                stream.stop()  # доиграть буфер устройства
+            stream.close()
+        except Exception:
+            pass
+
+    def _summary(self) -> str:
+        if self._cancel.is_set():
+            return "озвучка прервана"
+        if not self.chunks:
+            return "; ".join(self.errors) or "Пустой текст — озвучивать нечего."
+        msg = f"озвучено фраз: {self.chunks}, первый звук через {self.first_audio_sec:.2f} с"
+        if self.underruns:
+            msg += f", ожиданий синтеза: {self.underruns}"
+        cache = vcr.cache_stats()
+        if cache.get("hits"):
+            msg += f", кэш TTS {cache['hits']}/{cache['hits'] + cache['misses']}"
+        if self.errors:
+            msg += f"; {'; '.join(self.errors)}"
+        return msg
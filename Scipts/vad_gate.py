@@ -0,0 +1,83 @@
+# Scipts/vad_gate.py
+from __future__ import annotations
+from collections import deque
+from typing import Deque, List
+
+import numpy as np  # ставится вместе с sounddevice
+
+# ==== базовые настройки ====
+FRAME_MS = 20               # окно анализа внутри блока
+MIN_RMS = 300.0             # абсолютный порог энергии (int16), ниже — тишина при любом шуме
+NOISE_RATIO = 2.5           # речь — во столько раз громче оценки фонового шума
+MAX_ZCR = 0.35              # доля смен знака: выше при малой энергии — шипение, не голос
+MIN_ACTIVE_FRAMES = 3       # сколько «речевых» окон нужно, чтобы блок считался речью
+HANGOVER_SEC = 1.0          # держим ворота открытыми после речи (Kaldi нужна тишина для финала)
+PREROLL_SEC = 0.5           # сколько тишины перед речью отдать распознавателю для контекста
+NOISE_EWMA = 0.05           # скорость подстройки оценки шума на тихих блоках
+
+
+class VadGate:
+    """
+    Ворота перед распознавателем: тихие блоки не декодируются.
+    process(block) -> список блоков для AcceptWaveform (пре-ролл + текущий) или [].
+    Энергия/ZCR считаются векторно по окнам FRAME_MS; порог подстраивается под фон.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int,
+        block_size: int,
+        min_rms: float = MIN_RMS,
+        hangover_sec: float = HANGOVER_SEC,
+        preroll_sec: float = PREROLL_SEC,
+    ):
+        self.sample_rate = sample_rate
+        self.frame = max(1, sample_rate * FRAME_MS // 1000)
+        self.min_rms = min_rms
+        block_sec = block_size / sample_rate
+        self._hangover_blocks = max(0, int(np.ceil(hangover_sec / block_sec)))
+        self._preroll: Deque[bytes] = deque(maxlen=max(0, int(np.ceil(preroll_sec / block_sec))))
+        self._hang = 0
+        self._noise = min_rms / NOISE_RATIO
+        self.gated_sec = 0.0
+        self.decoded_sec = 0.0
+
+    def is_speech(self, block: bytes) -> bool:
+        x = np.frombuffer(block, dtype=np.int16)
+        n = len(x) // self.frame
+        if n == 0:
+            return False
+        frames = x[: n * self.frame].reshape(n, self.frame).astype(np.float32)
+        rms = np.sqrt(np.mean(frames * frames, axis=1))
+        zcr = np.mean(np.signbit(frames[:, 1:]) != np.signbit(frames[:, :-1]), axis=1)
+        threshold = max(self.min_rms, self._noise * NOISE_RATIO)
+        # громкое — речь при любом ZCR (шипящие), тихое с высоким ZCR — шум
+        active = (rms >= threshold) & ((zcr <= MAX_ZCR) | (rms >= 2 * threshold))
+        speech = int(np.count_nonzero(active)) >= min(MIN_ACTIVE_FRAMES, n)
+        if not speech:
+            self._noise += NOISE_EWMA * (float(np.median(rms)) - self._noise)
+        return speech
+
+    def process(self, block: bytes) -> List[bytes]:
+        sec = len(block) / 2 / self.sample_rate
+        if self.is_speech(block):
+            self._hang = self._hangover_blocks
+            out = list(self._preroll) + [block]
+            self._preroll.clear()
+        elif self._hang > 0:
+            self._hang -= 1
+            out = [block]
+        else:
+            if self._preroll.maxlen:
+                if len(self._preroll) == self._preroll.maxlen:
+                    self.gated_sec += len(self._preroll[0]) / 2 / self.sample_rate
+                self._preroll.append(block)
+            else:
+                self.gated_sec += sec
+            return []
+        self.decoded_sec += sum(len(b) for b in out) / 2 / self.sample_rate
+        return out
+
+    def reset(self) -> None:
+        self._preroll.clear()
+        self._hang = 0
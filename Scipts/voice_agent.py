@@ -1,25 +1,55 @@
 # Scipts/voice_agent.py
 from __future__ import annotations
 import json
-import queue
 import threading
 import time
+from collections import deque
 from dataclasses import dataclass
-from typing import Callable, Optional
+from typing import Any, Callable, Deque, Dict, Optional
 
-import sounddevice as sd
 from vosk import Model, KaldiRecognizer  # pip install vosk sounddevice
 
+from Scipts import model_registry
+from Scipts.audio_ring import AudioRing
+from Scipts.vad_gate import VadGate, HANGOVER_SEC, MIN_RMS, PREROLL_SEC
+
 # ------------ Настройки ------------
 WAKE_WORDS = ("джарвис", "jarvis")   # ключевое слово
 SAMPLE_RATE = 16000                  # 16kHz моно
-BLOCK_SIZE = 8000                    # ~0.5s блок
-COMMAND_TIMEOUT = 6.0                # сколько секунд слушаем команду после ключевого слова
+BLOCK_SIZE = 3200                    # 0.2s блок: проверки конца команды не округляются до 0.5 с
+COMMAND_TIMEOUT = 6.0                # сколько секунд слушаем команду после ключевого слова (тишины)
+COMMAND_SILENCE_SEC = 0.8            # пауза после речи (не после финала Kaldi), после которой команда собрана
+WAKE_LATENCY_WINDOW = 50             # сколько последних замеров wake→on_wake хранить
+UNK = "[unk]"                        # «не ключевое слово» в грамматике двухступенчатого режима
 
 @dataclass
 class VoiceConfig:
     vosk_model_path: str  # путь к распакованной модели Vosk (ru)
     wake_words: tuple = WAKE_WORDS
+    block_size: int = BLOCK_SIZE            # сэмплов на блок; меньше — чаще проверки, быстрее реакция
+    command_timeout: float = COMMAND_TIMEOUT
+    # сборка команды: финалы Kaldi склеиваются, пока после речи не пройдёт command_silence_sec.
+    # Выключена по умолчанию: командой считается первый финал, он и так приходит через
+    # endpoint_end_sec тишины; сборка — для длинных команд с паузами (ценой задержки)
+    command_assembly: bool = False
+    command_silence_sec: float = COMMAND_SILENCE_SEC
+    # эндпоинтер Kaldi (SetEndpointerDelays, vosk >= 0.3.45): ждать начала речи / тишина в конце / макс. фраза
+    endpoint_start_max_sec: float = 5.0
+    endpoint_end_sec: float = 0.5
+    endpoint_max_sec: float = 20.0
+    # двухступенчато: в простое — дешёвый распознаватель с грамматикой из wake_words + "[unk]",
+    # после ключевого слова — полный словарь на command_timeout
+    # (большие модели без динамического графа грамматику игнорируют — работают как полный)
+    two_stage: bool = True
+    # ворота по энергии/ZCR: тишина не декодируется (hangover — чтобы Kaldi увидел конец фразы)
+    vad_enabled: bool = True
+    vad_min_rms: float = MIN_RMS
+    vad_hangover_sec: float = HANGOVER_SEC
+    vad_preroll_sec: float = PREROLL_SEC
+    # кольцевой буфер микрофона: при отставании декодера старое аудио теряется (и считается)
+    audio_buffer_sec: float = 10.0
+    # распознавание в отдельном процессе (Scipts/voice_process.py): без борьбы за GIL с Tk
+    out_of_process: bool = False
 
 
 class VoiceAgent:
@@ -30,82 +60,248 @@ class VoiceAgent:
     """
     def __init__(self, cfg: VoiceConfig, on_status: Optional[Callable[[str], None]] = None,
                  on_command: Optional[Callable[[str], None]] = None,
-                 on_wake: Optional[Callable[[], None]] = None): 
+                 on_wake: Optional[Callable[[], None]] = None,
+                 on_error: Optional[Callable[[str], None]] = None):
         self.cfg = cfg
         self.on_status = on_status or (lambda s: None)
         self.on_command = on_command or (lambda t: None)
         self.on_wake = on_wake or (lambda: None)
+        self.on_error = on_error or (lambda e: None)  # запуск не удался (модель, микрофон)
 
-        self._audio_q: "queue.Queue[bytes]" = queue.Queue()
-        self._stream: Optional[sd.InputStream] = None
-        self._rec: Optional[KaldiRecognizer] = None
+        self._ring = AudioRing(cfg.audio_buffer_sec, SAMPLE_RATE)
+        self._reported_overflows = 0
+        self._proc_wall = 0.0   # стена на обработку блоков / секунды аудио -> RTF декодера
+        self._proc_audio = 0.0
+        self._stream: Optional[Any] = None  # sd.InputStream
+        self._rec: Optional[KaldiRecognizer] = None       # полный словарь (команды)
+        self._wake_rec: Optional[KaldiRecognizer] = None  # только ключевые слова (two_stage)
+        self._vad: Optional[VadGate] = None
         self._model: Optional[Model] = None
 
         self._thread: Optional[threading.Thread] = None
         self._running = False
+        self._stream_lock = threading.Lock()
         self._awaiting_command = False
         self._last_wake_ts = 0.0
         self._buffered_text = ""
+        self._last_speech_ts = 0.0       # когда в командном окне последний раз менялся текст
+        self._speaking = False           # есть незакрытая (partial) фраза
+        self._last_partial = ""
+        self._eos_gaps: Deque[float] = deque(maxlen=WAKE_LATENCY_WINDOW)  # конец речи → on_command
+        self._wake_in_utterance = False  # ключевое слово уже сработало на partial этой фразы
+        self._block_ts = 0.0             # когда захвачен обрабатываемый блок (часы time.time)
+        self._wake_latencies: Deque[float] = deque(maxlen=WAKE_LATENCY_WINDOW)
+        self.last_wake_source = ""       # "partial" | "final"
+
+        # CPU распознавания в простое и в командном окне: {"idle"/"command": [cpu_сек, аудио_сек]}
+        self._cpu: Dict[str, list] = {"idle": [0.0, 0.0], "command": [0.0, 0.0]}
+
+        # офлайн-режим (WAV/тесты): время считается по поданному аудио, а не по часам
+        self._offline = False
+        self._audio_time = 0.0
 
     # ---------- Публичное ----------
     def start(self):
+        """Не блокирует: модель (из общего реестра), распознаватели и микрофон поднимаются в потоке агента."""
         if self._running:
             return
         self._running = True
         self.on_status("инициализация…")
-        self._model = Model(self.cfg.vosk_model_path)
-        self._rec = KaldiRecognizer(self._model, SAMPLE_RATE)
-        self._rec.SetWords(False)
-
-        self._stream = sd.InputStream(
-            samplerate=SAMPLE_RATE,
-            channels=1,
-            dtype="int16",
-            blocksize=BLOCK_SIZE,
-            callback=self._audio_callback,
-        )
-        self._stream.start()
-
-        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread = threading.Thread(target=self._run, daemon=True)
         self._thread.start()
-        self.on_status("слушаю (ожидаю «джарвис»)")
 
-    def stop(self):
-        self._running = False
+    def _run(self):
         try:
-            if self._stream:
-                self._stream.stop()
-                self._stream.close()
-        finally:
-            self._stream = None
+            entry = model_registry.preload(self.cfg.vosk_model_path)
+            if not entry.ready.is_set():
+                self.on_status("загрузка модели…")
+            self._model = model_registry.get_model(self.cfg.vosk_model_path)
+            self._make_recognizers()
+            with self._stream_lock:
+                if not self._running:
+                    return  # остановили, пока грузились
+                # ленивый импорт: офлайн-режим (feed, бенчмарк, тесты) работает без звуковой карты
+                import sounddevice as sd
+
+                self._stream = sd.InputStream(
+                    samplerate=SAMPLE_RATE,
+                    channels=1,
+                    dtype="int16",
+                    blocksize=self.cfg.block_size,
+                    callback=self._audio_callback,
+                )
+                self._stream.start()
+        except Exception as e:
+            self._running = False
+            self.on_status(f"ошибка запуска: {e}")
+            self.on_error(str(e))
+            return
+        load = f" (модель {entry.load_sec:.1f} с)" if entry.load_sec is not None else ""
+        self.on_status(f"слушаю (ожидаю «джарвис»){load}")
+        self._loop()
+
+    def start_offline(self):
+        """Без микрофона и потока: аудио подаётся через feed() (бенчмарки, WAV-файлы)."""
+        self._offline = True
+        self._audio_time = 0.0
+        self._model = self._model or model_registry.get_model(self.cfg.vosk_model_path)
+        self._make_recognizers()
+
+    def feed(self, data: bytes, captured_at: Optional[float] = None):
+        """
+        Обработать блок int16 PCM 16 кГц моно синхронно (офлайн-режим).
+        captured_at — time.time() захвата блока, если он пришёл извне (процесс-распознаватель).
+        """
+        self._audio_time += len(data) / 2 / SAMPLE_RATE
+        self._block_ts = captured_at or time.time()
+        t0 = time.perf_counter()
+        self._process_block(data)
+        self._proc_wall += time.perf_counter() - t0
+        self._proc_audio += len(data) / 2 / SAMPLE_RATE
+
+    def finish(self):
+        """Конец офлайн-аудио: дожать последнюю фразу распознавателя."""
+        if self._rec is None:
+            return
+        result = self._try_parse(self._active_rec().FinalResult())
+        if result:
+            self._handle_text(result)
+        self._check_timeout()
+
+    @property
+    def audio_time(self) -> float:
+        return self._audio_time
+
+    def metrics(self) -> Dict[str, Any]:
+        """Задержка wake→on_wake: от захвата блока с ключевым словом до вызова on_wake, секунды."""
+        lat = sorted(self._wake_latencies)
+        return {
+            "wake_count": len(lat),
+            "wake_source": self.last_wake_source,
+            "wake_latency_last": self._wake_latencies[-1] if lat else None,
+            "wake_latency_p50": lat[len(lat) // 2] if lat else None,
+            "wake_latency_max": lat[-1] if lat else None,
+            "recognizer": "two-stage" if self._wake_rec is not None else "single",
+            # доля одного ядра на декодирование: CPU-секунды на секунду аудио
+            "cpu_idle": self._cpu_share("idle"),
+            "cpu_command": self._cpu_share("command"),
+            # секунды аудио, отсечённые воротами / отданные распознавателю
+            "vad_gated_sec": self._vad.gated_sec if self._vad else 0.0,
+            "vad_decoded_sec": self._vad.decoded_sec if self._vad else None,
+            # очередь микрофона: отставание, потери при переполнении, RTF (<1 — успеваем)
+            "queue_lag_sec": self._ring.lag_sec(),
+            "overflows": self._ring.overflows,
+            "dropped_sec": self._ring.dropped_samples / SAMPLE_RATE,
+            "decoder_rtf": self._proc_wall / self._proc_audio if self._proc_audio else None,
+            "eos_to_command_last": self._eos_gaps[-1] if self._eos_gaps else None,
+            "eos_to_command_p50": sorted(self._eos_gaps)[len(self._eos_gaps) // 2] if self._eos_gaps else None,
+        }
+
+    def _cpu_share(self, mode: str) -> Optional[float]:
+        cpu, audio = self._cpu[mode]
+        return cpu / audio if audio else None
+
+    def stop(self):
+        with self._stream_lock:
+            self._running = False
+            try:
+                if self._stream:
+                    self._stream.stop()
+                    self._stream.close()
+            finally:
+                self._stream = None
         self.on_status("голос остановлен")
 
     # ---------- Внутреннее ----------
     def _audio_callback(self, indata, frames, time_info, status):
         if status:
             self.on_status(f"аудио статус: {status}")
-        self._audio_q.put(bytes(indata))
+        self._ring.write(indata[:, 0])  # копия сразу в преаллоцированное кольцо
 
     def _loop(self):
         assert self._rec is not None
+        self._ring.clear()
         while self._running:
-            try:
-                data = self._audio_q.get(timeout=0.5)
-            except queue.Empty:
+            item = self._ring.read(self.cfg.block_size, timeout=0.5)
+            if item is None:
                 # таймаут командного окна
                 self._check_timeout()
                 continue
 
-            if self._rec.AcceptWaveform(data):
-                result = self._try_parse(self._rec.Result())
-                if result:
-                    self._handle_text(result)
-            else:
-                partial = self._try_parse(self._rec.PartialResult(), partial=True)
-                if partial:
-                    self._handle_partial(partial)
+            self._block_ts, data = item
+            t0 = time.perf_counter()
+            self._process_block(data)
+            self._proc_wall += time.perf_counter() - t0
+            self._proc_audio += len(data) / 2 / SAMPLE_RATE
+            if self._ring.overflows != self._reported_overflows:
+                self._reported_overflows = self._ring.overflows
+                self.on_status(f"распознавание не успевает: потеряно "
+                               f"{self._ring.dropped_samples / SAMPLE_RATE:.1f} с аудио")
+
+    def _make_recognizers(self):
+        self._rec = KaldiRecognizer(self._model, SAMPLE_RATE)
+        self._setup_rec(self._rec)
+        self._wake_rec = None
+        if self.cfg.two_stage:
+            grammar = json.dumps(list(self.cfg.wake_words) + [UNK], ensure_ascii=False)
+            self._wake_rec = KaldiRecognizer(self._model, SAMPLE_RATE, grammar)
+            self._setup_rec(self._wake_rec)
+        self._vad = None
+        if self.cfg.vad_enabled:
+            self._vad = VadGate(SAMPLE_RATE, self.cfg.block_size, self.cfg.vad_min_rms,
+                                self.cfg.vad_hangover_sec, self.cfg.vad_preroll_sec)
+
+    def _setup_rec(self, rec: KaldiRecognizer):
+        rec.SetWords(False)
+        if hasattr(rec, "SetEndpointerDelays"):  # старые vosk — дефолтный эндпоинтер
+            rec.SetEndpointerDelays(self.cfg.endpoint_start_max_sec, self.cfg.endpoint_end_sec,
+                                    self.cfg.endpoint_max_sec)
 
-            self._check_timeout()
+    def _active_rec(self) -> KaldiRecognizer:
+        if self._wake_rec is not None and not self._awaiting_command:
+            return self._wake_rec
+        return self._rec
+
+    def _process_block(self, data: bytes):
+        blocks = self._vad.process(data) if self._vad is not None else [data]
+        for block in blocks:
+            self._recognize(block)
+        self._check_timeout()
+
+    def _recognize(self, data: bytes):
+        was_awaiting = self._awaiting_command
+        self._decode(data)
+        if self._wake_rec is not None and self._awaiting_command and not was_awaiting:
+            # ключевое слово в этом блоке: тот же блок — в полный распознаватель,
+            # чтобы не потерять начало команды («джарвис, какая погода»)
+            self._rec.Reset()
+            self._decode(data)
+
+    def _decode(self, data: bytes):
+        rec = self._active_rec()
+        mode = "command" if self._awaiting_command else "idle"
+        t0 = time.thread_time()
+        if rec.AcceptWaveform(data):
+            result = self._try_parse(rec.Result())
+            if result:
+                self._handle_text(result)
+            self._wake_in_utterance = False  # фраза закрыта — следующий partial уже новая фраза
+            self._speaking = False
+            self._last_partial = ""
+        else:
+            partial = self._try_parse(rec.PartialResult(), partial=True)
+            if partial:
+                self._handle_partial(partial)
+        acc = self._cpu[mode]
+        acc[0] += time.thread_time() - t0
+        acc[1] += len(data) / 2 / SAMPLE_RATE
+
+    def _now(self) -> float:
+        return self._audio_time if self._offline else time.time()
+
+    def _speech_ts(self) -> float:
+        """Момент захвата текущего блока в тех же часах, что и _now()."""
+        return self._audio_time if self._offline else self._block_ts
 
     def _try_parse(self, s: str, partial: bool = False) -> Optional[str]:
         try:
@@ -115,38 +311,83 @@ class VoiceAgent:
         except Exception:
             return None
 
+    def _has_wake(self, txt: str) -> bool:
+        return any(w in txt for w in self.cfg.wake_words)
+
+    def _wake(self, source: str):
+        """Ключевое слово найдено: командное окно открывается с этого момента."""
+        self._awaiting_command = True
+        self._last_wake_ts = self._now()
+        self._buffered_text = ""
+        self.last_wake_source = source
+        self._wake_latencies.append(time.time() - self._block_ts)
+        try:
+            self.on_wake()
+        except Exception:
+            pass
+        self.on_status(f"ключевое слово! говори команду… ({self._wake_latencies[-1] * 1000:.0f} мс, {source})")
+
+    @staticmethod
+    def _drop_unk(txt: str) -> str:
+        """Токен [unk] грамматики ключевых слов — не речь: ни в команду, ни в признак «говорят»."""
+        return " ".join(w for w in (txt or "").split() if w != UNK)
+
     def _handle_partial(self, txt: str):
-        # можно подсвечивать статус
-        pass
+        txt = self._drop_unk(txt)
+        # ключевое слово видно задолго до конца фразы — не ждём тишины финализации
+        if not self._awaiting_command and not self._wake_in_utterance and self._has_wake(txt):
+            self._wake_in_utterance = True
+            self._wake("partial")
+        elif self._awaiting_command and txt != self._last_partial and self._strip_wake(txt):
+            # в командном окне говорят — отодвигаем конец команды
+            self._speaking = True
+            self._last_speech_ts = self._speech_ts()
+        self._last_partial = txt
 
     def _handle_text(self, txt: str):
+        txt = self._drop_unk(txt)
         if not txt:
             return
         # если ждали ключевое слово
         if not self._awaiting_command:
-            if any(w in txt for w in self.cfg.wake_words):
-                try:
-                    self.on_wake()                                # <--- добавили
-                except Exception:
-                    pass
-                self._awaiting_command = True
-                self._last_wake_ts = time.time()
-                self._buffered_text = ""
-                self.on_status("ключевое слово! говори команду…")
+            if not self._has_wake(txt):
+                return
+            self._wake("final")
+        # финал фразы, что уже разбудила на partial, повторно не будит (окно идёт с partial);
+        # текст после ключевого слова («джарвис, какая погода») — уже команда
+        txt = self._strip_wake(txt)
+        if not txt:
             return
 
         # тут мы уже в режиме ожидания команды
-        self._buffered_text += (" " + txt).strip()
-
-        # команда готова — отдать сразу
-        if self._buffered_text:
-            cmd = self._strip_wake(self._buffered_text).strip()
-            if cmd:
-                self.on_command(cmd)
-            self._awaiting_command = False
-            self._buffered_text = ""
-            self.on_status("слушаю (ожидаю «джарвис»)")
-            self._last_wake_ts = 0.0
+        self._buffered_text = f"{self._buffered_text} {txt}".strip()
+        if not self._last_speech_ts:
+            # конец речи отмечают partial-ы; финал приходит уже после endpoint_end_sec тишины,
+            # и отсчёт паузы от него удвоил бы ожидание
+            self._last_speech_ts = self._speech_ts()
+
+        # без сборки — команда готова сразу; со сборкой — ждём паузу (_check_timeout)
+        if not self.cfg.command_assembly:
+            self._dispatch_command()
+
+    def _dispatch_command(self):
+        cmd = self._strip_wake(self._buffered_text).strip()
+        if cmd:
+            self._eos_gaps.append(max(0.0, self._now() - self._last_speech_ts))
+            self.on_command(cmd)
+        self._reset_command_window()
+        self.on_status("слушаю (ожидаю «джарвис»)")
+
+    def _reset_command_window(self):
+        self._awaiting_command = False
+        self._buffered_text = ""
+        self._last_wake_ts = 0.0
+        self._last_speech_ts = 0.0
+        self._speaking = False
+        if self._wake_rec is not None:
+            # назад к поиску ключевого слова с чистого листа
+            self._wake_rec.Reset()
+            self._wake_in_utterance = False
 
     def _strip_wake(self, s: str) -> str:
         out = s
@@ -155,9 +396,18 @@ class VoiceAgent:
         return out.strip()
 
     def _check_timeout(self):
-        if self._awaiting_command and (time.time() - self._last_wake_ts > COMMAND_TIMEOUT):
+        if not self._awaiting_command:
+            return
+        now = self._now()
+        # собранная команда: после последней фразы выдержана пауза, новой фразы не начато
+        if self._buffered_text and not self._speaking and now - self._last_speech_ts >= self.cfg.command_silence_sec:
+            self._dispatch_command()
+            return
+        # окно отсчитывается от ключевого слова или последней речи в нём
+        if now - max(self._last_wake_ts, self._last_speech_ts) > self.cfg.command_timeout:
+            if self._buffered_text:
+                self._dispatch_command()
+                return
             # не дождались команды
-            self._awaiting_command = False
-            self._buffered_text = ""
-            self._last_wake_ts = 0.0
+            self._reset_command_window()
             self.on_status("таймаут команды — слушаю (ожидаю «джарвис»)")
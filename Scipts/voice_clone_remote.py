@@ -1,14 +1,34 @@
 # Scipts/voice_clone_remote.py
 from __future__ import annotations
 import os
-import hashlib
 import tempfile
+from typing import Dict, Optional
+
 import requests
-from typing import Optional
+
+from Scipts import http_pool, wav_stream
+from Scipts.tts_cache import AudioCache, make_key
+from Scipts.voice_registry import VoiceRegistry
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 # Адрес твоего TTS-сервера
 TTS_BASE_URL = os.getenv("TTS_BASE_URL", "http://192.168.100.8:8001")
 DEFAULT_VOICE_ID = os.getenv("TTS_VOICE_ID", "jarvis")
+# какие голоса уже загружены на сервер — чтобы не слать образец на каждой реплике
+VOICE_REGISTRY_PATH = os.getenv(
+    "TTS_VOICE_REGISTRY",
+    os.path.join(_ROOT, "jarvis_voice_registry.json"),
+)
+_registry: Optional[VoiceRegistry] = None
+# "сервер|voice_id" -> sha1 образца, под которым голос сейчас загружен (входит в ключ кэша)
+_voice_samples: Dict[str, str] = {}
+# готовые WAV повторяющихся фраз (приветствия, подтверждения); пустая папка — без кэша
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(_ROOT, "tts_cache"))
+TTS_CACHE_MAX_BYTES = int(float(os.getenv("TTS_CACHE_MAX_MB", "200")) * 1024 * 1024)
+_cache: Optional[AudioCache] = None
+# запасной путь проигрывания через временный файл и play_mp3 (если потоковый вывод не работает)
+TTS_TEMP_FILE_FALLBACK = os.getenv("TTS_TEMP_FILE_FALLBACK", "") == "1"
 
 # Опционально: импорт твоей функции проигрывания
 try:
@@ -17,44 +37,183 @@ except Exception:
     play_mp3 = None  # если нет — просто вернём путь к файлу
 
 
-def _hash_file(path: str) -> str:
-    h = hashlib.sha1()
-    with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(8192), b""):
-            h.update(chunk)
-    return h.hexdigest()[:12]
+def get_registry() -> VoiceRegistry:
+    global _registry
+    if _registry is None:
+        _registry = VoiceRegistry(VOICE_REGISTRY_PATH)
+    return _registry
+
+
+def configure_registry(path: str) -> None:
+    """Сменить файл реестра голосов (пустой путь — только в памяти, на диск не пишется)."""
+    global VOICE_REGISTRY_PATH, _registry
+    VOICE_REGISTRY_PATH = path
+    _registry = None
+
+
+def configure_cache(directory: str, max_bytes: Optional[int] = None) -> None:
+    """Сменить папку/лимит кэша TTS (пустая папка — выключить)."""
+    global TTS_CACHE_DIR, TTS_CACHE_MAX_BYTES, _cache
+    TTS_CACHE_DIR = directory
+    if max_bytes is not None:
+        TTS_CACHE_MAX_BYTES = max_bytes
+    _cache = None
+
+
+def get_cache() -> Optional[AudioCache]:
+    global _cache
+    if _cache is None and TTS_CACHE_DIR:
+        try:
+            _cache = AudioCache(TTS_CACHE_DIR, TTS_CACHE_MAX_BYTES)
+        except OSError:
+            return None
+    return _cache
+
+
+def cache_stats() -> dict:
+    cache = get_cache()
+    return cache.stats() if cache else {}
+
+
+def _cache_key(data: dict) -> str:
+    sample = _voice_samples.get(f"{TTS_BASE_URL}|{data['voice_id']}", "")
+    return make_key(data["text"], data["voice_id"], data["language"], data["speed"], data["sample_rate"],
+                    data["pause_ms"], data["naturalize"], data["temperature"], data["top_p"], sample)
+
+
+def _is_unknown_voice(err: Exception) -> bool:
+    """Сервер не знает voice_id (перезапустился, почистил голоса)."""
+    resp = getattr(err, "response", None)
+    if resp is None or resp.status_code not in (400, 404, 422):
+        return False
+    return resp.status_code == 404 or "voice" in (resp.text or "").lower()
 
 
-def ensure_voice_cloned(sample_path: str, voice_id: Optional[str] = None, timeout: int = 60) -> str:
+def ensure_voice_cloned(
+    sample_path: str,
+    voice_id: Optional[str] = None,
+    timeout: Optional[float] = None,
+    force: bool = False,
+) -> str:
     """
     Гарантирует, что голос загружен на сервере под voice_id.
     Если voice_id не задан — делаем стабильный из хэша файла (чтобы не плодить дубликаты).
+    Неизменённый образец, уже загруженный на этот сервер, повторно не отправляется (force — отправить).
     """
-    voice_id = voice_id or f"v_{_hash_file(sample_path)}"
+    registry = get_registry()
+    fp = registry.fingerprint(sample_path)
+    voice_id = voice_id or f"v_{fp.sha1[:12]}"
+    # сменили образец под тем же voice_id — фразы старым голосом в кэше больше не совпадут
+    _voice_samples[f"{TTS_BASE_URL}|{voice_id}"] = fp.sha1
+    if not force and registry.is_registered(TTS_BASE_URL, voice_id, fp):
+        return voice_id
     url = f"{TTS_BASE_URL}/v1/clone"
     mime = "audio/wav" if sample_path.lower().endswith(".wav") else "audio/mpeg"
     with open(sample_path, "rb") as f:
         files = {"ref_audio": (os.path.basename(sample_path), f, mime)}
         data = {"voice_id": voice_id}
-        r = requests.post(url, files=files, data=data, timeout=timeout)
+        r = http_pool.get_session("tts").post(
+            url, files=files, data=data, timeout=http_pool.timeout_for("tts.clone", 60, timeout)
+        )
     r.raise_for_status()
+    registry.mark_registered(TTS_BASE_URL, voice_id, fp)
     return voice_id
 
 
-def tts_to_wav_file(
+def tts_to_wav_bytes(
     text: str,
     voice_id: str | None = None,
     language: str = "ru",
     speed: float = 0.88,
     sample_rate: int = 0,
-    pause_ms: int = 180,         # НОВОЕ
-    naturalize: int = 1,         # НОВОЕ
-    temperature: float = 0.8,    # НОВОЕ
-    top_p: float = 0.9,          # НОВОЕ
-    timeout: int = 120,
-) -> str:
+    pause_ms: int = 180,
+    naturalize: int = 1,
+    temperature: float = 0.8,
+    top_p: float = 0.9,
+    timeout: Optional[float] = None,
+) -> bytes:
+    """WAV в памяти (короткие куски для конвейера озвучки, запасной путь через файл); с кэшем."""
+    url = f"{TTS_BASE_URL}/v1/tts"
+    data = _tts_form(text, voice_id, language, speed, sample_rate, pause_ms, naturalize, temperature, top_p)
+    cache = get_cache()
+    if cache is None:
+        return _post_tts(url, data, timeout)
+    key = _cache_key(data)
+    wav = cache.get_bytes(key)
+    if wav is None:
+        wav = _post_tts(url, data, timeout)
+        cache.put(key, wav)
+    return wav
+
+
+def tts_play_stream(
+    text: str,
+    voice_id: str | None = None,
+    language: str = "ru",
+    speed: float = 0.88,
+    sample_rate: int = 0,
+    pause_ms: int = 180,
+    naturalize: int = 1,
+    temperature: float = 0.8,
+    top_p: float = 0.9,
+    timeout: Optional[float] = None,
+    jitter_ms: int = wav_stream.JITTER_MS,
+    stats: Optional[dict] = None,
+) -> dict:
+    """
+    Синтез и воспроизведение без файлов: PCM из ответа сразу в устройство (см. wav_stream),
+    попутно байты складываются в кэш. Повтор из кэша играется из памяти. Блокирует до конца звука.
+    stats — словарь, который заполняется по ходу (при исключении видно, звучало ли что-то).
+    """
     url = f"{TTS_BASE_URL}/v1/tts"
-    data = {
+    data = _tts_form(text, voice_id, language, speed, sample_rate, pause_ms, naturalize, temperature, top_p)
+    cache = get_cache()
+    key = _cache_key(data) if cache is not None else ""
+    wav = cache.get_bytes(key) if cache is not None else None
+    if wav is not None:
+        stats = wav_stream.play_wav_stream([wav], jitter_ms, stats)
+        stats["cache"] = "hit"
+        return stats
+    body = []
+    session = http_pool.get_session("tts")
+    with session.post(url, data=data, stream=True, timeout=http_pool.timeout_for("tts.tts", 120, timeout)) as r:
+        r.raise_for_status()
+
+        def chunks():
+            for chunk in r.iter_content(chunk_size=4096):
+                if chunk:
+                    body.append(chunk)
+                    yield chunk
+
+        stats = wav_stream.play_wav_stream(chunks(), jitter_ms, stats)
+    if cache is not None:
+        cache.put(key, b"".join(body))
+    stats["cache"] = "miss" if cache is not None else "off"
+    return stats
+
+
+def _play_via_temp_file(wav: bytes) -> str:
+    """Запасной путь: временный WAV для play_mp3, удаляется в любом случае."""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp:
+        tmp.write(wav)
+    try:
+        return play_mp3(tmp.name)
+    finally:
+        try:
+            os.remove(tmp.name)
+        except OSError:
+            pass
+
+
+def _post_tts(url: str, data: dict, timeout: Optional[float]) -> bytes:
+    session = http_pool.get_session("tts")
+    r = session.post(url, data=data, timeout=http_pool.timeout_for("tts.tts", 120, timeout))
+    r.raise_for_status()
+    return r.content
+
+
+def _tts_form(text, voice_id, language, speed, sample_rate, pause_ms, naturalize, temperature, top_p) -> dict:
+    return {
         "text": text,
         "voice_id": voice_id or DEFAULT_VOICE_ID,
         "language": language,
@@ -65,15 +224,22 @@ def tts_to_wav_file(
         "temperature": str(temperature),
         "top_p": str(top_p),
     }
-    with requests.post(url, data=data, stream=True, timeout=timeout) as r:
-        r.raise_for_status()
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp:
-            for chunk in r.iter_content(chunk_size=8192):
-                if chunk:
-                    tmp.write(chunk)
-            return tmp.name
 
 
+def synth_with_reclone(synth, sample_path: str, voice_id: str, **kwargs):
+    """
+    synth(voice_id=..., **kwargs); если сервер не знает голос (реестр думал иначе) —
+    регистрируем образец заново и повторяем один раз.
+    """
+    try:
+        return synth(voice_id=voice_id, **kwargs)
+    except requests.HTTPError as e:
+        if not _is_unknown_voice(e):
+            raise
+        get_registry().forget(TTS_BASE_URL, voice_id)
+        ensure_voice_cloned(sample_path, voice_id=voice_id, force=True)
+        return synth(voice_id=voice_id, **kwargs)
+
 
 def speak_clone_remote(
     text: str,
@@ -100,25 +266,39 @@ def speak_clone_remote(
     except Exception as e:
         return f"Ошибка /v1/clone: {e}"
 
+    tts_args = dict(
+        text=text,
+        language=lang,
+        speed=speed,
+        sample_rate=sample_rate,
+        pause_ms=pause_ms,             # пробрасываем на сервер
+        naturalize=naturalize,
+        temperature=temperature,
+        top_p=top_p,
+    )
+    if not do_play:
+        try:
+            wav = synth_with_reclone(tts_to_wav_bytes, sample_path, vid, **tts_args)
+        except Exception as e:
+            return f"Ошибка /v1/tts: {e}"
+        return f"Синтез ок: {len(wav)} байт"
+
+    progress: dict = {}
     try:
-        wav_path = tts_to_wav_file(
-            text=text,
-            voice_id=vid,
-            language=lang,
-            speed=speed,
-            sample_rate=sample_rate,
-            pause_ms=pause_ms,             # пробрасываем на сервер
-            naturalize=naturalize,
-            temperature=temperature,
-            top_p=top_p,
-        )
-    except Exception as e:
+        stats = synth_with_reclone(tts_play_stream, sample_path, vid, stats=progress, **tts_args)
+    except requests.RequestException as e:
         return f"Ошибка /v1/tts: {e}"
-
-    if do_play and play_mp3:
+    except Exception as e:
+        # фраза уже начала звучать — повтор целиком через файл был бы вторым проигрыванием
+        if not (TTS_TEMP_FILE_FALLBACK and play_mp3) or progress.get("first_audio_sec") is not None:
+            return f"Ошибка проигрывания: {e}"
         try:
-            return play_mp3(wav_path)  # твой плеер
-        except Exception as e:
-            return f"Синтез ок, но ошибка проигрывания: {e}\nФайл: {wav_path}"
-    else:
-        return f"Синтез ок: {wav_path}"
+            return _play_via_temp_file(synth_with_reclone(tts_to_wav_bytes, sample_path, vid, **tts_args))
+        except Exception as e2:
+            return f"Ошибка проигрывания: {e}; запасной путь: {e2}"
+    msg = f"Синтез ок: {stats['duration_sec']:.1f} с, первый звук через {stats['first_audio_sec'] or 0:.2f} с"
+    if stats.get("cache") == "hit":
+        msg += " (из кэша)"
+    if stats["underflows"]:
+        msg += f", разрывов: {stats['underflows']}"
+    return msg
@@ -0,0 +1,241 @@
+# Scipts/voice_process.py
+"""
+Распознавание речи в отдельном процессе.
+
+Родитель держит микрофон и кольцевой буфер, блоки PCM уходят в дочерний процесс по pipe;
+там обычный VoiceAgent в режиме feed() и своя модель Vosk. Обратно приходят события
+(status / wake / command / metrics), которые родитель вызывает теми же колбэками,
+что и у VoiceAgent. wake и command несут свежие метрики: колбэк родителя, читающий
+metrics(), видит задержку именно этого срабатывания, а не периодический снимок. Падение дочернего процесса не роняет GUI: процесс перезапускается.
+"""
+from __future__ import annotations
+import multiprocessing as mp
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import sounddevice as sd
+
+from Scipts.audio_ring import AudioRing
+from Scipts.voice_agent import SAMPLE_RATE, VoiceConfig
+
+MAX_RESTARTS = 3          # подряд: падения раньше MIN_UPTIME_SEC после старта не обнуляют счётчик
+MIN_UPTIME_SEC = 30.0     # столько проработал — считаем процесс здоровым
+RESTART_DELAY_SEC = 1.0
+SHUTDOWN_SEND_SEC = 1.0   # сколько ждать занятый pipe перед отправкой None
+METRICS_PERIOD_SEC = 1.0
+
+
+def _worker_main(cfg: VoiceConfig, audio_conn, event_conn) -> None:
+    """Точка входа дочернего процесса (модульная функция — нужна для spawn на Windows)."""
+    from Scipts.voice_agent import VoiceAgent
+
+    send = event_conn.send
+    agent = VoiceAgent(
+        cfg,
+        on_status=lambda s: send(("status", s)),
+        on_command=lambda t: send(("command", (t, agent.metrics()))),
+        on_wake=lambda: send(("wake", agent.metrics())),
+    )
+    t0 = time.time()
+    try:
+        agent.start_offline()
+    except Exception as e:
+        send(("error", str(e) or type(e).__name__))
+        return
+    send(("ready", time.time() - t0))
+
+    last_metrics = time.time()
+    while True:
+        try:
+            msg = audio_conn.recv()
+        except (EOFError, OSError):
+            break
+        except Exception as e:  # UnpicklingError и прочие ошибки разбора: блок теряем, pipe цел
+            send(("error", f"битый блок аудио: {e}"))
+            continue
+        if msg is None:
+            break
+        captured_at, data = msg
+        agent.feed(data, captured_at=captured_at)
+        if time.time() - last_metrics >= METRICS_PERIOD_SEC:
+            last_metrics = time.time()
+            send(("metrics", agent.metrics()))
+
+
+class ProcessVoiceAgent:
+    """Тот же контракт, что у VoiceAgent (start/stop/metrics, on_status/on_command/on_wake/on_error)."""
+
+    def __init__(self, cfg: VoiceConfig, on_status: Optional[Callable[[str], None]] = None,
+                 on_command: Optional[Callable[[str], None]] = None,
+                 on_wake: Optional[Callable[[], None]] = None,
+                 on_error: Optional[Callable[[str], None]] = None):
+        self.cfg = cfg
+        self.on_status = on_status or (lambda s: None)
+        self.on_command = on_command or (lambda t: None)
+        self.on_wake = on_wake or (lambda: None)
+        self.on_error = on_error or (lambda e: None)
+
+        self._ctx = mp.get_context("spawn")  # одинаково на Windows и Linux, без форка Tk
+        self._ring = AudioRing(cfg.audio_buffer_sec, SAMPLE_RATE)
+        self._stream: Optional[sd.InputStream] = None
+        self._proc = None
+        self._audio_w = None
+        self._events_r = None
+        self._running = False
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()  # send() в audio pipe — из _feed_loop и _shutdown_child
+        self._child_metrics: Dict[str, Any] = {}
+        self.restarts = 0
+        self.worker_load_sec: Optional[float] = None
+
+    # ---------- Публичное ----------
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self.on_status("инициализация (отдельный процесс)…")
+        try:
+            self._spawn()
+            self._stream = sd.InputStream(
+                samplerate=SAMPLE_RATE,
+                channels=1,
+                dtype="int16",
+                blocksize=self.cfg.block_size,
+                callback=self._audio_callback,
+            )
+            self._stream.start()
+        except Exception as e:
+            self.stop()
+            self.on_status(f"ошибка запуска: {e}")
+            self.on_error(str(e))
+            return
+        threading.Thread(target=self._feed_loop, daemon=True).start()
+
+    def stop(self):
+        self._running = False
+        try:
+            if self._stream:
+                self._stream.stop()
+                self._stream.close()
+        finally:
+            self._stream = None
+        self._shutdown_child()
+        self.on_status("голос остановлен")
+
+    def metrics(self) -> Dict[str, Any]:
+        """Метрики распознавателя из дочернего процесса + очередь и перезапуски на стороне родителя."""
+        out = dict(self._child_metrics)
+        out.update(
+            queue_lag_sec=self._ring.lag_sec(),
+            overflows=self._ring.overflows,
+            dropped_sec=self._ring.dropped_samples / SAMPLE_RATE,
+            restarts=self.restarts,
+            worker_load_sec=self.worker_load_sec,
+        )
+        return out
+
+    # ---------- Дочерний процесс ----------
+    def _spawn(self):
+        audio_r, audio_w = self._ctx.Pipe(duplex=False)
+        events_r, events_w = self._ctx.Pipe(duplex=False)
+        proc = self._ctx.Process(target=_worker_main, args=(self.cfg, audio_r, events_w),
+                                 daemon=True, name="jarvis-asr")
+        proc.start()
+        audio_r.close()   # у родителя остаются только свои концы:
+        events_w.close()  # EOF на events_r = дочерний процесс умер
+        with self._lock:
+            self._proc, self._audio_w, self._events_r = proc, audio_w, events_r
+        threading.Thread(target=self._event_loop, args=(proc, events_r), daemon=True).start()
+
+    def _shutdown_child(self):
+        with self._lock:
+            proc, audio_w = self._proc, self._audio_w
+            self._proc = self._audio_w = None
+        if audio_w is not None:
+            # _feed_loop может быть посреди send(): кадры двух send() в pipe перемешаются
+            locked = self._send_lock.acquire(timeout=SHUTDOWN_SEND_SEC)
+            try:
+                if locked:
+                    audio_w.send(None)
+                audio_w.close()  # не дождались — процесс завершим ниже через terminate()
+            except Exception:
+                pass
+            finally:
+                if locked:
+                    self._send_lock.release()
+        if proc is not None:
+            proc.join(2.0)
+            if proc.is_alive():
+                proc.terminate()
+
+    def _event_loop(self, proc, events_r):
+        ready_at: Optional[float] = None
+        while True:
+            try:
+                kind, payload = events_r.recv()
+            except (EOFError, OSError):
+                break
+            if kind == "status":
+                self.on_status(payload)
+            elif kind == "wake":
+                self._child_metrics = payload  # до колбэка: on_wake читает задержку из metrics()
+                self.on_wake()
+            elif kind == "command":
+                text, self._child_metrics = payload
+                self.on_command(text)
+            elif kind == "metrics":
+                self._child_metrics = payload
+            elif kind == "ready":
+                ready_at = time.time()
+                self.worker_load_sec = payload
+                self.on_status(f"слушаю (ожидаю «джарвис»), модель {payload:.1f} с")
+            elif kind == "error":
+                if ready_at is not None:  # процесс работает дальше (битый блок) — on_error остановил бы голос
+                    self.on_status(f"ошибка распознавания: {payload}")
+                    continue
+                self._running = False
+                self.on_status(f"ошибка запуска: {payload}")
+                self.on_error(payload)
+        events_r.close()
+        proc.join(1.0)
+        with self._lock:
+            current = proc is self._proc
+        if not (self._running and current):
+            return  # штатная остановка
+        # процесс упал посреди работы — GUI жив, поднимаем заново
+        if ready_at is not None and time.time() - ready_at >= MIN_UPTIME_SEC:
+            self.restarts = 0  # долго работал — это не цепочка падений подряд
+        self.restarts += 1
+        if self.restarts > MAX_RESTARTS:
+            self._running = False
+            msg = f"процесс распознавания падает (код {proc.exitcode})"
+            self.on_status(msg)
+            self.on_error(msg)
+            return
+        self.on_status(f"процесс распознавания упал (код {proc.exitcode}) — перезапуск…")
+        time.sleep(RESTART_DELAY_SEC)
+        if self._running:
+            self._spawn()
+
+    # ---------- Аудио ----------
+    def _audio_callback(self, indata, frames, time_info, status):
+        if status:
+            self.on_status(f"аудио статус: {status}")
+        self._ring.write(indata[:, 0])
+
+    def _feed_loop(self):
+        self._ring.clear()
+        while self._running:
+            item = self._ring.read(self.cfg.block_size, timeout=0.5)
+            if item is None:
+                continue
+            with self._lock:
+                audio_w = self._audio_w
+            if audio_w is None:
+                continue
+            try:
+                with self._send_lock:
+                    audio_w.send(item)  # блокируется, если процесс не успевает, — тогда копится кольцо
+            except (BrokenPipeError, OSError, ValueError):
+                pass  # процесс перезапускается; блок теряем
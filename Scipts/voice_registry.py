@@ -0,0 +1,103 @@
+# Scipts/voice_registry.py
+from __future__ import annotations
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict
+
+
+@dataclass
+class SampleFingerprint:
+    path: str
+    size: int
+    mtime: float
+    sha1: str
+
+
+class VoiceRegistry:
+    """
+    Какие голоса уже загружены на TTS-сервер, по образцу (путь, размер, mtime, хэш).
+    Пока файл образца не менялся, хэш не пересчитывается и /v1/clone не вызывается.
+    Хранится в JSON, пишется атомарно (tmp + os.replace).
+    """
+
+    def __init__(self, path: str = ""):
+        self.path = path
+        self._samples: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        if path:
+            self._load()
+
+    def fingerprint(self, sample_path: str) -> SampleFingerprint:
+        key = os.path.abspath(sample_path)
+        st = os.stat(key)
+        with self._lock:
+            rec = self._samples.get(key)
+            if rec and rec["size"] == st.st_size and rec["mtime"] == st.st_mtime:
+                return SampleFingerprint(key, st.st_size, st.st_mtime, rec["sha1"])
+        sha1 = _hash_file(key)
+        with self._lock:
+            rec = self._samples.get(key)
+            if not rec or rec["sha1"] != sha1:
+                rec = {"voices": {}}  # другой звук — прежние регистрации не в счёт
+            rec.update(size=st.st_size, mtime=st.st_mtime, sha1=sha1)
+            self._samples[key] = rec
+        self._save()
+        return SampleFingerprint(key, st.st_size, st.st_mtime, sha1)
+
+    def is_registered(self, server: str, voice_id: str, fp: SampleFingerprint) -> bool:
+        with self._lock:
+            rec = self._samples.get(fp.path)
+            return bool(rec and rec["sha1"] == fp.sha1 and f"{server}|{voice_id}" in rec["voices"])
+
+    def mark_registered(self, server: str, voice_id: str, fp: SampleFingerprint) -> None:
+        with self._lock:
+            rec = self._samples.setdefault(fp.path, {"voices": {}})
+            rec.update(size=fp.size, mtime=fp.mtime, sha1=fp.sha1)
+            rec["voices"][f"{server}|{voice_id}"] = time.time()
+        self._save()
+
+    def forget(self, server: str, voice_id: str) -> None:
+        """Сервер голос не знает (перезапуск, чистка) — при следующем синтезе загрузим заново."""
+        key = f"{server}|{voice_id}"
+        with self._lock:
+            for rec in self._samples.values():
+                rec["voices"].pop(key, None)
+        self._save()
+
+    # ---------- Диск ----------
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                self._samples = {k: v for k, v in data.items()
+                                 if isinstance(v, dict) and "sha1" in v and isinstance(v.get("voices"), dict)}
+        except (OSError, ValueError):
+            pass
+
+    def _save(self) -> None:
+        if not self.path:
+            return
+        with self._save_lock:
+            with self._lock:
+                snapshot = json.dumps(self._samples, ensure_ascii=False)
+            tmp = f"{self.path}.tmp"
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.write(snapshot)
+                os.replace(tmp, self.path)
+            except OSError:
+                pass
+
+
+def _hash_file(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
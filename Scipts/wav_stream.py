@@ -0,0 +1,132 @@
+# Scipts/wav_stream.py
+"""
+Воспроизведение WAV прямо из HTTP-потока, без временных файлов: заголовок разбирается
+по мере прихода байтов, PCM идёт в устройство, как только накопился небольшой
+джиттер-буфер (сеть неравномерна — без запаса звук рвётся на первых же задержках).
+"""
+from __future__ import annotations
+import struct
+import time
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+
+# ==== базовые настройки ====
+JITTER_MS = 150             # сколько звука накопить перед стартом устройства
+MAX_HEADER_BYTES = 64 * 1024  # заголовок длиннее — это не WAV (или битый поток)
+
+_PCM = 1
+_EXTENSIBLE = 0xFFFE
+
+
+class WavStreamParser:
+    """
+    feed(байты) -> PCM-байты (целыми кадрами). До чанка "data" копит заголовок;
+    размер data не проверяется — стримящие серверы пишут туда 0 или 0xFFFFFFFF.
+    """
+
+    def __init__(self):
+        self._buf = b""
+        self._carry = b""           # неполный кадр с прошлого куска
+        self.ready = False          # заголовок разобран
+        self.sample_rate = 0
+        self.channels = 0
+        self.frame_bytes = 0
+
+    def feed(self, data: bytes) -> bytes:
+        if not self.ready:
+            self._buf += data
+            if not self._parse_header():
+                if len(self._buf) > MAX_HEADER_BYTES:
+                    raise ValueError("не найден чанк data в WAV")
+                return b""
+            data, self._buf = self._buf, b""
+        data = self._carry + data
+        cut = len(data) - len(data) % self.frame_bytes
+        self._carry = data[cut:]
+        return data[:cut]
+
+    def _parse_header(self) -> bool:
+        buf = self._buf
+        if len(buf) < 12:
+            return False
+        if buf[:4] != b"RIFF" or buf[8:12] != b"WAVE":
+            raise ValueError("ответ TTS — не WAV")
+        pos = 12
+        while len(buf) >= pos + 8:
+            cid, size = buf[pos:pos + 4], struct.unpack("<I", buf[pos + 4:pos + 8])[0]
+            body = pos + 8
+            if cid == b"data":
+                if not self.frame_bytes:
+                    raise ValueError("в WAV нет чанка fmt перед data")
+                self._buf = buf[body:]
+                self.ready = True
+                return True
+            if len(buf) < body + size:
+                return False  # чанк ещё не пришёл целиком
+            if cid == b"fmt ":
+                fmt, channels, rate, _br, _align, bits = struct.unpack("<HHIIHH", buf[body:body + 16])
+                if fmt not in (_PCM, _EXTENSIBLE) or bits != 16:
+                    raise ValueError(f"нужен 16-битный PCM, пришёл формат {fmt}/{bits} бит")
+                self.sample_rate, self.channels, self.frame_bytes = rate, channels, 2 * channels
+            pos = body + size + (size & 1)  # чанки выровнены по 2 байта
+        return False
+
+
+def play_wav_stream(chunks: Iterable[bytes], jitter_ms: int = JITTER_MS,
+                    stats: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Играет WAV из итератора кусков (iter_content ответа или [bytes] из кэша); блокирует до конца.
+    Возвращает статистику: first_audio_sec (от вызова), duration_sec, underflows.
+    stats — свой словарь: заполняется по ходу, так что после исключения видно, что успело прозвучать.
+    """
+    import sounddevice as sd  # ленивый импорт: модуль нужен и там, где нет звуковой карты
+
+    t0 = time.time()
+    parser = WavStreamParser()
+    pending = []
+    pending_bytes = 0
+    stream: Optional[sd.OutputStream] = None
+    if stats is None:
+        stats = {}
+    stats.update(first_audio_sec=None, duration_sec=0.0, underflows=0)
+
+    def write(pcm: bytes) -> None:
+        frames = np.frombuffer(pcm, dtype=np.int16).reshape(-1, parser.channels)
+        if stream.write(frames):  # True — устройство успело опустошиться (слышимый разрыв)
+            stats["underflows"] += 1
+        stats["duration_sec"] += len(frames) / parser.sample_rate
+
+    try:
+        for chunk in chunks:
+            pcm = parser.feed(chunk)
+            if not pcm:
+                continue
+            if stream is None:
+                pending.append(pcm)
+                pending_bytes += len(pcm)
+                if pending_bytes < parser.sample_rate * parser.frame_bytes * jitter_ms // 1000:
+                    continue
+                stream = _open(sd, parser)
+                stats["first_audio_sec"] = time.time() - t0
+                pcm, pending = b"".join(pending), []
+            write(pcm)
+        if not parser.ready:
+            raise ValueError("пустой или обрезанный WAV")
+        if stream is None and pending:  # короткая фраза целиком меньше джиттер-буфера
+            stream = _open(sd, parser)
+            stats["first_audio_sec"] = time.time() - t0
+            write(b"".join(pending))
+        if stream is not None:
+            stream.stop()  # дождаться, пока доиграет буфер устройства
+    finally:
+        if stream is not None:
+            stream.close()
+    stats["sample_rate"] = parser.sample_rate
+    return stats
+
+
+def _open(sd, parser: WavStreamParser):
+    stream = sd.OutputStream(samplerate=parser.sample_rate, channels=parser.channels, dtype="int16")
+    stream.start()
+    return stream
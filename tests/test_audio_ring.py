@@ -0,0 +1,56 @@
+# tests/test_audio_ring.py
+"""AudioRing: чтение, переполнение и запись, начавшаяся посреди копирования читателем."""
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Scipts.audio_ring import AudioRing  # noqa: E402
+
+
+def _samples(start, n):
+    return np.arange(start, start + n, dtype=np.int16)
+
+
+def test_read_returns_written_samples_in_order():
+    ring = AudioRing(1.0, 100)
+    ring.write(_samples(0, 30))
+    ring.write(_samples(30, 30))
+    _ts, data = ring.read(40, timeout=0.1)
+    assert np.frombuffer(data, dtype=np.int16).tolist() == list(range(40))
+    assert ring.overflows == 0
+
+
+def test_overflow_skips_to_fresh_data():
+    ring = AudioRing(1.0, 100)
+    for i in range(0, 150, 50):
+        ring.write(_samples(i, 50))
+    _ts, data = ring.read(20, timeout=0.1)
+    assert np.frombuffer(data, dtype=np.int16).tolist() == list(range(50, 70))
+    assert ring.dropped_samples == 50
+
+
+def test_write_started_during_copy_drops_overwritten_samples():
+    ring = AudioRing(1.0, 100)
+    ring.write(_samples(0, 100))
+    buf = ring._buf
+
+    class _Racing(np.ndarray):
+        """Первое копирование читателя застаёт писателя посреди записи 10 сэмплов."""
+        raced = False
+
+        def __getitem__(self, key):
+            out = np.ndarray.__getitem__(self, key)
+            if not _Racing.raced:
+                _Racing.raced = True
+                ring._claim = ring._write + 10  # писатель объявил кусок, но ещё не дописал
+                buf[:10] = -1
+            return out
+
+    ring._buf = buf.view(_Racing)
+    _ts, data = ring.read(20, timeout=0.1)
+    got = np.frombuffer(data, dtype=np.int16).tolist()
+    assert got == list(range(10, 30))  # первые 10 сэмплов переписаны — отброшены
+    assert ring.dropped_samples == 10
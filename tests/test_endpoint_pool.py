@@ -0,0 +1,46 @@
+# tests/test_endpoint_pool.py
+"""Порядок попыток EndpointPool и перезапуск фоновых проб."""
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Scipts.endpoint_pool import Endpoint, EndpointPool  # noqa: E402
+
+
+def _pool():
+    return EndpointPool([Endpoint("http://a", "m"), Endpoint("http://b", "m"), Endpoint("http://c", "m")])
+
+
+def test_unmeasured_endpoint_ranked_by_probe_latency():
+    pool = _pool()
+    a, b, c = pool.endpoints()
+    pool.report_success(a, 2.0)   # основной медленный
+    pool.report_probe(b, 0.3)     # запасной быстрый по пробе, живого трафика ещё не было
+    assert [e.url for e in pool.candidates()] == ["http://b", "http://a", "http://c"]
+
+
+def test_failed_endpoint_goes_last():
+    pool = _pool()
+    a, _b, _c = pool.endpoints()
+    pool.report_success(a, 0.1)
+    pool.report_failure(a, "connection refused")
+    assert pool.candidates()[-1] is a
+
+
+def test_probes_restart_after_stop():
+    pool = _pool()
+    release = threading.Event()
+    restarted = threading.Event()
+
+    def slow_probe(ep):
+        release.wait(2)  # старый поток ещё в пробе, когда зовут stop/start
+        return 0.1
+
+    pool.start_probes(slow_probe, interval=0.01)
+    pool.stop_probes()
+    pool.start_probes(lambda ep: restarted.set() or 0.1, interval=0.01)
+    assert restarted.wait(2)
+    release.set()
+    pool.stop_probes()
@@ -0,0 +1,49 @@
+# tests/test_intent_router.py
+"""Порог и алиасы IntentRouter на небольшом размеченном наборе (None — фраза должна уйти в LLM)."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Scipts.intent_router import IntentRouter  # noqa: E402
+
+LABELED = [
+    ("погода", "погода"),
+    ("пагода", "погода"),
+    ("джарвис какая погода", "погода"),
+    ("как погода", "погода"),
+    ("джарвис как там погода", "погода"),
+    ("открой прогноз погоды", "погода"),
+    ("покажи прогноз погоды", "погода"),
+    ("скажи прогноз погоды пожалуйста", "погода"),
+    ("что там с погодой", "погода"),
+    ("какая погода на улице", "погода"),
+    ("открой погоду", "погода"),
+    ("what's the weather", "погода"),
+    ("привет джарвис", "приветствие"),
+    ("ну привет", "приветствие"),
+    ("здравствуйте сэр", "приветствие"),
+    ("доброе утро джарвис", "приветствие"),
+    ("hi jarvis", "приветствие"),
+    ("плохая погода", None),
+    ("почему погода влияет на настроение", None),
+    ("прогноз погоды на завтра в сочи", None),
+    ("какой прогноз курса доллара", None),
+    ("прогноз продаж на квартал", None),
+    ("что такое прогноз", None),
+    ("привет как дела что нового в мире", None),
+    ("здравствуй как тебя зовут", None),
+    ("как дела", None),
+    ("открой браузер", None),
+    ("джарвис голос", None),
+    ("какой у тебя голос", None),
+    ("сделай голос погромче", None),
+]
+
+
+@pytest.mark.parametrize("text,intent", LABELED)
+def test_default_threshold_on_labeled_set(text, intent):
+    m = IntentRouter().match(text)
+    assert (m.intent if m else None) == intent
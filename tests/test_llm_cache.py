@@ -0,0 +1,43 @@
+# tests/test_llm_cache.py
+"""ResponseCache: запись на диск откладывается и сливается, flush() и перезагрузка сохраняют всё."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Scipts.llm_cache import ResponseCache  # noqa: E402
+
+
+def test_put_does_not_write_synchronously(tmp_path, monkeypatch):
+    path = str(tmp_path / "cache.json")
+    cache = ResponseCache(path=path, save_delay=60)
+    writes = []
+    monkeypatch.setattr(cache, "_write", writes.append)
+    for i in range(5):
+        cache.put(f"k{i}", f"ответ {i}")
+    assert writes == []          # промахи не трогают диск в вызывающем потоке
+    cache.flush()
+    assert len(writes) == 1      # пять записей — одно сохранение
+    cache.flush()
+    assert len(writes) == 1      # сохранять нечего
+
+
+def test_flush_persists_and_reloads(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = ResponseCache(path=path, save_delay=60)
+    cache.put("a", "первый")
+    cache.put("b", "второй")
+    cache.flush()
+    assert not os.path.exists(path + ".tmp")
+    again = ResponseCache(path=path)
+    assert again.get("a") == "первый" and again.get("b") == "второй"
+
+
+def test_timer_saves_in_background(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = ResponseCache(path=path, save_delay=0.05)
+    cache.put("a", "первый")
+    timer = cache._save_timer
+    assert timer is not None
+    timer.join(2)
+    assert ResponseCache(path=path).get("a") == "первый"
@@ -0,0 +1,81 @@
+# tests/test_tts_pipeline.py
+"""SpeechPipeline без сервера и звуковой карты: синтез подменён, звук уходит в sink."""
+import io
+import os
+import sys
+import threading
+import time
+import wave
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("requests")
+
+from Scipts import tts_pipeline  # noqa: E402
+from Scipts.tts_pipeline import SpeechConfig, SpeechPipeline  # noqa: E402
+
+RATE = 16000
+
+
+def _wav(sec=0.05):
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(RATE)
+        w.writeframes((np.ones(int(RATE * sec)) * 3000).astype(np.int16).tobytes())
+    return buf.getvalue()
+
+
+@pytest.fixture
+def fake_tts(monkeypatch):
+    monkeypatch.setattr(tts_pipeline.vcr, "ensure_voice_cloned", lambda *a, **k: "jarvis")
+    monkeypatch.setattr(tts_pipeline.vcr, "synth_with_reclone", lambda *a, **k: _wav())
+    monkeypatch.setattr(tts_pipeline.vcr, "cache_stats", lambda: {})
+
+
+class _Sink:
+    """Общий «динамик»: пишет, кто звучит, и ловит одновременную речь двух конвейеров."""
+
+    def __init__(self):
+        self.log = []
+        self.overlaps = 0
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, name):
+        def sink(rate, pcm):
+            with self._lock:
+                self._active += 1
+                self.overlaps += self._active > 1
+                self.log.append(name)
+            time.sleep(len(pcm) / rate)
+            with self._lock:
+                self._active -= 1
+        return sink
+
+
+def test_back_to_back_pipelines_do_not_overlap(fake_tts):
+    sink = _Sink()
+    first = SpeechPipeline(SpeechConfig(), sink=sink("first"))
+    second = SpeechPipeline(SpeechConfig(), sink=sink("second"), after=first)
+    first.speak("Первый ответ, достаточно длинный для фразы. И ещё одно предложение.")
+    second.speak("Второй ответ пришёл, пока первый ещё звучит.")
+    assert first.wait(5) and second.wait(5)
+    assert sink.overlaps == 0
+    assert "first" in sink.log and "second" in sink.log
+    assert sink.log.index("second") > len(sink.log) - 1 - sink.log[::-1].index("first")
+
+
+def test_cancelled_previous_lets_next_play(fake_tts):
+    sink = _Sink()
+    first = SpeechPipeline(SpeechConfig(), sink=sink("first"))
+    second = SpeechPipeline(SpeechConfig(), sink=sink("second"), after=first)
+    first.feed("Этот ответ так и не договорят до конца, его отменят.")  # без finish — висит
+    second.speak("Второй ответ.")
+    first.cancel()
+    assert second.wait(5)
+    assert second.chunks == 1 and sink.overlaps == 0
@@ -0,0 +1,71 @@
+# tests/test_voice_agent.py
+"""Команды VoiceAgent без микрофона: распознаватель Vosk подменяется сценарием результатов."""
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("vosk")
+
+from Scipts import voice_agent  # noqa: E402
+from Scipts.voice_agent import SAMPLE_RATE, VoiceAgent, VoiceConfig  # noqa: E402
+
+BLOCK = b"\x00\x00" * (SAMPLE_RATE // 10)
+
+
+class _ScriptedRecognizer:
+    """Каждый AcceptWaveform берёт следующий ("final"|"partial", текст) из сценария своего режима."""
+    scripts = {}
+
+    def __init__(self, model, rate, grammar=None):
+        self.key = "wake" if grammar else "full"
+        self._last = ("partial", "")
+
+    def SetWords(self, value):
+        pass
+
+    def Reset(self):
+        pass
+
+    def AcceptWaveform(self, data):
+        seq = self.scripts.get(self.key) or []
+        self._last = seq.pop(0) if seq else ("partial", "")
+        return self._last[0] == "final"
+
+    def Result(self):
+        return json.dumps({"text": self._last[1]})
+
+    def PartialResult(self):
+        return json.dumps({"partial": self._last[1]})
+
+    def FinalResult(self):
+        return json.dumps({"text": ""})
+
+
+@pytest.fixture
+def run(monkeypatch):
+    def _run(scripts, blocks=40, **cfg):
+        monkeypatch.setattr(voice_agent, "KaldiRecognizer", _ScriptedRecognizer)
+        monkeypatch.setattr(_ScriptedRecognizer, "scripts", {k: list(v) for k, v in scripts.items()})
+        commands = []
+        agent = VoiceAgent(VoiceConfig(vosk_model_path="", vad_enabled=False, **cfg), on_command=commands.append)
+        agent._model = object()
+        agent.start_offline()
+        for _ in range(blocks):
+            agent.feed(BLOCK)
+        agent.finish()
+        return commands
+    return _run
+
+
+def test_unk_not_in_command_after_final_wake(run):
+    cmds = run({"wake": [("final", "[unk] джарвис")], "full": [("final", "[unk] какая погода")]})
+    assert cmds == ["какая погода"]
+
+
+def test_bare_unk_after_wake_is_not_a_command(run):
+    cmds = run({"wake": [("final", "джарвис [unk]")], "full": [("final", "[unk]")]})
+    assert cmds == []
@@ -0,0 +1,44 @@
+# tests/test_voice_clone_remote.py
+"""Кэш TTS против заглушки сервера: смена образца голоса под тем же voice_id — новый синтез."""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("requests")
+
+from Scipts import voice_clone_remote as vcr  # noqa: E402
+from Scipts.stub_servers import StubTTSServer, synth_wav  # noqa: E402
+
+
+@pytest.fixture
+def tts(tmp_path, monkeypatch):
+    with StubTTSServer(tts_delay=0.0, realtime_factor=0.0, clone_delay=0.0) as srv:
+        monkeypatch.setattr(vcr, "TTS_BASE_URL", srv.base_url)
+        vcr.configure_cache(str(tmp_path / "tts_cache"))
+        vcr.configure_registry(str(tmp_path / "voice_registry.json"))
+        try:
+            yield srv
+        finally:
+            vcr.configure_cache("")
+            vcr.configure_registry("")
+
+
+def test_cache_hit_for_same_sample(tts, tmp_path):
+    sample = tmp_path / "voice.wav"
+    sample.write_bytes(synth_wav(0.2, freq=220.0))
+    for _ in range(2):
+        assert vcr.speak_clone_remote("Слушаю, сэр.", str(sample), voice_id="jarvis", do_play=False).startswith("Синтез ок")
+    assert tts.tts_calls == 1
+
+
+def test_new_sample_same_voice_id_misses_cache(tts, tmp_path):
+    sample = tmp_path / "voice.wav"
+    sample.write_bytes(synth_wav(0.2, freq=220.0))
+    vcr.speak_clone_remote("Слушаю, сэр.", str(sample), voice_id="jarvis", do_play=False)
+    sample.write_bytes(synth_wav(0.3, freq=330.0))  # другой голос, тот же файл и voice_id
+    vcr.speak_clone_remote("Слушаю, сэр.", str(sample), voice_id="jarvis", do_play=False)
+    assert tts.tts_calls == 2
+    assert tts.clone_calls == 2